@@ -474,14 +474,31 @@ AdsbMessagePanel.prototype.render = function() {
     ));
 };
 
+AdsbMessagePanel.getAircraftId = function(entry) {
+    return entry.icao?     entry.icao
+         : entry.aircraft? entry.aircraft
+         : entry.flight?   entry.flight
+         : null;
+};
+
 AdsbMessagePanel.prototype.pushMessage = function(msg) {
     // Must have list of aircraft
     if (!msg.aircraft) return;
 
+    // Complete lists replace all aircraft, otherwise only changed
+    // aircraft are sent, along with IDs of removed aircraft
+    if (!this.aircraft || msg.full || !('full' in msg)) this.aircraft = {};
+    var aircraft = this.aircraft;
+    (msg.removed || []).forEach(id => { delete aircraft[id]; });
+    msg.aircraft.forEach(entry => {
+        var id = AdsbMessagePanel.getAircraftId(entry);
+        if (id) aircraft[id] = entry;
+    });
+
     // Create new table body
     var body = '';
     var odd = false;
-    msg.aircraft.forEach(entry => {
+    Object.values(aircraft).forEach(entry => {
         // Signal strength
         var rssi = entry.rssi? entry.rssi + '&nbsp;dB' : '';
 
@@ -524,10 +541,7 @@ AdsbMessagePanel.prototype.pushMessage = function(msg) {
         var distance = '';
         var receiver_pos = Utils.getReceiverPos();
         if (receiver_pos && entry.lat && entry.lon) {
-            var id = entry.icao?     entry.icao
-                   : entry.aircraft? entry.aircraft
-                   : entry.flight?   entry.flight
-                   : null;
+            var id = AdsbMessagePanel.getAircraftId(entry);
 
             distance = Utils.distanceKm(entry, receiver_pos) + '&nbsp;km';
             if (id) distance = Utils.linkToMap(id, distance);
@@ -774,14 +788,14 @@ SstvMessagePanel.prototype.pushMessage = function(msg) {
         this.height = msg.height;
     }
     else if(msg.width>0 && msg.height>0 && msg.line>=0 && msg.hasOwnProperty('pixels')) {
-        // Will copy pixels to img
-        var pixels = atob(msg.pixels);
+        // Will copy pixels to img, they arrive as a Uint8Array
+        var pixels = msg.pixels;
         var img = this.ctx.createImageData(msg.width, 1);
         // Convert BMP BGR pixels into HTML RGBA pixels
         for (var x = 0; x < msg.width; x++) {
-            img.data[x*4 + 0] = pixels.charCodeAt(x*3 + 2);
-            img.data[x*4 + 1] = pixels.charCodeAt(x*3 + 1);
-            img.data[x*4 + 2] = pixels.charCodeAt(x*3 + 0);
+            img.data[x*4 + 0] = pixels[x*3 + 2];
+            img.data[x*4 + 1] = pixels[x*3 + 1];
+            img.data[x*4 + 2] = pixels[x*3 + 0];
             img.data[x*4 + 3] = 0xFF;
         }
         // Render scanline
@@ -850,32 +864,14 @@ FaxMessagePanel.prototype.pushMessage = function(msg) {
         this.ctx.putImageData(image, 0, 0);
     }
     else if(msg.width>0 && msg.height>0 && msg.line>=0 && msg.hasOwnProperty('pixels')) {
-        // Will copy pixels to img
+        // Will copy pixels to img, they arrive as a Uint8Array
         var img = this.ctx.createImageData(msg.width, 1);
-        var pixels;
-
-        // Unpack RLE-compressed line of pixels
-        if(!msg.rle) {
-            pixels = atob(msg.pixels);
-        } else {
-            var rle = atob(msg.pixels);
-            pixels = '';
-            for(var x=0 ; x<rle.length ; ) {
-                var c = rle.charCodeAt(x);
-                if(c<128) {
-                    pixels += rle.slice(x+1, x+c+2);
-                    x += c + 2;
-                } else {
-                    pixels += rle.slice(x+1, x+2).repeat(c-128+2)
-                    x += 2;
-                }
-            }
-        }
+        var pixels = msg.pixels;
 
         // Convert BMP BGR pixels into HTML RGBA pixels
         if(msg.depth==8) {
             for(var x=0, y=0; x<msg.width; x++) {
-                var c = pixels.charCodeAt(x);
+                var c = pixels[x];
                 img.data[y++] = c;
                 img.data[y++] = c;
                 img.data[y++] = c;
@@ -883,9 +879,9 @@ FaxMessagePanel.prototype.pushMessage = function(msg) {
             }
         } else {
             for (var x = 0; x < msg.width; x++) {
-                img.data[x*4 + 0] = pixels.charCodeAt(x*3 + 2);
-                img.data[x*4 + 1] = pixels.charCodeAt(x*3 + 1);
-                img.data[x*4 + 2] = pixels.charCodeAt(x*3 + 0);
+                img.data[x*4 + 0] = pixels[x*3 + 2];
+                img.data[x*4 + 1] = pixels[x*3 + 1];
+                img.data[x*4 + 2] = pixels[x*3 + 0];
                 img.data[x*4 + 3] = 0xFF;
             }
         }
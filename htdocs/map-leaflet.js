@@ -443,6 +443,12 @@ MapManager.prototype.processUpdates = function(updates) {
             return;
         }
 
+        // Process removed positions
+        if (update.removed) {
+            self.mman.remove(update.callsign);
+            return;
+        }
+
         // Process position updates
         switch (update.location.type) {
             case 'latlon':
@@ -1157,6 +1157,24 @@ function on_ws_recv(evt) {
                 // hd audio data
                 audioEngine.pushHdAudio(data);
                 break;
+            case 5:
+                // image scanline, see owrx/image.py for the header layout
+                var header = new DataView(data, 0, 13);
+                var scanline = {
+                    mode: ['SSTV', 'Fax'][header.getUint8(0)],
+                    ended: (header.getUint8(1) & 1) !== 0,
+                    depth: header.getUint8(2),
+                    width: header.getUint16(3, true),
+                    line: header.getUint32(5, true),
+                    height: header.getUint32(9, true),
+                    pixels: new Uint8Array(data, 13)
+                };
+                if (scanline.mode === 'Fax') {
+                    $('#openwebrx-panel-fax-message').faxMessagePanel().pushMessage(scanline);
+                } else {
+                    $('#openwebrx-panel-sstv-message').sstvMessagePanel().pushMessage(scanline);
+                }
+                break;
             default:
                 console.warn('unknown type of binary message: ' + type)
         }
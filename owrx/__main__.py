@@ -7,7 +7,7 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 from http.server import HTTPServer
-from owrx.http import RequestHandler
+from owrx.http import RequestHandler, DetachableRequestsMixIn
 from owrx.config.core import CoreConfig
 from owrx.config import Config
 from owrx.config.commands import MigrateCommand
@@ -15,10 +15,11 @@ from owrx.feature import FeatureDetector
 from owrx.sdr import SdrService
 from socketserver import ThreadingMixIn
 from owrx.service import Services
-from owrx.websocket import WebSocketConnection
+from owrx.websocket import WebSocketConnection, WebSocketLoop
 from owrx.reporting import ReportingEngine
 from owrx.version import openwebrx_version
 from owrx.audio.queue import DecoderQueue
+from owrx.audio.pool import DecoderPool
 from owrx.admin import add_admin_parser, run_admin_action
 from owrx.reporting import ReportingEngine
 from owrx.markers import Markers
@@ -31,7 +32,7 @@ import socket
 import os.path
 import ssl
 
-class ThreadedHttpServer(ThreadingMixIn, HTTPServer):
+class ThreadedHttpServer(DetachableRequestsMixIn, ThreadingMixIn, HTTPServer):
     def __init__(self, web_port, RequestHandlerClass, use_ipv6, bind_address=None):
         if bind_address is None:
             bind_address = "::" if use_ipv6 else "0.0.0.0"
@@ -119,6 +120,9 @@ Support and info:       https://groups.io/g/openwebrx
     # config warmup
     Config.validateConfig()
 
+    WebSocketConnection.setWriterMode(coreConfig.get_web_websocket_writer())
+    WebSocketConnection.setIoMode(coreConfig.get_web_websocket_mode())
+
     featureDetector = FeatureDetector()
     failed = featureDetector.get_failed_requirements("core")
     if failed:
@@ -177,11 +181,13 @@ Support and info:       https://groups.io/g/openwebrx
         pass
 
     WebSocketConnection.closeAll()
+    WebSocketLoop.stopAll()
     Markers.stop()
     GpsUpdater.stop()
     Services.stop()
     SdrService.stopAllSources()
     DecoderQueue.stopAll()
+    DecoderPool.stopAll()
 
     # Report server stopped
     ReportingEngine.getSharedInstance().spot({
@@ -6,7 +6,9 @@ from owrx.config import Config
 from owrx.reporting import ReportingEngine
 from owrx.icao import IcaoRegistration, IcaoCountry
 from datetime import datetime, timedelta
+from collections import OrderedDict
 import threading
+import heapq
 import pickle
 import json
 import math
@@ -144,10 +146,29 @@ class AircraftManager(object):
 
     def __init__(self):
         self.lock = threading.Lock()
-        self.cleanupPeriod = 60
+        self.cleanupPeriod = 10
         self.maxMsgLog = 20
         self.colors = ColorCache()
-        self.aircraft = {}
+        # Aircraft records by record key, least recently updated first.
+        # Records are never modified once stored, updates replace them.
+        self.records = OrderedDict()
+        # Record keys by aircraft ID (ICAO, tail, flight), and aircraft
+        # IDs by record key
+        self.aliases = {}
+        self.aliasIds = {}
+        # Heap of (ttl, sequence, record key), and the sequence number
+        # currently scheduled for each record
+        self.expiry = []
+        self.expirySeq = 0
+        self.scheduled = {}
+        # Records by aircraft ID for readers, rebuilt after changes
+        self.snapshot = None
+        # Generation of the last change to each aircraft, in the order
+        # of changes, and of aircraft IDs removed from the database
+        self.generation = 0
+        self.changes = OrderedDict()
+        self.removals = OrderedDict()
+        self.maxRemovals = 10000
         # Start periodic cleanup task
         self.thread = threading.Thread(target=self._cleanupThread, name=type(self).__name__ + ".Cleanup")
         self.thread.start()
@@ -160,7 +181,7 @@ class AircraftManager(object):
 
     # Get aircraft data by ID.
     def getAircraft(self, id):
-        return self.aircraft[id] if id in self.aircraft else {}
+        return self._getSnapshot().get(id, {})
 
     # Add a new aircraft to the database, or update existing aircraft data.
     def update(self, data):
@@ -188,33 +209,31 @@ class AircraftManager(object):
         else:
             # Assume ADSB time-to-live
             data["ttl"] = data["timestamp"] + pm["adsb_ttl"] * 1000
+        maxCount = pm["aircraft_max_count"]
 
         # Now operating on the database...
         with self.lock:
-            # Merge database entries in flight -> tail -> ICAO ID order
-            if "icao" in data:
-                if "flight" in data:
-                    self._merge(data["icao"], data["flight"])
-                if "aircraft" in data:
-                    self._merge(data["icao"], data["aircraft"])
-            elif "aircraft" in data and "flight" in data:
-                self._merge(data["aircraft"], data["flight"])
+            # Find existing record, merging records found by different
+            # IDs of this aircraft
+            key = self._link([data[x] for x in ["icao", "aircraft", "flight"] if x in data])
 
             # If no such ID yet...
-            if id not in self.aircraft:
+            if key is None:
                 logger.info("Adding %s" % id)
                 # Create a new record
-                item = self.aircraft[id] = data.copy()
+                key = id
+                item = data.copy()
                 updated = True
             else:
                 # Use existing record
-                item = self.aircraft[id]
+                item = self.records[key]
                 # If we have got newer data...
                 if data["timestamp"] > item["timestamp"]:
                     # Get previous and current positions
                     pos0 = (item["lat"], item["lon"]) if "lat" in item and "lon" in item else None
                     pos1 = (data["lat"], data["lon"]) if "lat" in data and "lon" in data else None
-                    # Update existing record
+                    # Update a copy of the existing record
+                    item = item.copy()
                     item.update(data)
                     updated = True
                     # If both current and previous positions exist, compute course
@@ -226,27 +245,27 @@ class AircraftManager(object):
             if updated:
                 # Add incoming messages to the log
                 if "message" in data:
-                    if "msglog" not in item:
-                        item["msglog"] = [ data["message"] ]
-                    else:
-                        msglog = item["msglog"]
-                        msglog.append(data["message"])
-                        if len(msglog) > self.maxMsgLog:
-                            item["msglog"] = item["msglog"][-self.maxMsgLog:]
+                    item["msglog"] = (item.get("msglog", []) + [data["message"]])[-self.maxMsgLog:]
+                self._store(key, item)
                 # Update aircraft on the map
                 if "lat" in item and "lon" in item and "mode" in item:
                     loc = AircraftLocation(item)
                     Map.getSharedInstance().updateLocation(id, loc, item["mode"])
                     # Can later use this for linking to the map
                     data["mapid"] = id
+                # Drop least recently updated aircraft above the limit
+                while len(self.records) > maxCount:
+                    oldest = next(iter(self.records))
+                    logger.debug("Evicting %s" % oldest)
+                    self._removeRecord(oldest)
 
             # Update input data with computed data
-            for key in ["icao", "aircraft", "flight"]:
-                if key in item:
-                    data[key] = item[key]
+            for x in ["icao", "aircraft", "flight"]:
+                if x in item:
+                    data[x] = item[x]
 
-        # Assign input data a color by its updated aircraft ID
-        data["color"] = self.colors.getColor(self.getAircraftId(data))
+            # Assign input data a color by its updated aircraft ID
+            data["color"] = self.colors.getColor(self.getAircraftId(data))
 
         # Return TRUE if updated database
         return updated
@@ -254,58 +273,151 @@ class AircraftManager(object):
     # Remove all database entries older than given time.
     def cleanup(self):
         now = datetime.now().timestamp() * 1000
+        removed = 0
         # Now operating on the database...
         with self.lock:
-            too_old = [x for x in self.aircraft.keys() if self.aircraft[x]["ttl"] < now]
-            if too_old:
-                logger.info("Following aircraft have become stale: {0}".format(too_old))
-                for id in too_old:
-                    self._removeFromMap(id)
-                    del self.aircraft[id]
+            while self.expiry and self.expiry[0][0] < now:
+                ttl, seq, key = heapq.heappop(self.expiry)
+                # Skip records removed or rescheduled since
+                if self.scheduled.get(key) != seq:
+                    continue
+                item = self.records[key]
+                if item["ttl"] < now:
+                    logger.debug("Removing stale %s" % self.getAircraftId(item))
+                    self._removeRecord(key)
+                    removed += 1
+                else:
+                    self._scheduleExpiry(key, item["ttl"])
+        if removed:
+            logger.info("Removed {0} stale aircraft, {1} remaining".format(removed, len(self.records)))
 
     # Get current aircraft data reported in given mode
     def getData(self, mode: str = None):
         result = []
-        with self.lock:
-            for id in self.aircraft.keys():
-                item = self.aircraft[id]
-                # Ignore duplicates and data reported in different modes
-                if id == self.getAircraftId(item):
-                    if not mode or mode == item["mode"]:
-                        result.append(item)
+        for id, item in self._getSnapshot().items():
+            # Ignore duplicates and data reported in different modes
+            if id == self.getAircraftId(item):
+                if not mode or mode == item["mode"]:
+                    result.append(item)
         return result
 
-    # Internal function to merge aircraft data
-    def _merge(self, id1, id2):
-        if id1 not in self.aircraft:
-            if id2 in self.aircraft:
-                logger.info("Linking %s to %s" % (id1, id2))
-                self.aircraft[id1] = self.aircraft[id2]
-        elif id2 not in self.aircraft:
-            logger.info("Linking %s to %s" % (id2, id1))
-            self.aircraft[id2] = self.aircraft[id1]
-        else:
-            item1 = self.aircraft[id1]
-            item2 = self.aircraft[id2]
-            if item1 is not item2:
-                # Make sure ID1 is always newer than ID2
-                if item1["timestamp"] < item2["timestamp"]:
-                    item1, item2 = item2, item1
-                    id1,   id2   = id2,   id1
-                # Update older data with newer data
-                logger.info("Merging %s into %s" % (id2, id1))
-                item2.update(item1)
-                self.aircraft[id1] = item2
-                # Change ID2 color to ID1
-                self.colors.rename(id2, id1)
-                # Remove ID2 airplane from the map
-                self._removeFromMap(id2)
+    # Get aircraft changed and IDs removed after the given generation,
+    # along with the current generation. Changed aircraft may have been
+    # reported in any mode.
+    def getChanges(self, since: int = 0):
+        with self.lock:
+            changed = []
+            for id in reversed(self.changes):
+                if self.changes[id] <= since:
+                    break
+                key = self.aliases.get(id)
+                item = self.records[key] if key is not None else None
+                # Ignore duplicates
+                if item is not None and id == self.getAircraftId(item):
+                    changed.append(item)
+            removed = []
+            for id in reversed(self.removals):
+                if self.removals[id] <= since:
+                    break
+                removed.append(id)
+            changed.reverse()
+            return changed, removed, self.generation
+
+    # Internal function returning records by aircraft ID, without
+    # locking the database unless it has changed
+    def _getSnapshot(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.lock:
+                if self.snapshot is None:
+                    self.snapshot = {id: self.records[key] for id, key in self.aliases.items()}
+                snapshot = self.snapshot
+        return snapshot
+
+    # Internal function to store a new or updated record
+    def _store(self, key, item):
+        if key not in self.records:
+            self._scheduleExpiry(key, item["ttl"])
+        self.records[key] = item
+        self.records.move_to_end(key)
+        ids = self.aliasIds.setdefault(key, set())
+        for x in ["icao", "aircraft", "flight"]:
+            if x in item:
+                self.aliases[item[x]] = key
+                ids.add(item[x])
+        self.snapshot = None
+        self._changed(self.getAircraftId(item))
+
+    # Internal function to remove a record with all its aircraft IDs
+    def _removeRecord(self, key):
+        item = self.records.pop(key)
+        del self.scheduled[key]
+        for id in self.aliasIds.pop(key):
+            del self.aliases[id]
+            self._removeFromMap(id, item)
+            self._removed(id)
+        self.snapshot = None
+
+    # Internal function to schedule record expiry
+    def _scheduleExpiry(self, key, ttl):
+        self.expirySeq += 1
+        self.scheduled[key] = self.expirySeq
+        heapq.heappush(self.expiry, (ttl, self.expirySeq, key))
+
+    # Internal function to find the record for given aircraft IDs,
+    # merging all records found into the most recent one
+    def _link(self, ids):
+        keys = []
+        for id in ids:
+            key = self.aliases.get(id)
+            if key is not None and key not in keys:
+                keys.append(key)
+        if len(keys) < 2:
+            return keys[0] if keys else None
+        # Update older data with newer data
+        keys.sort(key=lambda k: self.records[k]["timestamp"])
+        key = keys[-1]
+        item = {}
+        for k in keys:
+            item.update(self.records[k])
+        newId = self.getAircraftId(item)
+        for k in keys[:-1]:
+            old = self.records.pop(k)
+            oldId = self.getAircraftId(old)
+            logger.info("Merging %s into %s" % (oldId, newId))
+            del self.scheduled[k]
+            for id in self.aliasIds.pop(k):
+                self.aliases[id] = key
+                self.aliasIds[key].add(id)
+            if oldId != newId:
+                # Change old ID color to the new ID
+                self.colors.rename(oldId, newId)
+                # Remove old airplane from the map
+                self._removeFromMap(oldId, old)
+                self._removed(oldId)
+        self._store(key, item)
+        return key
+
+    # Internal function to record a change to the aircraft
+    def _changed(self, id):
+        self.generation += 1
+        self.changes[id] = self.generation
+        self.changes.move_to_end(id)
+        self.removals.pop(id, None)
+
+    # Internal function to record removal of an aircraft
+    def _removed(self, id):
+        self.generation += 1
+        self.changes.pop(id, None)
+        self.removals[id] = self.generation
+        self.removals.move_to_end(id)
+        if len(self.removals) > self.maxRemovals:
+            self.removals.popitem(last=False)
 
     # Internal function to remove aircraft from the map
-    def _removeFromMap(self, id):
+    def _removeFromMap(self, id, item):
         # Ignore errors removing non-existing flights
         try:
-            item = self.aircraft[id]
             if "lat" in item and "lon" in item:
                 Map.getSharedInstance().removeLocation(id)
         except Exception as exptn:
@@ -558,6 +670,10 @@ class AdsbParser(AircraftParser):
         self.jsonFile = jsonFile
         self.checkPeriod = 1
         self.lastParse = 0
+        # Last aircraft database generation sent to the client, and
+        # IDs of aircraft the client knows about
+        self.lastGeneration = 0
+        self.knownIds = set()
         # Start periodic JSON file check
         self.thread = threading.Thread(target=self._refreshThread, name=type(self).__name__ + ".Refresh")
         self.thread.start()
@@ -580,14 +696,39 @@ class AdsbParser(AircraftParser):
                     lastUpdate = ts
                     parsed = self.parseJson(self.jsonFile)
                     if not self.service and parsed > 0:
-                        data = AircraftManager.getSharedInstance().getData("ADSB")
-                        self.writer.write(pickle.dumps({
-                            "mode"     : "ADSB-LIST",
-                            "aircraft" : data
-                        }))
+                        self._sendChanges()
             except Exception as exptn:
                 logger.info("Failed to check file '{0}': {1}".format(self.jsonFile, exptn))
 
+    # Send aircraft changed since the last time to the client. The
+    # first list is complete, later ones only contain changes.
+    def _sendChanges(self):
+        changed, removed, generation = AircraftManager.getSharedInstance().getChanges(self.lastGeneration)
+        full = self.lastGeneration == 0
+        self.lastGeneration = generation
+        aircraft = []
+        removed = set(removed)
+        for item in changed:
+            id = AircraftManager.getAircraftId(item)
+            if item["mode"] == "ADSB":
+                aircraft.append(item)
+                self.knownIds.add(id)
+            else:
+                removed.add(id)
+            # Aircraft IDs change when aircraft get identified better
+            for key in ["aircraft", "flight"]:
+                if key in item and item[key] != id:
+                    removed.add(item[key])
+        removed = removed & self.knownIds
+        self.knownIds -= removed
+        if full or aircraft or removed:
+            self.writer.write(pickle.dumps({
+                "mode"     : "ADSB-LIST",
+                "aircraft" : aircraft,
+                "removed"  : sorted(removed),
+                "full"     : full
+            }))
+
     # Parse supplied JSON file in Dump1090 format.
     def parseJson(self, file: str):
         # Load JSON from supplied file
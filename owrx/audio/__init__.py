@@ -20,6 +20,16 @@ class AudioChopperProfile(ABC):
     def decoder_commandline(self, file):
         pass
 
+    def getMode(self):
+        return type(self).__name__
+
+    def getDecodingBudget(self):
+        """
+        Seconds after the end of an interval until decoding results are considered stale. Jobs that cannot finish
+        within this budget are skipped.
+        """
+        return self.getInterval()
+
 
 class ProfileSourceSubscriber(ABC):
     @abstractmethod
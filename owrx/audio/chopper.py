@@ -2,7 +2,7 @@ from owrx.modes import Modes, AudioChopperMode
 from owrx.audio import AudioChopperProfile
 from itertools import groupby
 from owrx.audio import ProfileSourceSubscriber
-from owrx.audio.wav import AudioWriter
+from owrx.audio.wav import AudioWriter, MemoryAudioWriter
 from owrx.audio.queue import QueueJob
 from csdr.module import ThreadModule
 from pycsdr.types import Format
@@ -48,7 +48,8 @@ class AudioChopper(ThreadModule, ProfileSourceSubscriber):
         sorted_profiles = sorted(self.profile_source.getProfiles(), key=lambda p: p.getInterval())
         groups = {interval: list(group) for interval, group in groupby(sorted_profiles, key=lambda p: p.getInterval())}
         writers = [
-            AudioWriter(self, interval, profiles) for interval, profiles in groups.items()
+            (MemoryAudioWriter if MemoryAudioWriter.isEnabled(interval) else AudioWriter)(self, interval, profiles)
+            for interval, profiles in groups.items()
         ]
         for w in writers:
             w.start()
@@ -81,8 +82,8 @@ class AudioChopper(ThreadModule, ProfileSourceSubscriber):
     def setDialFrequency(self, frequency: int) -> None:
         self.dialFrequency = frequency
 
-    def createJob(self, profile, filename):
-        return QueueJob(profile, self.dialFrequency, self, filename)
+    def createJob(self, profile, filename, memoryFile=None):
+        return QueueJob(profile, self.dialFrequency, self, filename, memoryFile)
 
     def sendResult(self, result):
         for line in result.lines:
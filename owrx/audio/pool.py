@@ -0,0 +1,184 @@
+from owrx.config import Config
+from abc import ABC, abstractmethod
+from queue import Queue
+from typing import List, Optional, Tuple
+import multiprocessing
+import subprocess
+import threading
+import os
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# decoders run with a lower priority, so they do not affect the receiver
+DECODER_NICENESS = 10
+DECODER_TIMEOUT = 10
+
+
+class DecoderPool(ABC):
+    """
+    Runs decoder command lines for the DecoderQueue workers.
+    """
+    sharedInstance = None
+    creationLock = threading.Lock()
+
+    @staticmethod
+    def getSharedInstance():
+        poolClass = PreforkDecoderPool if Config.get()["decoding_prefork"] else ForkingDecoderPool
+        previous = None
+        with DecoderPool.creationLock:
+            if not isinstance(DecoderPool.sharedInstance, poolClass):
+                previous = DecoderPool.sharedInstance
+                DecoderPool.sharedInstance = poolClass()
+            pool = DecoderPool.sharedInstance
+        if previous is not None:
+            previous.stop()
+        return pool
+
+    @staticmethod
+    def stopAll():
+        with DecoderPool.creationLock:
+            pool = DecoderPool.sharedInstance
+            DecoderPool.sharedInstance = None
+        if pool is not None:
+            pool.stop()
+
+    @abstractmethod
+    def decode(self, command: List[str], cwd: str) -> Tuple[Optional[List[bytes]], int]:
+        """
+        Run the decoder and return its output lines (None if the output could not be read) and its return code.
+        """
+        pass
+
+    def stop(self):
+        pass
+
+
+def runDecoder(command: List[str], cwd: str) -> Tuple[Optional[List[bytes]], int]:
+    decoder = subprocess.Popen(command, stdout=subprocess.PIPE, cwd=cwd, close_fds=True)
+    lines = None
+    try:
+        lines = [l for l in decoder.stdout]
+    except OSError:
+        decoder.stdout.flush()
+        # TODO uncouple parsing from the output so that decodes can still go to the map and the spotters
+        logger.debug("output has gone away while decoding job.")
+
+    try:
+        rc = decoder.wait(timeout=DECODER_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logger.warning("subprocess (pid=%i}) did not terminate correctly; sending kill signal.", decoder.pid)
+        decoder.kill()
+        raise
+    return lines, rc
+
+
+class ForkingDecoderPool(DecoderPool):
+    """
+    Starts every decoder from the main process, through nice.
+    """
+    def decode(self, command: List[str], cwd: str) -> Tuple[Optional[List[bytes]], int]:
+        return runDecoder(["nice", "-n", str(DECODER_NICENESS)] + command, cwd)
+
+
+def _runSlot(connection, cpu: Optional[int]):
+    # runs in the slot process. everything set up here is inherited by the decoders.
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    os.nice(DECODER_NICENESS)
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        command, cwd = request
+        try:
+            connection.send(runDecoder(command, cwd))
+        except Exception as e:
+            connection.send(e)
+
+
+class DecoderSlot(object):
+    """
+    A small process that starts decoders on behalf of the main process.
+
+    Forking the receiver, with all of its threads and memory mappings, is expensive compared to forking this process.
+    The slot also applies the priority and CPU affinity once, instead of starting nice for every decoder.
+    """
+    def __init__(self, cpu: Optional[int]):
+        self.cpu = cpu
+        # a fresh interpreter, so that none of the receiver state is copied into the slot
+        context = multiprocessing.get_context("spawn")
+        self.connection, remote = context.Pipe()
+        self.process = context.Process(target=_runSlot, args=(remote, cpu), name="decoder_slot", daemon=True)
+        self.process.start()
+        remote.close()
+
+    def decode(self, command: List[str], cwd: str) -> Tuple[Optional[List[bytes]], int]:
+        self.connection.send((command, cwd))
+        result = self.connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def isAlive(self):
+        return self.process.is_alive()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.connection.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class PreforkDecoderPool(DecoderPool):
+    """
+    Runs decoders from pre-forked slot processes, one per CPU, each pinned to its CPU.
+    Slots are started when they are first needed, and replaced if they die.
+    """
+    def __init__(self):
+        if hasattr(os, "sched_getaffinity"):
+            self.cpus = sorted(os.sched_getaffinity(0))
+        else:
+            self.cpus = [None] * (os.cpu_count() or 1)
+        self.idle = Queue()
+        self.slots = 0
+        self.lock = threading.Lock()
+        self.stopped = False
+
+    def _getSlot(self) -> DecoderSlot:
+        with self.lock:
+            if self.idle.empty() and self.slots < len(self.cpus):
+                self.slots += 1
+                return DecoderSlot(self.cpus[self.slots - 1])
+        return self.idle.get()
+
+    def _returnSlot(self, slot: DecoderSlot):
+        if self.stopped:
+            slot.stop()
+        elif not slot.isAlive():
+            logger.warning("decoder slot died, starting a new one")
+            slot.stop()
+            self.idle.put(DecoderSlot(slot.cpu))
+        else:
+            self.idle.put(slot)
+
+    def decode(self, command: List[str], cwd: str) -> Tuple[Optional[List[bytes]], int]:
+        slot = self._getSlot()
+        try:
+            return slot.decode(command, cwd)
+        finally:
+            self._returnSlot(slot)
+
+    def stop(self):
+        self.stopped = True
+        while not self.idle.empty():
+            self.idle.get().stop()
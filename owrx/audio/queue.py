@@ -1,8 +1,13 @@
 from owrx.config import Config
 from owrx.config.core import CoreConfig
-from owrx.metrics import Metrics, CounterMetric, DirectMetric
+from owrx.metrics import Metrics, CounterMetric, DirectMetric, HistogramMetric
+from owrx.audio.pool import DecoderPool
 from queue import Queue, Full, Empty
-import subprocess
+from collections import deque
+import itertools
+import heapq
+import math
+import time
 import os
 import threading
 
@@ -20,47 +25,40 @@ class QueueJobResult:
 
 
 class QueueJob(object):
-    def __init__(self, profile, frequency, writer, file):
+    def __init__(self, profile, frequency, writer, file, memoryFile=None):
         self.profile = profile
         self.frequency = frequency
         self.writer = writer
         self.file = file
+        # when decoding from memory, the file is a symlink to this memory file
+        self.memoryFile = memoryFile
+        # jobs are created at the end of their interval
+        self.created = time.time()
+        self.deadline = self.created + profile.getDecodingBudget()
+
+    def getKey(self):
+        return "{0}_{1}".format(self.profile.getMode(), self.profile.getInterval())
 
     def run(self):
         logger.debug("processing file %s", self.file)
         tmp_dir = CoreConfig().get_temporary_directory()
-        decoder = subprocess.Popen(
-            ["nice", "-n", "10"] + self.profile.decoder_commandline(self.file),
-            stdout=subprocess.PIPE,
-            cwd=tmp_dir,
-            close_fds=True,
-            )
-        lines = None
-        try:
-            lines = [l for l in decoder.stdout]
-        except OSError:
-            decoder.stdout.flush()
-            # TODO uncouple parsing from the output so that decodes can still go to the map and the spotters
-            logger.debug("output has gone away while decoding job.")
+        lines, rc = DecoderPool.getSharedInstance().decode(self.profile.decoder_commandline(self.file), tmp_dir)
 
         # keep this out of the try/except
         if lines is not None:
             self.writer.sendResult(QueueJobResult(self.profile, self.frequency, lines))
 
-        try:
-            rc = decoder.wait(timeout=10)
-            if rc != 0:
-                raise RuntimeError("decoder return code: {0}".format(rc))
-        except subprocess.TimeoutExpired:
-            logger.warning("subprocess (pid=%i}) did not terminate correctly; sending kill signal.", decoder.pid)
-            decoder.kill()
-            raise
+        if rc != 0:
+            raise RuntimeError("decoder return code: {0}".format(rc))
 
     def unlink(self):
         try:
             os.unlink(self.file)
         except FileNotFoundError:
             pass
+        if self.memoryFile is not None:
+            self.memoryFile.release()
+            self.memoryFile = None
 
 
 PoisonPill = object()
@@ -77,13 +75,17 @@ class QueueWorker(threading.Thread):
             job = self.queue.get()
             if job is PoisonPill:
                 self.stop()
+                self.queue.onWorkerExit(self)
             else:
+                start = time.monotonic()
                 try:
                     job.run()
+                    self.queue.onSuccess(job)
                 except Exception:
                     logger.exception("failed to decode job")
                     self.queue.onError()
                 finally:
+                    self.queue.onDuration(job, time.monotonic() - start)
                     job.unlink()
 
             self.queue.task_done()
@@ -93,9 +95,27 @@ class QueueWorker(threading.Thread):
 
 
 class DecoderQueue(Queue):
+    """
+    Decoding jobs, ordered by their deadline (end of interval plus the decoding budget of the profile).
+
+    Jobs that can no longer finish before their deadline, based on the measured decoding time of their profile, are
+    skipped. If the queue is full, those jobs are dropped first, then the stalest ones, so that new jobs are not lost.
+    The number of workers grows with the measured load, and is never lower than the configured number. Workers are
+    removed by queueing a PoisonPill; whichever worker takes it leaves the worker list.
+    """
+    stopTimeout = 10
     sharedInstance = None
     creationLock = threading.Lock()
 
+    # weight of a new measurement in the average decoding time of a profile
+    durationSmoothing = 0.2
+    # jobs arriving in this window are used to calculate the load
+    loadWindow = 300
+    # target utilisation of the workers
+    targetLoad = 0.7
+    resizeInterval = 10
+    latencyBuckets = [1, 2, 5, 10, 15, 20, 30, 60, 120, 300]
+
     @staticmethod
     def getSharedInstance():
         with DecoderQueue.creationLock:
@@ -113,7 +133,20 @@ class DecoderQueue(Queue):
     def __init__(self):
         pm = Config.get()
         super().__init__(pm["decoding_queue_length"])
+        # running workers, including those that are about to take a PoisonPill
         self.workers = []
+        # number of PoisonPills queued for shrinking that have not been taken yet
+        self.stopping = 0
+        # protects the worker list, which is changed by the config, by put() and by exiting workers
+        self.workersLock = threading.RLock()
+        self.minWorkers = 0
+        self.maxWorkers = max(os.cpu_count() or 1, 1)
+        self.statsLock = threading.Lock()
+        # average decoding time per profile key
+        self.durations = {}
+        # (arrival time, profile key) of recent jobs
+        self.arrivals = deque()
+        self.lastResize = 0
         self._setWorkers(pm["decoding_queue_workers"])
         self.subscriptions = [
             pm.wireProperty("decoding_queue_length", self._setMaxSize),
@@ -121,64 +154,195 @@ class DecoderQueue(Queue):
         ]
         metrics = Metrics.getSharedInstance()
         metrics.addMetric("decoding.queue.length", DirectMetric(self.qsize))
+        metrics.addMetric("decoding.queue.workers", DirectMetric(self.getWorkerCount))
         self.inCounter = CounterMetric()
         metrics.addMetric("decoding.queue.in", self.inCounter)
         self.outCounter = CounterMetric()
         metrics.addMetric("decoding.queue.out", self.outCounter)
         self.overflowCounter = CounterMetric()
         metrics.addMetric("decoding.queue.overflow", self.overflowCounter)
+        self.expiredCounter = CounterMetric()
+        metrics.addMetric("decoding.queue.expired", self.expiredCounter)
         self.errorCounter = CounterMetric()
         metrics.addMetric("decoding.queue.error", self.errorCounter)
 
+    # Queue internals: a heap ordered by deadline. The PoisonPill goes first.
+    def _init(self, maxsize):
+        self.queue = []
+        self.sequence = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        deadline = -math.inf if item is PoisonPill else item.deadline
+        heapq.heappush(self.queue, (deadline, next(self.sequence), item))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[2]
+
     def _setMaxSize(self, size):
         if self.maxsize == size:
             return
         self.maxsize = size
 
     def _setWorkers(self, workers):
-        while len(self.workers) > workers:
-            logger.debug("stopping one worker")
-            self.workers.pop().stop()
-        while len(self.workers) < workers:
-            logger.debug("starting one worker")
-            self.workers.append(self.newWorker())
+        with self.workersLock:
+            self.minWorkers = workers
+            self._resize(workers)
+
+    def _resize(self, workers):
+        with self.workersLock:
+            workers = max(self.minWorkers, min(workers, self.maxWorkers))
+            while self.getWorkerCount() > workers:
+                logger.debug("stopping one worker")
+                self.stopping += 1
+                self._putPoisonPill()
+            while self.getWorkerCount() < workers:
+                logger.debug("starting one worker")
+                self.workers.append(self.newWorker())
+
+    def _putPoisonPill(self):
+        # bypasses the size limit, since a full queue must not keep workers from being stopped
+        with self.mutex:
+            self._put(PoisonPill)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def onWorkerExit(self, worker):
+        with self.workersLock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+            if self.stopping > 0:
+                self.stopping -= 1
+
+    def getWorkerCount(self):
+        with self.workersLock:
+            return len(self.workers) - self.stopping
+
+    def getExpectedDuration(self, job):
+        with self.statsLock:
+            return self.durations.get(job.getKey(), 0)
+
+    def canFinish(self, job, now=None):
+        if now is None:
+            now = time.time()
+        return now + self.getExpectedDuration(job) <= job.deadline
+
+    def getLoad(self):
+        """
+        Number of busy workers needed for the jobs that arrived recently, based on their measured decoding times.
+        """
+        now = time.time()
+        with self.statsLock:
+            while self.arrivals and self.arrivals[0][0] < now - self.loadWindow:
+                self.arrivals.popleft()
+            if not self.arrivals:
+                return 0
+            window = min(self.loadWindow, max(now - self.arrivals[0][0], 1))
+            work = sum(self.durations.get(key, 0) for _, key in self.arrivals)
+        return work / window
+
+    def _checkWorkers(self):
+        with self.workersLock:
+            now = time.monotonic()
+            if now - self.lastResize < self.resizeInterval:
+                return
+            self.lastResize = now
+            workers = math.ceil(self.getLoad() / self.targetLoad)
+            if workers != len(self.workers):
+                logger.debug("adjusting decoding workers to %i", workers)
+                self._resize(workers)
 
     def stop(self):
         logger.debug("shutting down the queue")
         while self.subscriptions:
             self.subscriptions.pop().cancel()
         try:
-            # purge all remaining jobs
+            # purge all remaining jobs, and the PoisonPills of shrinking
             while not self.empty():
-                job = self.get()
-                job.unlink()
+                job = self.get_nowait()
+                if job is not PoisonPill:
+                    job.unlink()
                 self.task_done()
         except Empty:
             pass
-        # put() a PoisonPill for all active workers to shut them down
-        for w in self.workers:
+        # one PoisonPill for every running worker, including those that were about to be stopped
+        with self.workersLock:
+            workers = list(self.workers)
+            self.stopping = 0
+        for w in workers:
             if w.is_alive():
-                self.put(PoisonPill)
+                self._putPoisonPill()
         self.join()
+        for w in workers:
+            w.join(self.stopTimeout)
+
+    def _evict(self, now):
+        # needs to be called with the mutex held. returns the jobs removed from the queue.
+        evicted = [e for e in self.queue if e[2] is not PoisonPill and not self.canFinish(e[2], now)]
+        if not evicted:
+            stalest = [e for e in self.queue if e[2] is not PoisonPill]
+            if not stalest:
+                return []
+            evicted = [min(stalest, key=lambda e: e[2].created)]
+        self.queue = [e for e in self.queue if e not in evicted]
+        heapq.heapify(self.queue)
+        return [e[2] for e in evicted]
 
     def put(self, item, **kwargs):
         self.inCounter.inc()
+        with self.statsLock:
+            self.arrivals.append((time.time(), item.getKey()))
+        evicted = []
+        with self.mutex:
+            if 0 < self.maxsize <= self._qsize():
+                evicted = self._evict(time.time())
+        for job in evicted:
+            logger.debug("decoding queue full; dropping stale job %s", job.file)
+            self.overflowCounter.inc()
+            job.unlink()
+            self.task_done()
         try:
             super(DecoderQueue, self).put(item, block=False)
         except Full:
             self.overflowCounter.inc()
             raise
+        self._checkWorkers()
 
     def get(self, **kwargs):
-        # super.get() is blocking, so it would mess up the stats to inc() first
-        out = super(DecoderQueue, self).get(**kwargs)
-        self.outCounter.inc()
-        return out
+        while True:
+            # super.get() is blocking, so it would mess up the stats to inc() first
+            out = super(DecoderQueue, self).get(**kwargs)
+            if out is PoisonPill or self.canFinish(out):
+                self.outCounter.inc()
+                return out
+            logger.debug("skipping job %s, it cannot finish before its deadline", out.file)
+            self.expiredCounter.inc()
+            out.unlink()
+            self.task_done()
 
     def newWorker(self):
         worker = QueueWorker(self)
         worker.start()
         return worker
 
+    def onSuccess(self, job):
+        name = "decoding.queue.latency.{0}".format(job.profile.getMode().lower())
+        metrics = Metrics.getSharedInstance()
+        metric = metrics.getMetric(name)
+        if metric is None:
+            metric = HistogramMetric(self.latencyBuckets)
+            metrics.addMetric(name, metric)
+        metric.observe(time.time() - job.created)
+
+    def onDuration(self, job, duration):
+        key = job.getKey()
+        with self.statsLock:
+            if key in self.durations:
+                self.durations[key] += (duration - self.durations[key]) * self.durationSmoothing
+            else:
+                self.durations[key] = duration
+
     def onError(self):
         self.errorCounter.inc()
@@ -1,4 +1,5 @@
 from owrx.config.core import CoreConfig
+from owrx.config import Config
 from owrx.audio import AudioChopperProfile
 from owrx.audio.queue import DecoderQueue
 import threading
@@ -149,3 +150,172 @@ class AudioWriter(object):
         except Exception:
             logger.exception("error removing undecoded file")
         self.wavefile = None
+
+
+def writeWaveFile(file, chunks):
+    waveFile = wave.open(file, "wb")
+    waveFile.setnchannels(1)
+    waveFile.setsampwidth(2)
+    waveFile.setframerate(12000)
+    # setting the length upfront avoids seeking back to fix up the header
+    waveFile.setnframes(sum(len(c) for c in chunks) // 2)
+    for chunk in chunks:
+        waveFile.writeframes(chunk)
+    waveFile.close()
+
+
+class MemoryWaveFile(object):
+    """
+    The audio of one interval, kept in an anonymous memory file (memfd). Decoders get a symlink to /proc/<pid>/fd/<fd>
+    in the temporary directory, which keeps the timestamp in the filename, but resolves to the memory file as long as
+    this process holds it open. This also works for decoders started from the pre-forked slots of the DecoderPool.
+    The memory file is closed when the last job has released it.
+    """
+    def __init__(self, writer_id, chunks):
+        self.fd = os.memfd_create("openwebrx-audiochopper-{id}".format(id=writer_id))
+        self.refs = 1
+        self.lock = threading.Lock()
+        with open(self.fd, "wb", closefd=False) as f:
+            writeWaveFile(f, chunks)
+
+    def getPath(self):
+        return "/proc/{pid}/fd/{fd}".format(pid=os.getpid(), fd=self.fd)
+
+    def acquire(self):
+        with self.lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self.lock:
+            self.refs -= 1
+            if self.refs > 0 or self.fd is None:
+                return
+            fd = self.fd
+            self.fd = None
+        os.close(fd)
+
+
+class MemoryAudioWriter(AudioWriter):
+    """
+    Collects the audio in memory instead of a master wave file, and hands it to the decoders as a memory file. Only
+    decoders that cannot open a memory file get a regular file.
+
+    The audio is stored in fixed size chunks that are allocated as needed and recycled after every interval, so the
+    memory used is about one interval of audio. Long intervals would still take up too much memory, so those are
+    recorded to files.
+    """
+    # about 11 seconds of 12kHz 16bit mono audio
+    chunkSize = 256 * 1024
+    # longest interval that is kept in memory, about 14MB of audio
+    maxInterval = 600
+
+    @staticmethod
+    def isEnabled(interval):
+        return (
+            Config.get()["decoding_in_memory"]
+            and interval <= MemoryAudioWriter.maxInterval
+            and hasattr(os, "memfd_create")
+            and os.path.isdir("/proc/self/fd")
+        )
+
+    def __init__(self, chopper, interval, profiles: List[AudioChopperProfile]):
+        super().__init__(chopper, interval, profiles)
+        # filled chunks of the running interval; all but the last one are full
+        self.chunks = []
+        self.fill = 0
+        self.freeChunks = []
+        # 12kHz 16bit mono, plus some slack for the timer
+        self.maxLength = int((interval + 2) * 12000) * 2
+        self.timestamp = None
+        self.overflow = False
+
+    def getLength(self):
+        if not self.chunks:
+            return 0
+        return (len(self.chunks) - 1) * self.chunkSize + self.fill
+
+    def _switchFiles(self):
+        with self.switchingLock:
+            chunks = self.chunks
+            fill = self.fill
+            timestamp = self.timestamp
+            self.chunks = []
+            self.fill = 0
+            self.timestamp = datetime.utcnow()
+            self.overflow = False
+
+        if timestamp is None:
+            logger.warning("switchfiles() with no running interval. sequencing problem?")
+            return
+
+        data = [memoryview(c) for c in chunks]
+        if data:
+            data[-1] = data[-1][:fill]
+        tmp_dir = CoreConfig().get_temporary_directory()
+        memoryFile = None
+        try:
+            for profile in self.profiles:
+                filename = "{tmp_dir}/openwebrx-audiochopper-{pid}-{timestamp}.wav".format(
+                    tmp_dir=tmp_dir,
+                    pid=id(profile),
+                    timestamp=timestamp.strftime(profile.getFileTimestampFormat()),
+                )
+                try:
+                    if memoryFile is None:
+                        memoryFile = MemoryWaveFile(id(self), data)
+                    os.symlink(memoryFile.getPath(), filename)
+                    jobFile = memoryFile.acquire()
+                except OSError:
+                    logger.exception("Error while creating job files")
+                    continue
+
+                job = self.chopper.createJob(profile, filename, jobFile)
+                try:
+                    DecoderQueue.getSharedInstance().put(job)
+                except Full:
+                    logger.warning("decoding queue overflow; dropping one file")
+                    job.unlink()
+        finally:
+            for view in data:
+                view.release()
+            # the jobs hold their own references
+            if memoryFile is not None:
+                memoryFile.release()
+            # the audio has been copied, so the chunks can take the next interval
+            with self.switchingLock:
+                self.freeChunks += chunks
+
+        self._scheduleNextSwitch()
+
+    def start(self):
+        if self.timestamp is not None:
+            logger.warning("interval is running on startup, sequencing problem?")
+        self.chunks = []
+        self.fill = 0
+        self.timestamp = datetime.utcnow()
+        self._scheduleNextSwitch()
+
+    def write(self, data):
+        with self.switchingLock:
+            size = min(len(data), self.maxLength - self.getLength())
+            if size < len(data) and not self.overflow:
+                logger.warning("audio buffer overflow; dropping samples")
+                self.overflow = True
+            offset = 0
+            while offset < size:
+                if not self.chunks or self.fill == self.chunkSize:
+                    self.chunks.append(self.freeChunks.pop() if self.freeChunks else bytearray(self.chunkSize))
+                    self.fill = 0
+                count = min(size - offset, self.chunkSize - self.fill)
+                self.chunks[-1][self.fill:self.fill + count] = data[offset:offset + count]
+                self.fill += count
+                offset += count
+
+    def stop(self):
+        self.cancelTimer()
+        with self.switchingLock:
+            self.timestamp = None
+            self.chunks = []
+            self.fill = 0
+            self.freeChunks = []
@@ -1,7 +1,10 @@
 from owrx.modes import Modes, DigitalMode
 from datetime import datetime, timezone
 from owrx.config import Config
+import threading
+import bisect
 import json
+import time
 import os
 
 import logging
@@ -74,18 +77,82 @@ class Band(object):
         return [e for e in self.frequencies if low <= e["frequency"] <= hi]
 
 
+class BandIndex(object):
+    """
+    Lookup structure for the bands of a bandplan.
+
+    The band bounds split the spectrum into elementary segments: the bound frequencies themselves, and the open
+    intervals between them. The bands covering each segment are computed once, so that point and range queries only
+    need a binary search. Results are always in bandplan order, since bands may overlap.
+    """
+    def __init__(self, bands):
+        self.bands = bands
+        self.points = sorted({bound for band in bands for bound in band.getBounds()})
+        # bands containing each point, and bands containing the interval between each point and the next
+        self.pointBands = [[b for b in bands if b.inBand(p)] for p in self.points]
+        self.gapBands = [
+            [b for b in bands if b.lower_bound <= low and high <= b.upper_bound]
+            for low, high in zip(self.points, self.points[1:])
+        ]
+        order = {id(band): i for i, band in enumerate(bands)}
+        self.dials = sorted(
+            ((e["frequency"], order[id(b)], i, e) for b in bands for i, e in enumerate(b.frequencies)),
+            key=lambda d: d[0:3],
+        )
+        self.dialFrequencies = [d[0] for d in self.dials]
+        self.order = order
+
+    def findBands(self, freq):
+        index = bisect.bisect_left(self.points, freq)
+        if index < len(self.points) and self.points[index] == freq:
+            return self.pointBands[index]
+        if 0 < index < len(self.points):
+            return self.gapBands[index - 1]
+        return []
+
+    def findBandsInRange(self, low_freq, high_freq):
+        if low_freq >= high_freq:
+            # not a proper range, but still has a defined result
+            return [band for band in self.bands if band.inRange(low_freq, high_freq)]
+        # points strictly within the range, and the intervals between points that overlap with the range
+        start = bisect.bisect_right(self.points, low_freq)
+        end = bisect.bisect_left(self.points, high_freq)
+        found = {}
+        for index in range(start, end):
+            for band in self.pointBands[index]:
+                found[id(band)] = band
+        for index in range(max(start - 1, 0), min(end, len(self.gapBands))):
+            for band in self.gapBands[index]:
+                found[id(band)] = band
+        return sorted(found.values(), key=lambda b: self.order[id(b)])
+
+    def collectDialFrequencies(self, range):
+        (low, hi) = range
+        start = bisect.bisect_left(self.dialFrequencies, low)
+        end = bisect.bisect_right(self.dialFrequencies, hi)
+        # same order as collecting them band by band
+        return [d[3] for d in sorted(self.dials[start:end], key=lambda d: d[1:3])]
+
+
 class Bandplan(object):
     sharedInstance = None
+    creationLock = threading.Lock()
+    # minimum time between checks for modifications of the bandplan file, in seconds
+    checkInterval = 10
 
     @staticmethod
     def getSharedInstance():
-        if Bandplan.sharedInstance is None:
-            Bandplan.sharedInstance = Bandplan()
+        with Bandplan.creationLock:
+            if Bandplan.sharedInstance is None:
+                Bandplan.sharedInstance = Bandplan()
         return Bandplan.sharedInstance
 
     def __init__(self):
         self.bands = []
+        self.index = BandIndex([])
         self.file_modified = None
+        self.lastCheck = None
+        self.refreshLock = threading.Lock()
         self.fileList = ["/etc/openwebrx/bands{0}.json", "bands{0}.json"]
         Config().get().wireProperty("bandplan_region", self._updateRegion)
 
@@ -93,12 +160,20 @@ class Bandplan(object):
         # Make sure band plan is refreshed the next time it is queried
         self.file_modified = None
 
-    def _refresh(self):
-        modified = self._getFileModifiedTimestamp()
-        if self.file_modified is None or modified > self.file_modified:
-            logger.debug("reloading bands from disk due to file modification")
-            self.bands = self._loadBands()
-            self.file_modified = modified
+    def _refresh(self) -> BandIndex:
+        now = time.monotonic()
+        if self.file_modified is not None and now - self.lastCheck < self.checkInterval:
+            return self.index
+        with self.refreshLock:
+            modified = self._getFileModifiedTimestamp()
+            if self.file_modified is None or modified > self.file_modified:
+                logger.debug("reloading bands from disk due to file modification")
+                bands = self._loadBands()
+                self.index = BandIndex(bands)
+                self.bands = bands
+                self.file_modified = modified
+            self.lastCheck = now
+        return self.index
 
     def _getRegionFile(self, file):
         region = Config.get()["bandplan_region"]
@@ -134,12 +209,10 @@ class Bandplan(object):
         return []
 
     def findBandsInRange(self, low_freq, high_freq):
-        self._refresh()
-        return [band for band in self.bands if band.inRange(low_freq, high_freq)]
+        return self._refresh().findBandsInRange(low_freq, high_freq)
 
     def findBands(self, freq):
-        self._refresh()
-        return [band for band in self.bands if band.inBand(freq)]
+        return list(self._refresh().findBands(freq))
 
     def findBand(self, freq):
         bands = self.findBands(freq)
@@ -149,5 +222,4 @@ class Bandplan(object):
             return None
 
     def collectDialFrequencies(self, range):
-        self._refresh()
-        return [e for b in self.bands for e in b.getDialFrequencies(range)]
+        return self._refresh().collectDialFrequencies(range)
@@ -1,7 +1,10 @@
 from datetime import datetime, timezone
 from owrx.config.core import CoreConfig
 from owrx.config import Config
+import threading
+import bisect
 import json
+import time
 import os.path
 import os
 
@@ -78,16 +81,30 @@ class BookmarkSubscription(object):
 class Bookmarks(object):
     MAIN_DIR = "/etc/openwebrx/bookmarks.d"
     sharedInstance = None
+    creationLock = threading.Lock()
+    # minimum time between checks for modifications of the bookmark files, in seconds
+    checkInterval = 10
+    # number of frequency ranges to keep the serialized bookmarks for
+    maxCachedRanges = 64
 
     @staticmethod
     def getSharedInstance():
-        if Bookmarks.sharedInstance is None:
-            Bookmarks.sharedInstance = Bookmarks()
+        with Bookmarks.creationLock:
+            if Bookmarks.sharedInstance is None:
+                Bookmarks.sharedInstance = Bookmarks()
         return Bookmarks.sharedInstance
 
     def __init__(self):
         self.file_modified = None
+        self.lastCheck = None
         self.bookmarks = []
+        # increased on every change to the bookmarks, invalidates the index and the cache
+        self.generation = 0
+        self.index = None
+        self.cache = {}
+        # JSON encoding of the cached results, by range
+        self.encodedCache = {}
+        self.lock = threading.RLock()
         self.subscriptions = []
         # Find all known bookmark files
         self.fileList = self._getBookmarkFiles()
@@ -132,11 +149,32 @@ class Bookmarks(object):
         return result
 
     def _refresh(self):
-        modified = self._getFileModifiedTimestamp()
-        if self.file_modified is None or modified > self.file_modified:
-            logger.debug("reloading bookmarks from disk due to file modification")
-            self.bookmarks = self._loadBookmarks()
-            self.file_modified = modified
+        now = time.monotonic()
+        if self.file_modified is not None and now - self.lastCheck < self.checkInterval:
+            return
+        with self.lock:
+            modified = self._getFileModifiedTimestamp()
+            if self.file_modified is None or modified > self.file_modified:
+                logger.debug("reloading bookmarks from disk due to file modification")
+                self.bookmarks = self._loadBookmarks()
+                self.file_modified = modified
+                self._invalidate()
+            self.lastCheck = now
+
+    def _invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.index = None
+            self.cache = {}
+            self.encodedCache = {}
+
+    def _getIndex(self):
+        # bookmarks sorted by frequency, along with their frequencies for bisecting
+        with self.lock:
+            if self.index is None:
+                ordered = sorted(self.bookmarks, key=lambda b: b.getFrequency())
+                self.index = ([b.getFrequency() for b in ordered], ordered)
+            return self.index
 
     def _getFileModifiedTimestamp(self):
         timestamp = 0
@@ -181,7 +219,41 @@ class Bookmarks(object):
             return self.bookmarks
         else:
             (lo, hi) = range
-            return [b for b in self.bookmarks if lo <= b.getFrequency() <= hi]
+            frequencies, ordered = self._getIndex()
+            return ordered[bisect.bisect_left(frequencies, lo):bisect.bisect_right(frequencies, hi)]
+
+    def getSerializedBookmarks(self, range):
+        """
+        Bookmarks in the range as sent to the clients. The result is shared between all callers requesting the same
+        range, and must not be modified.
+        """
+        self._refresh()
+        with self.lock:
+            if range in self.cache:
+                return self.cache[range]
+            generation = self.generation
+        result = [b.__dict__() for b in self.getBookmarks(range)]
+        with self.lock:
+            if generation == self.generation:
+                if len(self.cache) >= self.maxCachedRanges:
+                    del self.cache[next(iter(self.cache))]
+                self.cache[range] = result
+        return result
+
+    def getEncodedBookmarks(self, range) -> str:
+        """
+        JSON encoding of getSerializedBookmarks(), encoded once for all callers requesting the same range.
+        """
+        result = self.getSerializedBookmarks(range)
+        with self.lock:
+            if range in self.encodedCache:
+                return self.encodedCache[range]
+            generation = self.generation
+        encoded = json.dumps(result, allow_nan=False)
+        with self.lock:
+            if generation == self.generation and range in self.cache:
+                self.encodedCache[range] = encoded
+        return encoded
 
     @staticmethod
     def _getMainBookmarkFile():
@@ -198,15 +270,19 @@ class Bookmarks(object):
         with open(Bookmarks._getMainBookmarkFile(), "w") as file:
             file.write(jsonContent)
         self.file_modified = self._getFileModifiedTimestamp()
+        # bookmarks are modified in place before they are stored
+        self._invalidate()
 
     def addBookmark(self, bookmark: Bookmark):
         self.bookmarks.append(bookmark)
+        self._invalidate()
         self.notifySubscriptions(bookmark)
 
     def removeBookmark(self, bookmark: Bookmark):
         if bookmark not in self.bookmarks:
             return
         self.bookmarks.remove(bookmark)
+        self._invalidate()
         self.notifySubscriptions(bookmark)
 
     def notifySubscriptions(self, bookmark: Bookmark):
@@ -219,7 +295,7 @@ class Bookmarks(object):
 
     def subscribe(self, range, callback):
         sub = BookmarkSubscription(self, range, callback)
-        self.subscriptions.append(BookmarkSubscription(self, range, callback))
+        self.subscriptions.append(sub)
         return sub
 
     def unsubscribe(self, subscription: BookmarkSubscription):
@@ -170,6 +170,7 @@ class ClientRegistry(object):
             entry = {
                 "ts"   : c.conn.startTime,
                 "ip"   : self.getIp(c.conn.handler),
+                "rtt"  : c.conn.getRtt(),
                 "ban"  : False
             }
             if c.sdr is not None:
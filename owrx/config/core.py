@@ -18,6 +18,8 @@ class CoreConfig(object):
         "web": {
             "port": 8073,
             "ipv6": True,
+            "websocket_writer": "vectored",
+            "websocket_mode": "threaded",
             # won't work this way because values must be strings, but this is effectively the way it behaves.
             #"bind_address": None,
         },
@@ -69,6 +71,8 @@ class CoreConfig(object):
         self.web_port = config.getint("web", "port")
         self.web_ipv6 = config.getboolean("web", "ipv6")
         self.web_bind_address = config.get("web", "bind_address", fallback=None)
+        self.web_websocket_writer = config.get("web", "websocket_writer")
+        self.web_websocket_mode = config.get("web", "websocket_mode")
         self.aprs_symbols_path = config.get("aprs", "symbols_path")
         self.temperature_sensor = config.get("core", "temperature_sensor")
 
@@ -90,6 +94,12 @@ class CoreConfig(object):
     def get_web_bind_address(self) -> Optional[str]:
         return self.web_bind_address
 
+    def get_web_websocket_writer(self) -> str:
+        return self.web_websocket_writer
+
+    def get_web_websocket_mode(self) -> str:
+        return self.web_websocket_mode
+
     def get_data_directory(self) -> str:
         return self.data_directory
 
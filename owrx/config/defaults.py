@@ -378,6 +378,8 @@ defaultConfig = PropertyLayer(
     keep_files=20,
     decoding_queue_workers=2,
     decoding_queue_length=10,
+    decoding_in_memory=False,
+    decoding_prefork=False,
     wsjt_decoding_depth=3,
     wsjt_decoding_depths=PropertyLayer(jt65=1),
     fst4_enabled_intervals=[15, 30],
@@ -387,6 +389,7 @@ defaultConfig = PropertyLayer(
     js8_decoding_depth=3,
     services_enabled=False,
     services_decoders=["ft8", "ft4", "wspr", "packet"],
+    services_channelizer=False,
     aprs_callsign="N0CALL",
     aprs_igate_enabled=False,
     aprs_igate_server="euro.aprs2.net",
@@ -402,6 +405,7 @@ defaultConfig = PropertyLayer(
     # pskreporter_antenna_information=None,
     wsprnet_enabled=False,
     wsprnet_callsign="N0CALL",
+    wsprnet_url="http://wsprnet.org/post/",
     mqtt_enabled=False,
     mqtt_host="localhost",
     mqtt_use_ssl=False,
@@ -413,6 +417,7 @@ defaultConfig = PropertyLayer(
     vdl2_ttl=1800,
     hfdl_ttl=1800,
     acars_ttl=1800,
+    aircraft_max_count=10000,
     fax_lpm=120,
     fax_min_length=200,
     fax_max_length=1500,
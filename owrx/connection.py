@@ -15,8 +15,11 @@ from owrx.property import PropertyStack, PropertyDeleted
 from owrx.modes import Modes, DigitalMode
 from owrx.config import Config
 from owrx.waterfall import WaterfallOptions
+from owrx.image import isScanline, encodeScanline
 from owrx.websocket import Handler
+from owrx.metrics import Metrics, CounterMetric
 from queue import Queue, Full, Empty
+from collections import deque
 from abc import ABCMeta, abstractmethod
 import json
 import threading
@@ -28,12 +31,39 @@ import logging
 logger = logging.getLogger(__name__)
 
 PoisonPill = object()
+FlushFrames = object()
+
+
+class EncodedFrame(object):
+    """
+    A frame encoded by WebSocketConnection.encodeFrame() that must not be dropped.
+    """
+    def __init__(self, frame: bytes):
+        self.frame = frame
 
 
 class Client(Handler, metaclass=ABCMeta):
+    # number of pre-encoded frames kept per client before the oldest ones are dropped
+    frameQueueDepth = 4
+    metricLock = threading.Lock()
+
+    @staticmethod
+    def getFramesDroppedMetric():
+        # shared by all clients, so that the count survives disconnects
+        with Client.metricLock:
+            metrics = Metrics.getSharedInstance()
+            metric = metrics.getMetric("openwebrx.spectrum.dropped")
+            if metric is None:
+                metric = CounterMetric()
+                metrics.addMetric("openwebrx.spectrum.dropped", metric)
+            return metric
+
     def __init__(self, conn):
         self.conn = conn
         self.multithreadingQueue = Queue(100)
+        self.frameQueue = deque(maxlen=self.frameQueueDepth)
+        self.frameLock = threading.Lock()
+        self.framesDropped = Client.getFramesDroppedMetric()
 
         def mp_passthru():
             run = True
@@ -42,6 +72,10 @@ class Client(Handler, metaclass=ABCMeta):
                     data = self.multithreadingQueue.get()
                     if data is PoisonPill:
                         run = False
+                    elif data is FlushFrames:
+                        self._flushFrames()
+                    elif isinstance(data, EncodedFrame):
+                        self._sendEncodedFrame(data.frame)
                     else:
                         self.send(data)
                     self.multithreadingQueue.task_done()
@@ -53,7 +87,11 @@ class Client(Handler, metaclass=ABCMeta):
             # unset the queue object to free shared memory file descriptors
             self.multithreadingQueue = None
 
-        threading.Thread(target=mp_passthru, name="connection_mp_passthru").start()
+        # connections on the event loop never block on send(), so there is no need for a passthru thread
+        if conn.sendsNonBlocking():
+            self.multithreadingQueue = None
+        else:
+            threading.Thread(target=mp_passthru, name="connection_mp_passthru").start()
 
     def send(self, data):
         try:
@@ -62,7 +100,29 @@ class Client(Handler, metaclass=ABCMeta):
             logger.exception("error in Client::send()")
             self.close(error=True)
 
+    def _sendEncodedFrame(self, frame: bytes):
+        try:
+            self.conn.sendFrame(frame, droppable=False)
+        except IOError:
+            logger.exception("error in Client::_sendEncodedFrame()")
+            self.close(error=True)
+
+    def _flushFrames(self):
+        while True:
+            with self.frameLock:
+                if not self.frameQueue:
+                    return
+                frame = self.frameQueue.popleft()
+            try:
+                self.conn.sendFrame(frame)
+            except IOError:
+                logger.exception("error in Client::_flushFrames()")
+                self.close(error=True)
+                return
+
     def close(self, error: bool = False):
+        with self.frameLock:
+            self.frameQueue.clear()
         if self.multithreadingQueue is not None:
             while True:
                 try:
@@ -77,6 +137,9 @@ class Client(Handler, metaclass=ABCMeta):
         self.conn.close(socketError=error)
 
     def mp_send(self, data):
+        if self.conn.sendsNonBlocking():
+            self.send(data)
+            return
         if self.multithreadingQueue is None:
             return
         try:
@@ -84,6 +147,31 @@ class Client(Handler, metaclass=ABCMeta):
         except Full:
             self.close(error=True)
 
+    def mp_send_frame(self, frame: bytes, droppable: bool = True):
+        """
+        Queue a frame that has already been encoded by WebSocketConnection.encodeFrame().
+        Frames are held in a short per-client queue; if the client cannot keep up, the oldest frames are dropped
+        instead of stalling the sender or disconnecting the client.
+        Frames that are not droppable are queued like any other message.
+        """
+        if self.conn.sendsNonBlocking():
+            # the connection's outgoing ring drops the oldest frames by itself
+            self.conn.sendFrame(frame, droppable=droppable)
+            return
+        if not droppable:
+            self.mp_send(EncodedFrame(frame))
+            return
+        if self.multithreadingQueue is None:
+            return
+        with self.frameLock:
+            wakeup = not self.frameQueue
+            if len(self.frameQueue) == self.frameQueue.maxlen:
+                self.framesDropped.inc()
+            self.frameQueue.append(frame)
+        # the passthru thread drains the whole frame queue, so it only needs to be woken up once
+        if wakeup:
+            self.mp_send(FlushFrames)
+
     @abstractmethod
     def handleTextMessage(self, conn, message):
         pass
@@ -229,15 +317,21 @@ class OpenWebRxReceiverClient(OpenWebRxClient, SdrSourceEventClient):
             if "center_freq" in configProps and "samp_rate" in configProps:
                 frequencyRange = (cf - srh, cf + srh)
                 dial_frequencies = Bandplan.getSharedInstance().collectDialFrequencies(frequencyRange)
-                bookmarks = [b.__dict__() for b in Bookmarks.getSharedInstance().getBookmarks(frequencyRange)]
+                eibiRange = self.stack["eibi_bookmarks_range"]
+                repeaterRange = self.stack["repeater_range"]
+                if eibiRange <= 0 and repeaterRange <= 0:
+                    # nothing to add, so all clients share the same encoding
+                    self.write_dial_frequencies(dial_frequencies)
+                    self.write_encoded_bookmarks(Bookmarks.getSharedInstance().getEncodedBookmarks(frequencyRange))
+                    return
+                # shared between clients, copy before adding more bookmarks
+                bookmarks = list(Bookmarks.getSharedInstance().getSerializedBookmarks(frequencyRange))
                 # Search EIBI schedule for bookmarks, if enabled
-                range = self.stack["eibi_bookmarks_range"]
-                if range > 0:
-                    bookmarks += [b.__dict__() for b in EIBI.getSharedInstance().currentBookmarks(frequencyRange, rangeKm=range)]
+                if eibiRange > 0:
+                    bookmarks += [b.__dict__() for b in EIBI.getSharedInstance().currentBookmarks(frequencyRange, rangeKm=eibiRange)]
                 # Search RepeaterBook for bookmarks, if enabled
-                range = self.stack["repeater_range"]
-                if range > 0:
-                    bookmarks += [b.__dict__() for b in Repeaters.getSharedInstance().getBookmarks(frequencyRange, rangeKm=range)]
+                if repeaterRange > 0:
+                    bookmarks += [b.__dict__() for b in Repeaters.getSharedInstance().getBookmarks(frequencyRange, rangeKm=repeaterRange)]
             self.write_dial_frequencies(dial_frequencies)
             self.write_bookmarks(bookmarks)
 
@@ -470,9 +564,10 @@ class OpenWebRxReceiverClient(OpenWebRxClient, SdrSourceEventClient):
                 self.dsp = DspManager(self, self.sdr)
         return self.dsp
 
-    def write_spectrum_data(self, data):
+    def write_spectrum_frame(self, frame: bytes):
+        # frame is pre-encoded and shared by all clients, see owrx.fft.SpectrumBroadcaster
         if not self.getDsp().getStopFFT():
-            self.mp_send(bytes([0x01]) + data)
+            self.mp_send_frame(frame)
 
     def write_dsp_data(self, data):
         self.send(bytes([0x02]) + data)
@@ -501,7 +596,11 @@ class OpenWebRxReceiverClient(OpenWebRxClient, SdrSourceEventClient):
         self.send(bytes([0x03]) + data)
 
     def write_secondary_demod(self, message):
-        self.send({"type": "secondary_demod", "value": message})
+        if isScanline(message):
+            # image scanlines go out as binary frames, see owrx.image
+            self.send(encodeScanline(message))
+        else:
+            self.send({"type": "secondary_demod", "value": message})
 
     def write_secondary_dsp_config(self, cfg):
         self.send({"type": "secondary_config", "value": cfg})
@@ -524,6 +623,10 @@ class OpenWebRxReceiverClient(OpenWebRxClient, SdrSourceEventClient):
     def write_bookmarks(self, bookmarks):
         self.send({"type": "bookmarks", "value": bookmarks})
 
+    def write_encoded_bookmarks(self, encoded: str):
+        # bookmarks that have already been encoded to JSON, sent as a text message
+        self.send('{"type": "bookmarks", "value": ' + encoded + '}')
+
     def write_bands(self, bands):
         self.send({"type": "bands", "value": bands})
 
@@ -609,6 +712,10 @@ class MapConnection(OpenWebRxClient):
     def write_update(self, update):
         self.mp_send({"type": "update", "value": update})
 
+    def write_update_frame(self, frame: bytes):
+        # updates are encoded once by the map and shared between all map clients
+        self.mp_send_frame(frame, droppable=False)
+
 
 class HandshakeMessageHandler(Handler):
     """
@@ -28,6 +28,7 @@ class ClientController(AuthorizationMixin, WebpageController):
                         <th>Chat Name</th>
                         <th>SDR Profile</th>
                         <th>Local Time</th>
+                        <th>RTT</th>
                         <th>Actions</th>
                     </tr>
                     {clients}
@@ -35,6 +36,7 @@ class ClientController(AuthorizationMixin, WebpageController):
                         <td></td>
                         <td></td>
                         <td></td>
+                        <td></td>
                         <td colspan="2" style="text-align:right;">
                             ban for
                             <select id="ban-minutes">
@@ -55,12 +57,13 @@ class ClientController(AuthorizationMixin, WebpageController):
 
     @staticmethod
     def renderClient(c):
-        return "<tr><td>{0}</td><td>{1}</td><td>{2}</td><td>{3} {4}</td><td>{5}</td></tr>".format(
+        return "<tr><td>{0}</td><td>{1}</td><td>{2}</td><td>{3} {4}</td><td>{5}</td><td>{6}</td></tr>".format(
             ClientController.renderIp(c["ip"]),
             c["name"] if "name" in c else "",
             "banned" if c["ban"] else c["sdr"] + " " + c["band"] if "sdr" in c else "n/a",
             "until" if c["ban"] else "since",
             c["ts"].strftime("%H:%M:%S"),
+            "{0} ms".format(round(c["rtt"] * 1000)) if c.get("rtt") is not None else "",
             ClientController.renderButtons(c)
         )
 
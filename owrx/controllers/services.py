@@ -42,9 +42,19 @@ class ServiceController(AuthorizationMixin, WebpageController):
                         <td colspan=3>{status}</td>
                     </tr>
                 </table>
+                <table class='table'>
+                    <tr>
+                        <th>SDR Profile</th>
+                        <th>Services</th>
+                        <th>Resampler Groups</th>
+                        <th>Predicted Cost</th>
+                    </tr>
+                    {plans}
+                </table>
         """.format(
             services="".join(ServiceController.renderService(c) for c in Services.listAll()),
-            status=ServiceController.renderStatus()
+            status=ServiceController.renderStatus(),
+            plans="".join(ServiceController.renderPlan(p) for p in Services.listPlans()),
         )
 
     # Get last started timestamp
@@ -119,3 +129,9 @@ class ServiceController(AuthorizationMixin, WebpageController):
         return "<tr><td>{0}</td><td>{1} {2}</td><td>{3}{4}</td></tr>".format(
             c["mode"].upper(), c["sdr"], c["band"], freq, unit
         )
+
+    @staticmethod
+    def renderPlan(p):
+        return "<tr><td>{0} {1}</td><td>{2}</td><td>{3}</td><td>{4} ({5} model)</td></tr>".format(
+            p["sdr"], p["band"], p["services"], p["groups"], p["cost"], p["model"]
+        )
@@ -21,5 +21,11 @@ class BackgroundDecodingController(SettingsFormController):
                     "Enable background decoding services",
                 ),
                 ServicesCheckboxInput("services_decoders", "Enabled services"),
+                CheckboxInput(
+                    "services_channelizer",
+                    "Use a single channelizer for all services of a device",
+                    infotext="Splits the SDR signal into the channels needed by the services in one pass, instead of "
+                    "resampling it separately for every group of services. Requires numpy.",
+                ),
             ),
         ]
@@ -131,6 +131,12 @@ class DecodingSettingsController(SettingsFormController):
                     validator=RangeValidator(30, 100000),
                     append="s",
                 ),
+                NumberInput(
+                    "aircraft_max_count",
+                    "Maximum number of aircraft",
+                    validator=RangeValidator(100, 1000000),
+                    infotext="Least recently heard aircraft are forgotten above this number",
+                ),
             ),
             Section(
                 "Paging messages",
@@ -224,6 +230,19 @@ class DecodingSettingsController(SettingsFormController):
                 "WSJT decoders",
                 NumberInput("decoding_queue_workers", "Number of decoding workers"),
                 NumberInput("decoding_queue_length", "Maximum length of decoding job queue"),
+                CheckboxInput(
+                    "decoding_in_memory",
+                    "Keep decoder audio in memory",
+                    infotext="Hands the recorded audio to the decoders without writing it to the temporary directory. "
+                    "Reduces writes on SD cards. Requires Linux. Intervals longer than 10 minutes (FST4 and FST4W) are "
+                    "still written to files.",
+                ),
+                CheckboxInput(
+                    "decoding_prefork",
+                    "Start decoders from pre-forked processes",
+                    infotext="Decoders are started from small helper processes, one per CPU core, instead of the "
+                    "main process. Each helper is pinned to its core.",
+                ),
                 NumberInput(
                     "wsjt_decoding_depth",
                     "Default WSJT decoding depth",
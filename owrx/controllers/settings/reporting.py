@@ -90,6 +90,11 @@ class ReportingController(SettingsFormController):
                     "wsprnet callsign",
                     infotext="This callsign will be used to send spots to wsprnet.org",
                 ),
+                TextInput(
+                    "wsprnet_url",
+                    "wsprnet upload URL",
+                    infotext="Address spots are posted to, only change this for testing",
+                ),
             ),
             Section(
                 "MQTT settings",
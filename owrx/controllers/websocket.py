@@ -5,6 +5,6 @@ from owrx.connection import HandshakeMessageHandler
 
 class WebSocketController(Controller):
     def indexAction(self):
-        conn = WebSocketConnection(self.handler, HandshakeMessageHandler())
-        # enter read loop
+        conn = WebSocketConnection.create(self.handler, HandshakeMessageHandler())
+        # enter read loop (or hand the connection over to the event loop in asyncio mode)
         conn.handle()
@@ -1,41 +1,21 @@
-from owrx.storage import Storage, DataRecorder
+from owrx.storage import Storage
+from owrx.image import ImageParser
 from owrx.config import Config
-from csdr.module import ThreadModule
-from pycsdr.types import Format
 from datetime import datetime
-import base64
-import pickle
-import os
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-class FaxParser(DataRecorder, ThreadModule):
+class FaxParser(ImageParser):
+    messageMode = "Fax"
+
     def __init__(self, service: bool = False):
-        self.service = service
-        self.data    = bytearray(b'')
-        self.width   = 0
-        self.height  = 0
         self.depth   = 0
-        self.line    = 0
         self.ioc     = 0
         self.lpm     = 0
         self.colors  = None
-        DataRecorder.__init__(self, "FAX", ".bmp", maxBytes = 16 * 1024 * 1024)
-        ThreadModule.__init__(self)
-
-    def getInputFormat(self) -> Format:
-        return Format.CHAR
-
-    def getOutputFormat(self) -> Format:
-        return Format.CHAR
-
-    def myName(self) -> str:
-        return "%s%s" % (
-            "Service" if self.service else "Client",
-            " at %dkHz" % (self.frequency // 1000) if self.frequency>0 else ""
-        )
+        super().__init__(service, "FAX", maxBytes = 16 * 1024 * 1024)
 
     def applyRLE(self, buf):
         out = b''
@@ -83,27 +63,8 @@ class FaxParser(DataRecorder, ThreadModule):
         self.lpm    = 0
         self.colors = None
 
-    def run(self):
-        logger.debug("%s starting..." % self.myName())
-        # Run while there is input data
-        while self.doRun:
-            # Read input data
-            inp = self.reader.read()
-            # Terminate if no input data
-            if inp is None:
-                self.doRun = False
-                break
-            # Add read data to the buffer
-            self.data = self.data + inp.tobytes()
-            # Process buffer contents
-            out = self.process()
-            # Keep processing while there is input to parse
-            while out is not None:
-                if len(out)>0:
-                    self.writer.write(pickle.dumps(out))
-                out = self.process()
+    def finish(self):
         # Done with whatever we are decoding
-        logger.debug("%s exiting..." % self.myName())
         self.finishFrame()
 
     def process(self):
@@ -112,49 +73,31 @@ class FaxParser(DataRecorder, ThreadModule):
 
         try:
             # Pixel size, line width in pixels and bytes
-            b = self.depth / 8 if self.depth>8 else 1
+            b = self.depth // 8 if self.depth>8 else 1
             w = self.width
             l = w * b
 
             # Search for BMP header and comments first, in case
             # previous bitmap terminates early
             ll = min(l, len(self.data)) if l>0 else len(self.data)
-            ph = self.data[0:ll].find(b'BM')
-            pc = self.data[0:ll].find(b' [')
+            ph = self.data.find(b'BM', 0, ll)
+            pc = self.data.find(b' [', 0, ll)
 
             #
             # If comment found, and we are not receiving an image...
             #
             if pc>=0 and (ph<0 or pc<ph) and l==0:
                 # Skip everything until ' ['
-                del self.data[0:pc]
-                # Look for the closing bracket
-                pc = self.data[0:ll].find(b']')
-                if pc>=0:
-                    # Extract message contents
-                    msg = self.data[2:pc].decode()
-                    # Remove parsed data
-                    del self.data[0:pc+1]
-                    # Log message
-                    logger.debug("%s says [%s]" % (self.myName(), msg))
-                    # If running as a service...
-                    if self.service:
-                        # Empty result
-                        out = {}
-                    else:
-                        # Compose result
-                        out = {
-                            "mode":      "Fax",
-                            "message":   msg,
-                            "frequency": self.frequency
-                        }
+                self.data.skip(pc)
+                # Parse message until the closing bracket
+                out = self.parseMessage()
 
             #
             # If BMP header ('BM ... <IOC> <LPM> ... <40> ...') found...
             #
             elif ph>=0 and ph+14<ll and self.data[ph+14]==40 and (self.data[ph+6]==144 or self.data[ph+6]==72) and (self.data[ph+7]==120 or self.data[ph+7]==60):
                 # Skip everything until 'BM'
-                del self.data[0:ph]
+                self.data.skip(ph)
                 # If got the entire header...
                 if len(self.data)>=54+4*256:
                     self.width  = self.data[18] + (self.data[19]<<8) + (self.data[20]<<16) + (self.data[21]<<24)
@@ -170,7 +113,7 @@ class FaxParser(DataRecorder, ThreadModule):
                     headerSize = 54 + (4*256 if self.depth==8 else 0)
                     # 256x4 palette follows the header
                     if headerSize>54:
-                        self.colors = self.data[54:headerSize]
+                        self.colors = self.data.getBytes(54, headerSize)
                     else:
                         self.colors = None
                     # Find mode name and time
@@ -185,7 +128,7 @@ class FaxParser(DataRecorder, ThreadModule):
                     if self.service:
                         # Create a new image file and write BMP header
                         self.newFile(fileName + ".bmp")
-                        self.writeFile(self.data[0:headerSize])
+                        self.writeBuffer(headerSize)
                         # Empty result
                         out = {}
                     else:
@@ -201,7 +144,7 @@ class FaxParser(DataRecorder, ThreadModule):
                             "frequency": self.frequency
                         }
                     # Remove parsed data
-                    del self.data[0:headerSize]
+                    self.data.skip(headerSize)
 
             #
             # If currently receiving image...
@@ -212,27 +155,17 @@ class FaxParser(DataRecorder, ThreadModule):
                     #    self.myName(), self.line, w, len(self.data)/b
                     #))
                     # Check for trailing lines marked with "END-PAGE!"
-                    frameEnded = self.data[0:9] == b"END-PAGE!"
+                    frameEnded = self.data.startswith(b"END-PAGE!")
                     # If running as a service...
                     if self.service:
                         # Write a scanline into open image file
                         if not frameEnded:
-                            self.writeFile(self.data[0:l])
+                            self.writeBuffer(l)
                         # Empty result
                         out = {}
                     else:
                         # Compose result
-                        #rle = self.applyRLE(self.data[0:l])
-                        out = {
-                            "mode":   "Fax",
-                            "line":   self.line,
-                            "width":  self.width,
-                            "height": self.height,
-                            "depth":  self.depth,
-                            "rle":    False,
-                            "ended":  frameEnded,
-                            "pixels": base64.b64encode(self.data[0:l]).decode()
-                        }
+                        out = self.makeScanline(self.line, l, depth=self.depth, ended=frameEnded)
                     # Advance scanline
                     if not frameEnded:
                         self.line  = self.line + 1
@@ -241,7 +174,7 @@ class FaxParser(DataRecorder, ThreadModule):
                     if frameEnded:
                         self.finishFrame()
                     # Remove parsed data
-                    del self.data[0:l]
+                    self.data.skip(l)
 
             #
             # If not receiving anything...
@@ -249,7 +182,7 @@ class FaxParser(DataRecorder, ThreadModule):
             else:
                 # Skip all data, but leave some since we may have 'BM ...'
                 l = ph if ph>=0 and ph+14>=len(self.data) else len(self.data)-1
-                del self.data[0:l]
+                self.data.skip(l)
 
         except Exception as e:
             logger.debug("%s: Exception parsing: %s" % (self.myName(), str(e)))
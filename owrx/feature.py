@@ -106,6 +106,7 @@ class FeatureDetector(object):
         "rigcontrol": ["hamlib"],
         "cwskimmer": ["csdr_cwskimmer"],
         "mp3": ["lame"],
+        "channelizer": ["numpy"],
     }
 
     def feature_availability(self):
@@ -778,6 +779,20 @@ class FeatureDetector(object):
         except ImportError:
             return False
 
+    def has_numpy(self):
+        """
+        OpenWebRX uses the [NumPy](https://numpy.org/) library to split
+        the SDR signal into multiple channels for background decoding
+        services. The `python3-numpy` package is available in most Linux
+        distributions. Do not forget to restart OpenWebRX after installing
+        this package.
+        """
+        try:
+            import numpy
+            return True
+        except ImportError:
+            return False
+
     def _has_acarsdec_version(self, required_version):
         acarsdec_version_regex = re.compile(r"^Acarsdec\s+v?(\S+)\s+")
         try:
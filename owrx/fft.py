@@ -2,6 +2,7 @@ from owrx.config import Config
 from csdr.chain.fft import FftChain
 from owrx.source import SdrSourceEventClient, SdrSourceState, SdrClientClass
 from owrx.property import PropertyStack
+from owrx.websocket import WebSocketConnection
 from pycsdr.modules import Buffer
 import threading
 
@@ -10,9 +11,29 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+class SpectrumBroadcaster(object):
+    """
+    Encodes every FFT frame into a websocket frame exactly once and hands the same buffer to all spectrum clients
+    of an SDR source. Each client keeps its own short drop-oldest queue (see Client.mp_send_frame()), so a slow
+    browser only loses its own frames and never stalls the others.
+    """
+    def __init__(self, sdrSource):
+        self.sdrSource = sdrSource
+
+    def broadcast(self, data):
+        clients = self.sdrSource.getSpectrumClients()
+        if not clients:
+            return
+        # 0x01 is the message type prefix for waterfall data
+        frame = WebSocketConnection.encodeFrame(b"\x01" + data)
+        for c in clients:
+            c.write_spectrum_frame(frame)
+
+
 class SpectrumThread(SdrSourceEventClient):
     def __init__(self, sdrSource):
         self.sdrSource = sdrSource
+        self.broadcaster = SpectrumBroadcaster(sdrSource)
         super().__init__()
 
         stack = PropertyStack()
@@ -70,7 +91,7 @@ class SpectrumThread(SdrSourceEventClient):
         buffer = Buffer(self.dsp.getOutputFormat())
         self.dsp.setWriter(buffer)
         self.reader = buffer.getReader()
-        threading.Thread(target=self.dsp.pump(self.reader.read, self.sdrSource.writeSpectrumData)).start()
+        threading.Thread(target=self.dsp.pump(self.reader.read, self.broadcaster.broadcast)).start()
 
     def stopDsp(self):
         if self.dsp is not None:
@@ -28,6 +28,7 @@ from owrx.controllers.robots import RobotsController
 from owrx.storage import Storage
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
+import threading
 import re
 from abc import ABC, abstractmethod
 from http.cookies import SimpleCookie
@@ -219,3 +220,33 @@ class RequestHandler(BaseHTTPRequestHandler):
 
     def _build_request(self, method):
         return Request(self.path, method, self.headers)
+
+    def detach(self):
+        """
+        Hand the connection over to someone else (e.g. the websocket event loop).
+        This request handler stops processing the connection, and the server will not close the socket.
+        """
+        self.close_connection = True
+        self.server.detachRequest(self.request)
+
+
+class DetachableRequestsMixIn(object):
+    """
+    Server mixin that leaves sockets open when their request handler has detached them.
+    """
+    def __init__(self, *args, **kwargs):
+        # requests detach from their own handler threads, so access to the set needs to be synchronized
+        self.detachedRequests = set()
+        self.detachedLock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def detachRequest(self, request):
+        with self.detachedLock:
+            self.detachedRequests.add(request)
+
+    def shutdown_request(self, request):
+        with self.detachedLock:
+            if request in self.detachedRequests:
+                self.detachedRequests.remove(request)
+                return
+        super().shutdown_request(request)
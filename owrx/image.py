@@ -0,0 +1,187 @@
+from owrx.storage import DataRecorder
+from csdr.module import ThreadModule
+from pycsdr.types import Format
+from abc import ABCMeta, abstractmethod
+import struct
+import pickle
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+#
+# Scanlines are sent to the clients as binary websocket frames of
+# type 0x05, followed by this header and the BMP pixel data:
+# mode index, flags, depth, width, line, height.
+#
+SCANLINE_HEADER = struct.Struct("<BBBHII")
+SCANLINE_MODES  = ["SSTV", "Fax"]
+SCANLINE_ENDED  = 0x01
+
+
+def isScanline(message) -> bool:
+    return isinstance(message, dict) and isinstance(message.get("pixels"), bytes)
+
+
+def encodeScanline(message) -> bytes:
+    header = SCANLINE_HEADER.pack(
+        SCANLINE_MODES.index(message["mode"]),
+        SCANLINE_ENDED if message.get("ended") else 0,
+        message.get("depth", 24),
+        message["width"],
+        message["line"],
+        message["height"],
+    )
+    return bytes([0x05]) + header + message["pixels"]
+
+
+#
+# Bytes received from a decoder, consumed from the front. Consumed
+# bytes are only dropped once they make up half of the buffer, so
+# neither appending nor consuming copies the remaining data.
+#
+class StreamBuffer(object):
+    def __init__(self):
+        self.data = bytearray()
+        self.pos  = 0
+
+    def __len__(self):
+        return len(self.data) - self.pos
+
+    # Get a single byte
+    def __getitem__(self, index: int) -> int:
+        return self.data[self.pos + index]
+
+    def append(self, chunk):
+        if self.pos > 0 and self.pos >= len(self.data) // 2:
+            del self.data[0:self.pos]
+            self.pos = 0
+        self.data += chunk
+
+    def find(self, sub: bytes, start: int = 0, end: int = None) -> int:
+        end = len(self.data) if end is None else min(self.pos + end, len(self.data))
+        p = self.data.find(sub, self.pos + start, end)
+        return p - self.pos if p >= 0 else -1
+
+    def startswith(self, prefix: bytes) -> bool:
+        return self.data[self.pos : self.pos + len(prefix)] == prefix
+
+    # Get a copy of the given range
+    def getBytes(self, start: int, end: int) -> bytes:
+        with memoryview(self.data) as view:
+            return bytes(view[self.pos + start : self.pos + end])
+
+    # Get a view of the given range, to be released before the
+    # buffer changes
+    def view(self, start: int, end: int) -> memoryview:
+        return memoryview(self.data)[self.pos + start : self.pos + end]
+
+    def skip(self, count: int):
+        self.pos += max(0, min(count, len(self)))
+
+
+#
+# Base class for parsers receiving BMP images and bracketed messages
+# from image decoders. Images are stored to files when running as a
+# service, and sent to the client scanline by scanline otherwise.
+#
+class ImageParser(DataRecorder, ThreadModule, metaclass=ABCMeta):
+    # Mode reported in the output messages
+    messageMode = None
+
+    def __init__(self, service: bool = False, filePrefix: str = None, maxBytes: int = 8 * 1024 * 1024):
+        self.service = service
+        self.data    = StreamBuffer()
+        self.width   = 0
+        self.height  = 0
+        self.line    = 0
+        DataRecorder.__init__(self, filePrefix, ".bmp", maxBytes = maxBytes)
+        ThreadModule.__init__(self)
+
+    def getInputFormat(self) -> Format:
+        return Format.CHAR
+
+    def getOutputFormat(self) -> Format:
+        return Format.CHAR
+
+    def myName(self) -> str:
+        return "%s%s" % (
+            "Service" if self.service else "Client",
+            " at %dkHz" % (self.frequency // 1000) if self.frequency>0 else ""
+        )
+
+    def run(self):
+        logger.debug("%s starting..." % self.myName())
+        # Run while there is input data
+        while self.doRun:
+            # Read input data
+            inp = self.reader.read()
+            # Terminate if no input data
+            if inp is None:
+                self.doRun = False
+                break
+            # Add read data to the buffer
+            self.data.append(inp)
+            # Process buffer contents
+            out = self.process()
+            # Keep processing while there is input to parse
+            while out is not None:
+                if len(out)>0:
+                    self.writer.write(pickle.dumps(out))
+                out = self.process()
+        # Done with whatever we are decoding
+        logger.debug("%s exiting..." % self.myName())
+        self.finish()
+
+    # Parse buffer contents, return None if more data is needed
+    @abstractmethod
+    def process(self):
+        pass
+
+    # Called once the input ends
+    @abstractmethod
+    def finish(self):
+        pass
+
+    # Parse a message starting with ' [' at the start of the buffer
+    def parseMessage(self):
+        # Look for the closing bracket
+        pc = self.data.find(b']')
+        if pc<0:
+            return None
+        # Extract message contents
+        msg = self.data.getBytes(2, pc).decode()
+        # Remove parsed data
+        self.data.skip(pc+1)
+        # Log message
+        logger.debug("%s says [%s]" % (self.myName(), msg))
+        # If running as a service...
+        if self.service:
+            # Empty result
+            return {}
+        else:
+            # Compose result
+            return {
+                "mode":      self.messageMode,
+                "message":   msg,
+                "frequency": self.frequency
+            }
+
+    # Write given number of bytes from the buffer into the image file
+    def writeBuffer(self, size: int):
+        with self.data.view(0, size) as view:
+            self.writeFile(view)
+
+    # Compose a scanline message with given number of bytes from the
+    # buffer
+    def makeScanline(self, line: int, size: int, **extra):
+        out = {
+            "mode":   self.messageMode,
+            "line":   line,
+            "width":  self.width,
+            "height": self.height,
+            "pixels": self.data.getBytes(0, size)
+        }
+        out.update(extra)
+        return out
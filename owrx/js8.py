@@ -28,6 +28,13 @@ class Js8Profile(AudioChopperProfile, metaclass=ABCMeta):
     def getFileTimestampFormat(self):
         return "%y%m%d_%H%M%S"
 
+    def getMode(self):
+        return "JS8"
+
+    def getDecodingBudget(self):
+        # messages need to be shown before the next period is over to keep up with a conversation
+        return self.getInterval() * 2 / 3
+
     def decoder_commandline(self, file):
         return ["js8", "--js8", "-b", self.get_sub_mode(), "-d", str(self.decoding_depth()), file]
 
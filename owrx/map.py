@@ -1,7 +1,11 @@
 from datetime import datetime, timedelta, timezone
 from owrx.config import Config
 from owrx.bands import Band
+from owrx.websocket import WebSocketConnection
 from abc import abstractmethod, ABC, ABCMeta
+from collections import deque
+import itertools
+import heapq
 import threading
 import time
 import sys
@@ -22,9 +26,35 @@ class Location(object):
         }
 
 
+class MapRecord(object):
+    """
+    A position on the map. There can be lots of them, so they are kept as small as possible.
+    """
+    __slots__ = ["location", "updated", "mode", "band", "hops"]
+
+    def __init__(self, location: Location, updated: datetime, mode: str, band: Band, hops: list):
+        self.location = location
+        self.updated = updated
+        self.mode = mode
+        self.band = band
+        self.hops = hops
+
+
 class Map(object):
+    """
+    Keeps track of the positions and calls shown on the map, and sends updates to the map clients.
+
+    Updates are collected for a short time and sent as one batch. Updates for the same key within a batch are merged,
+    and the batch is encoded once for all clients. New clients receive a snapshot of the state as of the last batch,
+    which is kept up to date by applying every batch to it.
+
+    Positions are expired through a heap ordered by expiry time, so that only positions that are due are looked at.
+    Positions that have been updated since they were added to the heap are put back with their new expiry time.
+    """
     sharedInstance = None
     creationLock = threading.Lock()
+    # time to collect updates before they are sent, in seconds
+    broadcastInterval = 0.25
 
     @staticmethod
     def getSharedInstance():
@@ -38,6 +68,32 @@ class Map(object):
         self.positions = {}
         self.calls = []
         self.positionsLock = threading.Lock()
+        # (expiry timestamp, sequence, key, record)
+        self.expiry = []
+        self.expirySequence = itertools.count()
+        self.removedSinceRebuild = 0
+
+        # updates waiting to be sent, by key. None marks a removed position.
+        self.pending = {}
+        self.callSequence = itertools.count()
+        # the state as of the last batch, as sent to the clients
+        self.snapshotPositions = {}
+        self.snapshotCalls = deque()
+        self.snapshotFrame = None
+        self.broadcastLock = threading.RLock()
+        self.broadcastEvent = threading.Event()
+
+        def broadcastLoop():
+            while True:
+                self.broadcastEvent.wait()
+                # give other updates a chance to be merged into the same batch
+                time.sleep(self.broadcastInterval)
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("error while broadcasting map updates")
+
+        threading.Thread(target=broadcastLoop, daemon=True, name="map_broadcast").start()
 
         def removeLoop():
             loops = 0
@@ -57,28 +113,100 @@ class Map(object):
                 time.sleep(60)
 
         threading.Thread(target=removeLoop, daemon=True, name="map_removeloop").start()
+        Config.get().wireProperty("map_position_retention_time", self._rebuildExpiry)
         super().__init__()
 
-    def broadcast(self, update):
-        for c in self.clients:
-            c.write_update(update)
+    def _getRetention(self) -> float:
+        return Location().getTTL().total_seconds()
 
-    def addClient(self, client):
-        self.clients.append(client)
+    def _scheduleExpiry(self, key, record: MapRecord):
+        expires = record.updated.timestamp() + self._getRetention()
+        heapq.heappush(self.expiry, (expires, next(self.expirySequence), key, record))
+
+    def _rebuildExpiry(self, *args):
+        # expiry times depend on the retention time, so they are all recalculated when it changes
         with self.positionsLock:
-            positions = [
-                self._makeRecord(key, record) for (key, record) in self.positions.items()
-            ] + [
-                self._makeCall(call) for call in self.calls
+            retention = self._getRetention()
+            self.expiry = [
+                (record.updated.timestamp() + retention, next(self.expirySequence), key, record)
+                for key, record in self.positions.items()
             ]
+            heapq.heapify(self.expiry)
+
+    def broadcast(self, update):
+        with self.broadcastLock:
+            for record in update:
+                if "caller" in record:
+                    self.pending[("call", next(self.callSequence))] = record
+                elif record["callsign"] in self.pending and self.pending[record["callsign"]] is not None:
+                    # partial updates (like touchLocation) must not replace a complete record
+                    self.pending[record["callsign"]].update(record)
+                else:
+                    self.pending[record["callsign"]] = record
+            self.broadcastEvent.set()
+
+    def _removeFromBroadcast(self, key):
+        with self.broadcastLock:
+            self.pending[key] = None
+            self.broadcastEvent.set()
+
+    def flush(self):
+        """
+        Send all pending updates to the clients, and apply them to the snapshot for new clients.
+        """
+        with self.broadcastLock:
+            self.broadcastEvent.clear()
+            pending = self.pending
+            if not pending:
+                return
+            self.pending = {}
+
+            batch = []
+            for key, record in pending.items():
+                if record is None:
+                    self.snapshotPositions.pop(key, None)
+                    batch.append({"callsign": key, "removed": True})
+                elif "caller" in record:
+                    self.snapshotCalls.append(record)
+                    batch.append(record)
+                else:
+                    if key in self.snapshotPositions:
+                        self.snapshotPositions[key] = {**self.snapshotPositions[key], **record}
+                    elif "location" in record:
+                        self.snapshotPositions[key] = record
+                    batch.append(record)
+            maxCalls = Config.get()["map_max_calls"]
+            while len(self.snapshotCalls) > maxCalls:
+                self.snapshotCalls.popleft()
+            self.snapshotFrame = None
+
+            if not batch:
+                return
+            frame = self._encodeUpdate(batch)
+            clients = self.clients.copy()
+
+        for c in clients:
+            c.write_update_frame(frame)
+
+    def _encodeUpdate(self, update):
+        return WebSocketConnection.encodeFrame({"type": "update", "value": update})
 
-        client.write_update(positions)
+    def addClient(self, client):
+        with self.broadcastLock:
+            if self.snapshotFrame is None:
+                self.snapshotFrame = self._encodeUpdate(
+                    list(self.snapshotPositions.values()) + list(self.snapshotCalls)
+                )
+            self.clients.append(client)
+            # sent while holding the lock, so that the client receives the snapshot before the next batch
+            client.write_update_frame(self.snapshotFrame)
 
     def removeClient(self, client):
-        try:
-            self.clients.remove(client)
-        except ValueError:
-            pass
+        with self.broadcastLock:
+            try:
+                self.clients.remove(client)
+            except ValueError:
+                pass
 
     def _makeCall(self, call):
         return {
@@ -91,31 +219,30 @@ class Map(object):
             "band": call["band"].getName() if call["band"] is not None else None
         }
 
-    def _makeRecord(self, callsign, record):
+    def _makeRecord(self, callsign, record: MapRecord):
         return {
             "callsign": callsign,
-            "location": record["location"].__dict__(),
-            "lastseen": record["updated"].timestamp() * 1000,
-            "mode": record["mode"],
-            "band": record["band"].getName() if record["band"] is not None else None,
-            "hops": record["hops"]
+            "location": record.location.__dict__(),
+            "lastseen": record.updated.timestamp() * 1000,
+            "mode": record.mode,
+            "band": record.band.getName() if record.band is not None else None,
+            "hops": record.hops
         }
 
     def updateCall(self, key, callee, mode: str, band: Band = None, timestamp: datetime = None):
         # if we get an external timestamp, make sure it's not already expired
         if timestamp is None:
             timestamp = datetime.now(timezone.utc)
-        elif datetime.now(timezone.utc) - loc.getTTL() > timestamp:
+        elif datetime.now(timezone.utc) - timedelta(seconds=self._getRetention()) > timestamp:
             return
 
         max_calls = Config.get()["map_max_calls"]
-        broadcast = None
 
         # update the list of callees for existing callsigns
         with self.positionsLock:
             if key in self.positions and callee in self.positions:
-                src = self.positions[key]["location"]
-                dst = self.positions[callee]["location"]
+                src = self.positions[key].location
+                dst = self.positions[callee].location
                 call = {
                     "caller": key,
                     "callee": callee,
@@ -131,11 +258,8 @@ class Map(object):
                     self.calls.pop(0)
                 # add a new call
                 if len(self.calls) < max_calls:
-                    broadcast = self._makeCall(call)
                     self.calls.append(call)
-
-        if broadcast is not None:
-            self.broadcast([broadcast])
+                    self.broadcast([self._makeCall(call)])
 
     def updateLocation(self, key, loc: Location, mode: str, band: Band = None, hops: list[str] = [], timestamp: datetime = None):
         # if we get an external timestamp, make sure it's not already expired
@@ -147,53 +271,73 @@ class Map(object):
         pm = Config.get()
         ignoreIndirect = pm["map_ignore_indirect_reports"]
         preferRecent = pm["map_prefer_recent_reports"]
-        broadcast = None
 
         # ignore indirect reports if ignoreIndirect set
         if not ignoreIndirect or len(hops)==0:
             # prefer messages with shorter hop count unless preferRecent set
             with self.positionsLock:
+                # updates are queued while holding the lock, so they are sent in the same order as they are stored
                 if key not in self.positions:
-                    self.positions[key] = { "location": loc, "updated": timestamp, "mode": mode, "band": band, "hops": hops }
-                    broadcast = self._makeRecord(key, self.positions[key])
-                elif preferRecent or len(hops) <= len(self.positions[key]["hops"]):
+                    record = MapRecord(loc, timestamp, mode, band, hops)
+                    self.positions[key] = record
+                    self._scheduleExpiry(key, record)
+                    self.broadcast([self._makeRecord(key, record)])
+                elif preferRecent or len(hops) <= len(self.positions[key].hops):
+                    record = self.positions[key]
                     if isinstance(loc, IncrementalUpdate):
-                        loc.update(self.positions[key]["location"])
-                    self.positions[key].update({ "location": loc, "updated": timestamp, "mode": mode, "band": band, "hops": hops })
-                    broadcast = self._makeRecord(key, self.positions[key])
-
-        if broadcast is not None:
-            self.broadcast([broadcast])
+                        loc.update(record.location)
+                    # the expiry heap entry stays, it is rescheduled when it comes up
+                    record.location = loc
+                    record.updated = timestamp
+                    record.mode = mode
+                    record.band = band
+                    record.hops = hops
+                    self.broadcast([self._makeRecord(key, record)])
 
     def touchLocation(self, key):
         # not implemented on the client side yet, so do not use!
         ts = datetime.now(timezone.utc)
         with self.positionsLock:
             if key in self.positions:
-                self.positions[key]["updated"] = ts
-        self.broadcast([{"callsign": key, "lastseen": ts.timestamp() * 1000}])
+                self.positions[key].updated = ts
+            self.broadcast([{"callsign": key, "lastseen": ts.timestamp() * 1000}])
 
     def removeLocation(self, key):
         with self.positionsLock:
-            if key in self.positions:
-                del self.positions[key]
-                # TODO broadcast removal to clients
+            self._removeLocation(key)
+
+    def _removeLocation(self, key):
+        if key in self.positions:
+            del self.positions[key]
+            self.removedSinceRebuild += 1
+            self._removeFromBroadcast(key)
 
     def removeOldPositions(self):
-        now = datetime.now(timezone.utc)
+        now = time.time()
+        retention = self._getRetention()
 
         with self.positionsLock:
-            to_be_removed = [
-                key for (key, pos) in self.positions.items() if now - pos["location"].getTTL() > pos["updated"]
-            ]
-        for key in to_be_removed:
-            self.removeLocation(key)
+            while self.expiry and self.expiry[0][0] < now:
+                _, _, key, record = heapq.heappop(self.expiry)
+                # the position may have been removed or replaced in the meantime
+                if self.positions.get(key) is not record:
+                    continue
+                expires = record.updated.timestamp() + retention
+                if expires < now:
+                    self._removeLocation(key)
+                else:
+                    # updated since it was scheduled
+                    heapq.heappush(self.expiry, (expires, next(self.expirySequence), key, record))
 
     def rebuildPositions(self):
+        # only worth it if lots of positions have been removed since the last time
+        if self.removedSinceRebuild < len(self.positions):
+            return
         logger.debug("rebuilding map storage; size before: %i", sys.getsizeof(self.positions))
         with self.positionsLock:
             p = {key: value for key, value in self.positions.items()}
             self.positions = p
+            self.removedSinceRebuild = 0
         logger.debug("rebuild complete; size after: %i", sys.getsizeof(self.positions))
 
 
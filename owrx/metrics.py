@@ -1,5 +1,8 @@
 import threading
 from owrx.client import ClientRegistry
+from owrx.websocket import WebSocketConnection
+from owrx.property import PropertyManager
+from owrx.config import Config
 
 
 class Metric(object):
@@ -26,6 +29,31 @@ class DirectMetric(Metric):
         return self.getter()
 
 
+class HistogramMetric(Metric):
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.count += 1
+            self.sum += value
+            for i, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    self.counts[i] += 1
+
+    def getValue(self):
+        with self.lock:
+            return {
+                "buckets": {str(b): c for b, c in zip(self.buckets, self.counts)},
+                "sum": self.sum,
+                "count": self.count,
+            }
+
+
 class Metrics(object):
     sharedInstance = None
     creationLock = threading.Lock()
@@ -40,6 +68,14 @@ class Metrics(object):
     def __init__(self):
         self.metrics = {}
         self.addMetric("openwebrx.users", DirectMetric(ClientRegistry.getSharedInstance().clientCount))
+        self.addMetric("openwebrx.websocket.writer", DirectMetric(WebSocketConnection.getWriterStats))
+        self.addMetric("openwebrx.property.managers", DirectMetric(lambda: len(PropertyManager.instances)))
+        self.addMetric("openwebrx.property.subscribers", DirectMetric(self._getPropertySubscriberCount))
+        self.addMetric("openwebrx.property.config.subscribers", DirectMetric(lambda: Config.get().getSubscriberCount()))
+
+    @staticmethod
+    def _getPropertySubscriberCount():
+        return sum(s["subscribers"] for s in PropertyManager.getSubscriberStats().values())
 
     def addMetric(self, name, metric):
         self.metrics[name] = metric
@@ -1,6 +1,10 @@
 from abc import ABC, abstractmethod
 from owrx.property.validators import Validator
 from owrx.property.filter import Filter, ByPropertyName
+import bisect
+import itertools
+import threading
+import weakref
 import logging
 
 logger = logging.getLogger(__name__)
@@ -37,8 +41,27 @@ class Subscription(object):
 
 
 class PropertyManager(ABC):
+    # all live instances, for diagnostics
+    instances = weakref.WeakSet()
+
+    @staticmethod
+    def getSubscriberStats():
+        """
+        Number of live managers and their subscribers, by class name.
+        """
+        stats = {}
+        for pm in list(PropertyManager.instances):
+            entry = stats.setdefault(type(pm).__name__, {"managers": 0, "subscribers": 0})
+            entry["managers"] += 1
+            entry["subscribers"] += pm.getSubscriberCount()
+        return stats
+
     def __init__(self):
+        # subscribers to all changes
         self.subscribers = []
+        # subscribers to a single property, by property name
+        self.propertySubscribers = {}
+        PropertyManager.instances.add(self)
 
     @abstractmethod
     def __getitem__(self, item):
@@ -84,38 +107,59 @@ class PropertyManager(ABC):
     def wire(self, callback):
         sub = Subscription(self, None, callback)
         self.subscribers.append(sub)
+        self._subscriptionsChanged()
         return sub
 
     def wireProperty(self, name, callback):
         sub = Subscription(self, name, callback)
-        self.subscribers.append(sub)
+        self.propertySubscribers.setdefault(name, []).append(sub)
+        self._subscriptionsChanged()
         if name in self:
             sub.call(self[name])
         return sub
 
     def unwire(self, sub):
         try:
-            self.subscribers.remove(sub)
-        except ValueError:
+            if sub.getName() is None:
+                self.subscribers.remove(sub)
+            else:
+                subscribers = self.propertySubscribers[sub.getName()]
+                subscribers.remove(sub)
+                if not subscribers:
+                    del self.propertySubscribers[sub.getName()]
+        except (KeyError, ValueError):
             # happens when already removed before
             pass
+        self._subscriptionsChanged()
         return self
 
+    def hasSubscribers(self):
+        return bool(self.subscribers) or bool(self.propertySubscribers)
+
+    def getSubscriberCount(self):
+        return len(self.subscribers) + sum(len(s) for s in self.propertySubscribers.values())
+
+    def _subscriptionsChanged(self):
+        # hook for managers that depend on another manager
+        pass
+
     def _fireCallbacks(self, changes):
         if not changes:
             return
+        # only subscribers that exist before any callbacks are called will receive the changes
         subscribers = self.subscribers.copy()
+        propertySubscribers = [
+            (name, self.propertySubscribers[name].copy()) for name in changes if name in self.propertySubscribers
+        ]
         for c in subscribers:
             try:
-                if c.getName() is None:
-                    c.call(changes)
+                c.call(changes)
             except Exception:
                 logger.exception("exception while firing changes")
-        for name in changes:
+        for name, subscribers in propertySubscribers:
             for c in subscribers:
                 try:
-                    if c.getName() == name:
-                        c.call(changes[name])
+                    c.call(changes[name])
                 except Exception:
                     logger.exception("exception while firing changes")
 
@@ -156,11 +200,25 @@ class PropertyLayer(PropertyManager):
 
 
 class PropertyFilter(PropertyManager):
+    """
+    Only subscribed to its upstream manager while it has subscribers itself, so that filters that are no longer in use
+    are released as soon as their subscriptions are cancelled.
+    """
     def __init__(self, pm: PropertyManager, filter: Filter):
         super().__init__()
         self.pm = pm
         self._filter = filter
-        self.pm.wire(self.receiveEvent)
+        self.subscription = None
+        self.subscriptionLock = threading.Lock()
+
+    def _subscriptionsChanged(self):
+        with self.subscriptionLock:
+            if self.hasSubscribers():
+                if self.subscription is None:
+                    self.subscription = self.pm.wire(self.receiveEvent)
+            elif self.subscription is not None:
+                self.subscription.cancel()
+                self.subscription = None
 
     def receiveEvent(self, changes):
         changesToForward = {name: value for name, value in changes.items() if self._filter.apply(name)}
@@ -200,11 +258,31 @@ class PropertyFilter(PropertyManager):
 
 
 class PropertyDelegator(PropertyManager):
+    """
+    Like the PropertyFilter, only subscribed to the delegate while it has subscribers itself.
+    """
     def __init__(self, pm: PropertyManager):
         self.pm = pm
-        self.subscription = self.pm.wire(self._fireCallbacks)
+        self.subscription = None
+        self.subscriptionLock = threading.Lock()
         super().__init__()
 
+    def _subscriptionsChanged(self):
+        with self.subscriptionLock:
+            if self.hasSubscribers():
+                if self.subscription is None:
+                    self.subscription = self.pm.wire(self._fireCallbacks)
+            elif self.subscription is not None:
+                self.subscription.cancel()
+                self.subscription = None
+
+    def _setDelegate(self, pm: PropertyManager):
+        with self.subscriptionLock:
+            if self.subscription is not None:
+                self.subscription.cancel()
+            self.pm = pm
+            self.subscription = self.pm.wire(self._fireCallbacks) if self.hasSubscribers() else None
+
     def __getitem__(self, item):
         return self.pm.__getitem__(item)
 
@@ -271,9 +349,19 @@ class PropertyReadOnly(PropertyDelegator):
 
 
 class PropertyStack(PropertyManager):
+    """
+    Combines multiple layers, with the value from the layer with the highest priority taking precedence.
+
+    Layers are kept sorted by priority, and the layer currently providing each key is kept in an index that is updated
+    when layers are added or removed and when layers send events, so lookups do not need to search the layers.
+    """
     def __init__(self):
         super().__init__()
+        # sorted by priority; layers with the same priority keep the order they were added in
         self.layers = []
+        # key -> layer that currently provides the key
+        self.index = {}
+        self.sequence = itertools.count()
 
     def addLayer(self, priority: int, pm: PropertyManager):
         """
@@ -287,22 +375,28 @@ class PropertyStack(PropertyManager):
             if key not in self or self[key] != pm[key]:
                 changes[key] = pm[key]
 
+        layer = {"priority": priority, "props": pm, "rank": (priority, next(self.sequence))}
+
         def eventClosure(changes):
-            self.receiveEvent(pm, changes)
+            self._receiveLayerEvent(layer, changes)
 
-        sub = pm.wire(eventClosure)
+        layer["sub"] = pm.wire(eventClosure)
 
-        self.layers.append({"priority": priority, "props": pm, "sub": sub})
+        bisect.insort(self.layers, layer, key=lambda la: la["rank"])
+        for key in pm.keys():
+            owner = self.index.get(key)
+            if owner is None or layer["rank"] < owner["rank"]:
+                self.index[key] = layer
 
         return changes
 
     def removeLayerByPriority(self, priority):
-        for layer in self.layers:
+        for layer in self.layers.copy():
             if layer["priority"] == priority:
                 self.removeLayer(layer["props"])
 
     def removeLayer(self, pm: PropertyManager):
-        for layer in self.layers:
+        for layer in self.layers.copy():
             if layer["props"] == pm:
                 self._fireCallbacks(self._removeLayer(layer))
 
@@ -312,6 +406,8 @@ class PropertyStack(PropertyManager):
         changes = {}
         pm = layer["props"]
         for key in pm.keys():
+            if self.index.get(key) is layer:
+                self._updateIndex(key)
             if key in self:
                 if self[key] != pm[key]:
                     changes[key] = self[key]
@@ -330,6 +426,22 @@ class PropertyStack(PropertyManager):
 
         self._fireCallbacks(changes)
 
+    def _updateIndex(self, key):
+        for layer in self.layers:
+            if key in layer["props"]:
+                self.index[key] = layer
+                return
+        self.index.pop(key, None)
+
+    def _receiveLayerEvent(self, layer, changes):
+        for name, value in changes.items():
+            owner = self.index.get(name)
+            if value is PropertyDeleted or owner is layer:
+                self._updateIndex(name)
+            elif owner is None or layer["rank"] < owner["rank"]:
+                self.index[name] = layer
+        self.receiveEvent(layer["props"], changes)
+
     def receiveEvent(self, layer, changes):
         changesToForward = {name: value for name, value in changes.items() if layer == self._getTopLayer(name)}
         # deletions need to be handled separately:
@@ -343,13 +455,11 @@ class PropertyStack(PropertyManager):
         self._fireCallbacks({**changesToForward, **deletionsToForward})
 
     def _getTopLayer(self, item, fallback=True):
-        layers = [la["props"] for la in sorted(self.layers, key=lambda l: l["priority"])]
-        for m in layers:
-            if item in m:
-                return m
+        if item in self.index:
+            return self.index[item]["props"]
         # return top layer as fallback
-        if fallback and layers:
-            return layers[0]
+        if fallback and self.layers:
+            return self.layers[0]["props"]
 
     def __getitem__(self, item):
         layer = self._getTopLayer(item)
@@ -360,21 +470,18 @@ class PropertyStack(PropertyManager):
         return layer.__setitem__(key, value)
 
     def __contains__(self, item):
-        layer = self._getTopLayer(item)
-        if layer:
-            return layer.__contains__(item)
-        return False
+        return item in self.index
 
     def __dict__(self):
-        return {k: self.__getitem__(k) for k in self.keys()}
+        return {k: layer["props"].__getitem__(k) for k, layer in self.index.items()}
 
     def __delitem__(self, key):
-        for layer in self.layers:
+        for layer in self.layers.copy():
             if layer["props"].__contains__(key):
                 layer["props"].__delitem__(key)
 
     def keys(self):
-        return set([key for l in self.layers for key in l["props"].keys()])
+        return set(self.index.keys())
 
     def values(self):
         return [self.__getitem__(k) for k in self.keys()]
@@ -408,9 +515,7 @@ class PropertyCarousel(PropertyDelegator):
 
     def switch(self, key=None):
         before = self.pm
-        self.subscription.cancel()
-        self.pm = self._getDefaultLayer() if key is None else self.layers[key]
-        self.subscription = self.pm.wire(self._fireCallbacks)
+        self._setDelegate(self._getDefaultLayer() if key is None else self.layers[key])
         changes = {}
         for key in set(list(before.keys()) + list(self.keys())):
             if key not in self:
@@ -1,6 +1,7 @@
 import threading
 from owrx.config import Config
 from owrx.reporting.reporter import Reporter, FilteredReporter
+from owrx.reporting.queue import ReporterQueue
 from owrx.reporting.pskreporter import PskReporter
 from owrx.reporting.wsprnet import WsprnetReporter
 from owrx.feature import FeatureDetector
@@ -35,6 +36,7 @@ class ReportingEngine(object):
                 ReportingEngine.sharedInstance.stop()
 
     def __init__(self):
+        # a ReporterQueue for every running reporter
         self.reporters = []
         configKeys = ["{}_enabled".format(n) for n in self.reporterClasses.keys()]
         self.configSub = Config.get().filter(*configKeys).wire(self.setupReporters)
@@ -53,22 +55,24 @@ class ReportingEngine(object):
                 else:
                     continue
             if configKey in config and config[configKey]:
-                if not any(isinstance(r, reporterClass) for r in self.reporters):
-                    self.reporters += [reporterClass()]
+                if not any(isinstance(q.reporter, reporterClass) for q in self.reporters):
+                    self.reporters = self.reporters + [ReporterQueue(typeStr, reporterClass())]
             else:
-                for reporter in [r for r in self.reporters if isinstance(r, reporterClass)]:
-                    reporter.stop()
-                    self.reporters.remove(reporter)
+                for queue in [q for q in self.reporters if isinstance(q.reporter, reporterClass)]:
+                    self.reporters = [q for q in self.reporters if q is not queue]
+                    queue.stop()
 
     def stop(self):
-        for r in self.reporters:
-            r.stop()
+        reporters = self.reporters
+        self.reporters = []
+        for q in reporters:
+            q.stop()
         self.configSub.cancel()
 
     def spot(self, spot):
-        for r in self.reporters:
+        # the callers keep using their spot after this, so the reporters get a copy
+        spot = spot.copy()
+        for q in self.reporters:
+            r = q.reporter
             if not isinstance(r, FilteredReporter) or spot["mode"] in r.getSupportedModes():
-                try:
-                    r.spot(spot)
-                except Exception:
-                    logger.exception("error sending spot to reporter")
+                q.put(spot)
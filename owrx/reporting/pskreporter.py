@@ -3,8 +3,6 @@ import threading
 import time
 import random
 import socket
-from functools import reduce
-from operator import and_
 from owrx.config import Config
 from owrx.version import openwebrx_version
 from owrx.locator import Locator
@@ -21,6 +19,7 @@ class PskReporter(FilteredReporter):
     It interfaces with pskreporter as documented here: https://pskreporter.info/pskdev.html
     """
     interval = 300
+    spotKeys = ["callsign", "timestamp", "locator", "mode", "msg"]
 
     def getSupportedModes(self):
         """
@@ -35,9 +34,15 @@ class PskReporter(FilteredReporter):
         self.cancelTimer()
         with self.spotLock:
             self.spots = []
+            self.spotIds = set()
+            self.previousSpotIds = set()
 
     def __init__(self):
+        # spots are encoded as they come in, so that the upload only has to put them into packets
         self.spots = []
+        # identifying fields of the spots in the current and in the previous upload window, for duplicate detection
+        self.spotIds = set()
+        self.previousSpotIds = set()
         self.spotLock = threading.Lock()
         self.uploader = Uploader()
         self.timer = None
@@ -55,19 +60,22 @@ class PskReporter(FilteredReporter):
         self.timer = threading.Timer(delay, self.upload)
         self.timer.start()
 
-    def spotEquals(self, s1, s2):
-        keys = ["callsign", "timestamp", "locator", "mode", "msg"]
-
-        return reduce(and_, map(lambda key: s1[key] == s2[key], keys))
+    def getSpotId(self, spot):
+        return tuple(spot[key] for key in PskReporter.spotKeys)
 
     def spot(self, spot):
+        spotId = self.getSpotId(spot)
         with self.spotLock:
-            if any(x for x in self.spots if self.spotEquals(spot, x)):
+            if spotId in self.spotIds or spotId in self.previousSpotIds:
                 # dupe
                 self.dupeCounter.inc()
             else:
                 self.spotCounter.inc()
-                self.spots.append(spot)
+                self.spotIds.add(spotId)
+                encoded = self.uploader.encodeSpot(spot)
+                # filter out any erroneous encodes
+                if encoded is not None:
+                    self.spots.append(encoded)
             self.scheduleNextUpload()
 
     def upload(self):
@@ -76,6 +84,9 @@ class PskReporter(FilteredReporter):
                 self.timer = None
                 spots = self.spots
                 self.spots = []
+                # duplicates are only expected shortly after the original spot, so older spots are forgotten
+                self.previousSpotIds = self.spotIds
+                self.spotIds = set()
 
             if spots:
                 self.uploader.upload(spots)
@@ -95,16 +106,15 @@ class Uploader(object):
         self.sequence = 0
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-    def upload(self, spots):
-        logger.debug("uploading %i spots", len(spots))
-        for packet in self.getPackets(spots):
+    def upload(self, encoded):
+        """
+        Send spots previously encoded with encodeSpot()
+        """
+        logger.debug("uploading %i spots", len(encoded))
+        for packet in self.getPackets(encoded):
             self.socket.sendto(packet, ("report.pskreporter.info", 4739))
 
-    def getPackets(self, spots):
-        encoded = [self.encodeSpot(spot) for spot in spots]
-        # filter out any erroneous encodes
-        encoded = [e for e in encoded if e is not None]
-
+    def getPackets(self, encoded):
         def chunks(block, max_size):
             size = 0
             current = []
@@ -143,19 +153,20 @@ class Uploader(object):
         )
 
     def encodeString(self, s):
-        return [len(s)] + list(s.encode("utf-8"))
+        encoded = s.encode("utf-8")
+        return bytes([len(encoded)]) + encoded
 
     def encodeSpot(self, spot):
         try:
-            return bytes(
+            return (
                 self.encodeString(spot["callsign"])
-                + list(int(spot["freq"]).to_bytes(5, "big"))
-                + list(int(spot["db"]).to_bytes(1, "big", signed=True))
+                + int(spot["freq"]).to_bytes(5, "big")
+                + int(spot["db"]).to_bytes(1, "big", signed=True)
                 + self.encodeString(spot["mode"])
                 + self.encodeString(spot["locator"])
                 # informationsource. 1 means "automatically extracted
-                + [0x01]
-                + list(int(spot["timestamp"] / 1000).to_bytes(4, "big"))
+                + b"\x01"
+                + int(spot["timestamp"] / 1000).to_bytes(4, "big")
             )
         except Exception:
             logger.exception("Error while encoding spot for pskreporter")
@@ -0,0 +1,92 @@
+from owrx.reporting.reporter import Reporter, Backpressure
+from owrx.metrics import Metrics, CounterMetric, DirectMetric, HistogramMetric
+from collections import deque
+import threading
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReporterQueue(object):
+    """
+    Hands spots to a reporter on its own thread, so that slow reporters do not hold up the decoders.
+    """
+    lagBuckets = [0.01, 0.1, 1, 10, 60]
+    stopTimeout = 5
+
+    def __init__(self, name: str, reporter: Reporter):
+        self.name = name
+        self.reporter = reporter
+        # (time queued, spot)
+        self.spots = deque()
+        self.condition = threading.Condition()
+        self.doRun = True
+
+        metrics = Metrics.getSharedInstance()
+        prefix = "reporting.{0}".format(name)
+        self.spotCounter = self._getMetric("{0}.spots".format(prefix), CounterMetric)
+        self.dropCounter = self._getMetric("{0}.dropped".format(prefix), CounterMetric)
+        self.lagMetric = self._getMetric("{0}.lag".format(prefix), lambda: HistogramMetric(self.lagBuckets))
+        metrics.addMetric("{0}.queue".format(prefix), DirectMetric(self.qsize))
+
+        self.thread = threading.Thread(target=self._run, name="ReporterQueue.{0}".format(name), daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _getMetric(name, factory):
+        # keep counting when a reporter is restarted
+        metrics = Metrics.getSharedInstance()
+        metric = metrics.getMetric(name)
+        if metric is None:
+            metric = factory()
+            metrics.addMetric(name, metric)
+        return metric
+
+    def qsize(self):
+        return len(self.spots)
+
+    def put(self, spot):
+        with self.condition:
+            if not self.doRun:
+                return
+            if len(self.spots) >= self.reporter.queueSize:
+                if self.reporter.backpressure is Backpressure.BLOCK:
+                    self.condition.wait_for(lambda: len(self.spots) < self.reporter.queueSize or not self.doRun)
+                    if not self.doRun:
+                        return
+                else:
+                    self.spots.popleft()
+                    self.dropCounter.inc()
+            self.spots.append((time.monotonic(), spot))
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.spots or not self.doRun)
+                # pending spots are still delivered after stop()
+                if not self.spots:
+                    break
+                count = min(len(self.spots), self.reporter.batchSize)
+                batch = [self.spots.popleft() for _ in range(count)]
+                self.condition.notify_all()
+            now = time.monotonic()
+            for queued, _ in batch:
+                self.lagMetric.observe(now - queued)
+            try:
+                self.reporter.spotBatch([spot for _, spot in batch])
+            except Exception:
+                logger.exception("error sending spots to reporter %s", self.name)
+            self.spotCounter.inc(len(batch))
+
+    def stop(self):
+        with self.condition:
+            self.doRun = False
+            self.condition.notify_all()
+        if self.thread is not threading.current_thread():
+            self.thread.join(self.stopTimeout)
+            if self.thread.is_alive():
+                logger.warning("reporter %s did not finish sending spots", self.name)
+        self.reporter.stop()
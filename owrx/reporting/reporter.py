@@ -1,7 +1,25 @@
 from abc import ABC, abstractmethod
+from enum import Enum
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Backpressure(Enum):
+    # discard the oldest queued spot when the queue is full
+    DROP_OLDEST = "drop_oldest"
+    # make the reporting thread wait until there is space in the queue
+    BLOCK = "block"
 
 
 class Reporter(ABC):
+    # spots are handed to the reporter on a separate thread, through a queue of this size
+    queueSize = 1000
+    backpressure = Backpressure.DROP_OLDEST
+    # maximum number of spots handed to spotBatch() at once
+    batchSize = 100
+
     @abstractmethod
     def stop(self):
         pass
@@ -10,6 +28,16 @@ class Reporter(ABC):
     def spot(self, spot):
         pass
 
+    def spotBatch(self, spots):
+        """
+        Handle several queued spots. Reporters that can send spots together should override this.
+        """
+        for spot in spots:
+            try:
+                self.spot(spot)
+            except Exception:
+                logger.exception("error sending spot to reporter")
+
 
 class FilteredReporter(Reporter):
     @abstractmethod
@@ -1,38 +1,146 @@
 from owrx.reporting.reporter import FilteredReporter
 from owrx.version import openwebrx_version
 from owrx.config import Config
+from owrx.config.core import CoreConfig
 from owrx.locator import Locator
-from owrx.metrics import Metrics, CounterMetric
-from queue import Queue, Full
-from urllib import request, parse
+from owrx.metrics import Metrics, CounterMetric, DirectMetric
+from collections import deque
+from http.client import HTTPConnection, HTTPSConnection
+from urllib import parse
 import threading
 import logging
+import json
+import os
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
 
-PoisonPill = object()
+class Spool(object):
+    """
+    Keeps the batches that have not been uploaded yet in the data directory, so they survive a restart.
+    """
+    # spots beyond this are dropped, oldest batches first
+    maxSpots = 10000
+
+    def __init__(self, file: str = None):
+        self.file = file if file is not None else "{0}/wsprnet_spool.json".format(CoreConfig().get_data_directory())
+
+    def load(self):
+        try:
+            with open(self.file, "r") as f:
+                batches = json.load(f)
+            if batches:
+                logger.info("loaded %i unsent WSPRNet spots", sum(len(b) for b in batches))
+            return batches
+        except FileNotFoundError:
+            return []
+        except Exception:
+            logger.exception("error loading WSPRNet spool")
+            return []
+
+    def store(self, batches: list):
+        total = sum(len(b) for b in batches)
+        while total > self.maxSpots:
+            dropped = batches.pop(0)
+            total -= len(dropped)
+            logger.warning("WSPRNet spool overflow, %i spots lost", len(dropped))
+        try:
+            # write to a temporary file first, so a crash never leaves a partial spool behind
+            tmp = self.file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(batches, f)
+            os.replace(tmp, self.file)
+        except Exception:
+            logger.exception("error storing WSPRNet spool")
 
 
 class Worker(threading.Thread):
-    def __init__(self, queue: Queue):
-        self.queue = queue
+    """
+    Uploads batches of spots in order, retrying with an exponential backoff when wsprnet cannot be reached.
+    """
+    minRetryDelay = 10
+    maxRetryDelay = 3600
+    maxRedirects = 5
+
+    def __init__(self, spool: Spool):
+        self.spool = spool
+        self.batches = deque(spool.load())
+        self.condition = threading.Condition()
         self.doRun = True
+        self.failures = 0
+
+        metrics = Metrics.getSharedInstance()
+        self.uploadCounter = CounterMetric()
+        metrics.addMetric("wsprnet.uploads", self.uploadCounter)
+        self.rejectCounter = CounterMetric()
+        metrics.addMetric("wsprnet.rejected", self.rejectCounter)
+        metrics.addMetric("wsprnet.spool", DirectMetric(self.getSpooledCount))
 
         super().__init__(daemon=True)
 
+    def getSpooledCount(self):
+        with self.condition:
+            return sum(len(b) for b in self.batches)
+
+    def addBatch(self, batch: list):
+        with self.condition:
+            self.batches.append(batch)
+            self._store()
+            self.condition.notify()
+
+    def _store(self):
+        batches = list(self.batches)
+        self.spool.store(batches)
+        if len(batches) < len(self.batches):
+            self.batches = deque(batches)
+
+    def stop(self):
+        with self.condition:
+            self.doRun = False
+            self.condition.notify()
+
+    def getRetryDelay(self):
+        return min(self.minRetryDelay * 2 ** (self.failures - 1), self.maxRetryDelay)
+
     def run(self):
-        while self.doRun:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.batches or not self.doRun)
+                if not self.doRun:
+                    break
+                batch = self.batches[0]
+            uploaded = 0
+            rejected = 0
             try:
-                spot = self.queue.get()
-                if spot is PoisonPill:
-                    self.doRun = False
+                for accepted in self.uploadBatch(batch):
+                    if accepted:
+                        uploaded += 1
+                    else:
+                        rejected += 1
+            except Exception as e:
+                logger.warning("WSPRNet upload failed: %s", e)
+            self.uploadCounter.inc(uploaded)
+            self.rejectCounter.inc(rejected)
+            # rejected spots are removed from the spool as well
+            done = uploaded + rejected
+            complete = done == len(batch)
+            with self.condition:
+                # only the worker removes batches, but the spool may have dropped this one in the meantime
+                if self.batches and self.batches[0] is batch:
+                    if complete:
+                        self.batches.popleft()
+                    else:
+                        del batch[:done]
+                    self._store()
+                    self.condition.notify_all()
+                if not complete:
+                    self.failures += 1
+                    delay = self.getRetryDelay()
+                    logger.debug("retrying WSPRNet upload in %i seconds", delay)
+                    self.condition.wait_for(lambda: not self.doRun, timeout=delay)
                 else:
-                    self.uploadSpot(spot)
-                    self.queue.task_done()
-            except Exception:
-                logger.exception("Exception while uploading WSPRNet spot")
+                    self.failures = 0
 
     def _getMode(self, spot):
         interval = round(spot["interval"] / 60)
@@ -41,12 +149,12 @@ class Worker(threading.Thread):
             return interval + 1
         return interval
 
-    def uploadSpot(self, spot):
+    def encodeSpot(self, spot):
         config = Config.get()
         # function=wspr&date=210114&time=1732&sig=-15&dt=0.5&drift=0&tqrg=7.040019&tcall=DF2UU&tgrid=JN48&dbm=37&version=2.3.0-rc3&rcall=DD5JFK&rgrid=JN58SC&rqrg=7.040047&mode=2
         # {'timestamp': 1610655960000, 'db': -23.0, 'dt': 0.3, 'freq': 7040048, 'drift': -1, 'msg': 'LA3JJ JO59 37', 'callsign': 'LA3JJ', 'locator': 'JO59', 'mode': 'WSPR'}
         date = datetime.fromtimestamp(spot["timestamp"] / 1000, tz=timezone.utc)
-        data = parse.urlencode(
+        return parse.urlencode(
             {
                 "function": "wspr",
                 "date": date.strftime("%y%m%d"),
@@ -65,15 +173,74 @@ class Worker(threading.Thread):
                 "mode": self._getMode(spot),
             }
         ).encode()
-        request.urlopen("http://wsprnet.org/post/", data, timeout=60)
+
+    def _connect(self, url):
+        connectionClass = HTTPSConnection if url.scheme == "https" else HTTPConnection
+        connection = connectionClass(url.netloc, timeout=60)
+        path = url.path or "/"
+        if url.query:
+            path += "?" + url.query
+        return connection, path
+
+    def uploadBatch(self, batch: list):
+        """
+        Post the spots of a batch over a single connection, following redirects. Yields True after every spot that
+        has been accepted, and False after every spot that has been rejected for good (encoding errors, HTTP 4xx).
+        Connection errors and server errors (HTTP 5xx) raise an exception, so the remaining spots are retried.
+        """
+        url = parse.urlsplit(Config.get()["wsprnet_url"])
+        connection, path = self._connect(url)
+        try:
+            for spot in batch:
+                try:
+                    body = self.encodeSpot(spot)
+                except Exception:
+                    # retrying will not help, so the spot is skipped
+                    logger.exception("Exception while encoding WSPRNet spot")
+                    yield False
+                    continue
+                redirects = 0
+                while True:
+                    connection.request(
+                        "POST", path, body=body, headers={"Content-Type": "application/x-www-form-urlencoded"}
+                    )
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status not in [301, 302, 303, 307, 308]:
+                        break
+                    location = response.getheader("Location")
+                    if location is None or redirects >= self.maxRedirects:
+                        raise IOError("HTTP status {0}, cannot follow redirect".format(response.status))
+                    redirects += 1
+                    # the rest of the batch goes to the new location as well
+                    url = parse.urlsplit(parse.urljoin(url.geturl(), location))
+                    logger.warning("WSPRNet upload redirected to %s, please check the WSPRNet URL", url.geturl())
+                    connection.close()
+                    connection, path = self._connect(url)
+                if 200 <= response.status < 300:
+                    yield True
+                elif 400 <= response.status < 500:
+                    # retrying will not help either
+                    logger.warning("WSPRNet rejected spot of %s: HTTP status %i", spot.get("callsign"), response.status)
+                    yield False
+                else:
+                    raise IOError("HTTP status {0}".format(response.status))
+        finally:
+            connection.close()
 
 
 class WsprnetReporter(FilteredReporter):
-    def __init__(self):
-        # max 100 entries
-        self.queue = Queue(100)
+    # spots arriving within this many seconds of the first spot of a batch are uploaded together. this collects the
+    # decodes of all bands in a cycle, since they are all decoded right after the end of the cycle.
+    batchDelay = 30
+
+    def __init__(self, spool: Spool = None):
+        self.batch = []
+        self.timer = None
+        self.lock = threading.Lock()
         # single worker
-        Worker(self.queue).start()
+        self.worker = Worker(spool if spool is not None else Spool())
+        self.worker.start()
 
         # metrics
         metrics = Metrics.getSharedInstance()
@@ -81,17 +248,31 @@ class WsprnetReporter(FilteredReporter):
         metrics.addMetric("wsprnet.spots", self.spotCounter)
 
     def stop(self):
-        while not self.queue.empty():
-            self.queue.get(timeout=1)
-            self.queue.task_done()
-        self.queue.put(PoisonPill)
+        # unsent spots stay in the spool until the next start
+        self.flush()
+        self.worker.stop()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            batch = self.batch
+            self.batch = []
+        if batch:
+            self.worker.addBatch(batch)
 
     def spot(self, spot):
-        try:
-            self.queue.put(spot, block=False)
-            self.spotCounter.inc()
-        except Full:
-            logger.warning("WSPRNet Queue overflow, one spot lost")
+        self.spotBatch([spot])
+
+    def spotBatch(self, spots):
+        with self.lock:
+            self.batch += spots
+            self.spotCounter.inc(len(spots))
+            if self.timer is None:
+                self.timer = threading.Timer(self.batchDelay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
 
     def getSupportedModes(self):
         return ["WSPR", "FST4W"]
@@ -4,9 +4,11 @@ from owrx.sdr import SdrService
 from owrx.bands import Bandplan
 from owrx.config import Config
 from owrx.source.resampler import Resampler
+from owrx.feature import FeatureDetector
 from owrx.property import PropertyLayer, PropertyDeleted
 from owrx.service.schedule import ServiceScheduler
 from owrx.service.chain import ServiceDemodulatorChain
+from owrx.service.cost import MeasuredCostModel, getCostModel, findResamplingPlan
 from owrx.modes import Modes, DigitalMode
 from typing import Union, Optional
 from csdr.chain.demodulator import BaseDemodulatorChain, ServiceDemodulator, DialFrequencyReceiver
@@ -25,9 +27,11 @@ class ServiceHandler(SdrSourceEventClient):
         self.startupTimer = None
         self.activitySub = None
         self.running = False
+        self.plan = None
         props = self.source.getProps()
         self.enabledSub = props.wireProperty("services", self._receiveEvent)
         self.decodersSub = None
+        self.channelizerSub = None
         # need to call _start() manually if property is not set since the default is True, but the initial call is only
         # made if the property is present
         if "services" not in props:
@@ -50,6 +54,7 @@ class ServiceHandler(SdrSourceEventClient):
         props = self.source.getProps()
         self.activitySub = props.filter("center_freq", "samp_rate").wire(self.onFrequencyChange)
         self.decodersSub = Config.get().wireProperty("services_decoders", self.onFrequencyChange)
+        self.channelizerSub = Config.get().wireProperty("services_channelizer", self.onFrequencyChange)
         if self.source.isAvailable():
             self._scheduleServiceStartup()
 
@@ -60,6 +65,9 @@ class ServiceHandler(SdrSourceEventClient):
         if self.decodersSub is not None:
             self.decodersSub.cancel()
             self.decodersSub = None
+        if self.channelizerSub is not None:
+            self.channelizerSub.cancel()
+            self.channelizerSub = None
         self._cancelStartupTimer()
         self.source.removeClient(self)
         self.stopServices()
@@ -148,12 +156,32 @@ class ServiceHandler(SdrSourceEventClient):
 
             if not dials:
                 logger.debug("no services available")
+                self.plan = None
                 return
 
             groups = self.optimizeResampling(dials, sr)
             if groups is None:
                 for dial in dials:
                     addService(dial, self.source)
+            elif self.useChannelizer():
+                # local import since numpy is an optional dependency
+                from owrx.source.channelizer import Channelizer
+                channelizer = Channelizer(self.source)
+                for group in groups:
+                    if len(group) > 1:
+                        cf = self.get_center_frequency(group)
+                        bw = self.get_bandwidth(group)
+                        logger.debug("setting up channel on center frequency: {0}, bandwidth: {1}".format(cf, bw))
+                        channel = channelizer.addChannel(cf, bw)
+                        for dial in group:
+                            addService(dial, channel)
+                    else:
+                        dial = group[0]
+                        addService(dial, self.source)
+                # one channelizer serves all groups. it goes in after the services since it must not be shutdown as
+                # long as the services are still running
+                channelizer.start()
+                self.services.append(channelizer)
             else:
                 for group in groups:
                     if len(group) > 1:
@@ -173,6 +201,9 @@ class ServiceHandler(SdrSourceEventClient):
                         dial = group[0]
                         addService(dial, self.source)
 
+    def useChannelizer(self):
+        return Config.get()["services_channelizer"] and FeatureDetector().is_available("channelizer")
+
     def get_min_max(self, group):
         def find_bandpass(dial):
             mode = Modes.findByModulation(dial["mode"])
@@ -197,59 +228,16 @@ class ServiceHandler(SdrSourceEventClient):
         return max((maxFreq - minFreq) * 1.15, 25000)
 
     def optimizeResampling(self, freqs, bandwidth):
-        freqs = sorted(freqs, key=lambda f: f["frequency"])
-        distances = [
-            {
-                "frequency": freqs[i]["frequency"],
-                "distance": freqs[i + 1]["frequency"] - freqs[i]["frequency"],
-            }
-            for i in range(0, len(freqs) - 1)
-        ]
-
-        distances = [d for d in distances if d["distance"] > 0]
-
-        distances = sorted(distances, key=lambda f: f["distance"], reverse=True)
-
-        def calculate_usage(num_splits):
-            splits = sorted([f["frequency"] for f in distances[0:num_splits]])
-            previous = 0
-            groups = []
-            for split in splits:
-                groups.append([f for f in freqs if previous < f["frequency"] <= split])
-                previous = split
-            groups.append([f for f in freqs if previous < f["frequency"]])
-
-            def get_total_bandwidth(group):
-                if len(group) > 1:
-                    return bandwidth + len(group) * self.get_bandwidth(group)
-                else:
-                    return bandwidth
-
-            total_bandwidth = sum([get_total_bandwidth(group) for group in groups])
-            return {
-                "num_splits": num_splits,
-                "total_bandwidth": total_bandwidth,
-                "groups": groups,
-            }
-
-        usages = [calculate_usage(i) for i in range(0, len(freqs))]
-        # another possible outcome might be that it's best not to resample at all. this is a special case.
-        usages += [
-            {
-                "num_splits": None,
-                "total_bandwidth": bandwidth * len(freqs),
-                "groups": [freqs],
-            }
-        ]
-        results = sorted(usages, key=lambda f: f["total_bandwidth"])
-
-        for r in results:
-            logger.debug("splits: {0}, total: {1}".format(r["num_splits"], r["total_bandwidth"]))
-
-        best = results[0]
-        if best["num_splits"] is None:
+        model = getCostModel()
+        plan = findResamplingPlan(freqs, bandwidth, model, self.get_bandwidth)
+        self.plan = plan
+        logger.debug("resampling plan: {0} groups, predicted cost: {1} ({2} model)".format(
+            len(plan.getResampledGroups()), model.formatCost(plan.cost), model.getName()
+        ))
+        # it might be best not to resample at all. this is a special case.
+        if not plan.getResampledGroups():
             return None
-        return best["groups"]
+        return plan.groups
 
     def setupService(self, dial, source):
         logger.debug("setting up service {mode} on frequency {frequency}".format(**dial))
@@ -394,6 +382,8 @@ class Services(object):
     @staticmethod
     def _receiveEnabledEvent(state):
         if state:
+            # measure the DSP costs used to group services (or load them from the cache) while the services start up
+            MeasuredCostModel.getSharedInstance().calibrateAsync()
             for key, source in SdrService.getActiveSources().__dict__().items():
                 Services.handlers[key] = ServiceHandler(source)
         else:
@@ -443,3 +433,16 @@ class Services(object):
                             "mode" : mode
                         })
         return result
+
+    @staticmethod
+    def listPlans():
+        result = []
+        for handler in list(Services.handlers.values()):
+            plan = handler.plan
+            if plan is not None:
+                result.append({
+                    "sdr"  : handler.source.getName(),
+                    "band" : handler.source.getProfileName(),
+                    **plan.__dict__()
+                })
+        return result
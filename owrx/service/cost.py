@@ -0,0 +1,350 @@
+from owrx.config.core import CoreConfig
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+import multiprocessing
+import threading
+import platform
+import bisect
+import math
+import json
+import time
+import os
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CostModel(ABC):
+    """
+    Predicts the CPU cost of the DSP stages used to run background services.
+    """
+    @abstractmethod
+    def getName(self) -> str:
+        pass
+
+    @abstractmethod
+    def resamplerCost(self, inputRate: float, outputRate: float) -> float:
+        """
+        Cost of a Resampler (Shift + FirDecimate) running on the full SDR rate.
+        """
+        pass
+
+    @abstractmethod
+    def selectorCost(self, inputRate: float) -> float:
+        """
+        Cost of the Selector at the start of every service chain.
+        """
+        pass
+
+    def formatCost(self, cost: float) -> str:
+        return "{:.0f}".format(cost)
+
+
+class BandwidthCostModel(CostModel):
+    """
+    Every stage costs as much as the bandwidth it has to process. This was the only model before measured costs were
+    available and is still used until the calibration has completed.
+    """
+    def getName(self) -> str:
+        return "bandwidth"
+
+    def resamplerCost(self, inputRate: float, outputRate: float) -> float:
+        return inputRate
+
+    def selectorCost(self, inputRate: float) -> float:
+        return inputRate
+
+    def formatCost(self, cost: float) -> str:
+        return "{:.0f} kHz processed".format(cost / 1000)
+
+
+class MeasuredCostModel(CostModel):
+    """
+    Costs measured by timing the pycsdr modules on synthetic IQ data, in CPU seconds per second of signal.
+    The calibration runs in a separate process, so that the CPU time of the running receiver is not counted. The
+    result is cached in the data directory, until pycsdr or the hardware changes, or the cache expires.
+    """
+    sharedInstance = None
+    creationLock = threading.Lock()
+
+    # decimations and input rates measured during calibration
+    decimations = [2, 4, 8, 16, 32, 64, 128, 256]
+    selectorRates = [24000, 48000, 96000, 192000, 384000, 768000, 1536000, 3072000]
+    selectorOutputRate = 12000
+    # increase when the calibration procedure changes, so that old results are discarded
+    cacheVersion = 2
+    maxCacheAge = 30 * 24 * 60 * 60
+    calibrationSamples = 2400000
+
+    @staticmethod
+    def getSharedInstance():
+        with MeasuredCostModel.creationLock:
+            if MeasuredCostModel.sharedInstance is None:
+                MeasuredCostModel.sharedInstance = MeasuredCostModel()
+        return MeasuredCostModel.sharedInstance
+
+    def __init__(self):
+        # CPU seconds per input sample, as lists of (x, cost) sorted by x
+        self.resamplerCosts = None
+        self.selectorCosts = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def getName(self) -> str:
+        return "measured"
+
+    def isCalibrated(self) -> bool:
+        return self.resamplerCosts is not None and self.selectorCosts is not None
+
+    def _getCacheFile(self):
+        return "{0}/service_costs.json".format(CoreConfig().get_data_directory())
+
+    def _getFingerprint(self):
+        try:
+            from pycsdr.modules import version as pycsdr_version
+        except ImportError:
+            pycsdr_version = None
+        return {
+            "version": self.cacheVersion,
+            "pycsdr": pycsdr_version,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        }
+
+    def calibrateAsync(self):
+        with self.lock:
+            if self.thread is not None or self.isCalibrated():
+                return
+            self.thread = threading.Thread(target=self.calibrate, name="service_cost_calibration", daemon=True)
+            self.thread.start()
+
+    def calibrate(self):
+        if self._loadCache():
+            return
+        logger.info("Calibrating service cost model, this may take a few seconds...")
+        try:
+            # a fresh interpreter, so that none of the receiver threads are running in the measuring process
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                resamplerCosts, selectorCosts = pool.apply(_runCalibration)
+        except Exception:
+            logger.exception("Service cost model calibration failed")
+            return
+        self.resamplerCosts = resamplerCosts
+        self.selectorCosts = selectorCosts
+        self._saveCache()
+        logger.info("Service cost model calibration complete")
+
+    def invalidate(self):
+        """
+        Discard the cached calibration. The next calibrate() call will measure again.
+        """
+        try:
+            os.unlink(self._getCacheFile())
+        except FileNotFoundError:
+            pass
+        self.resamplerCosts = None
+        self.selectorCosts = None
+        with self.lock:
+            self.thread = None
+
+    def _loadCache(self) -> bool:
+        try:
+            with open(self._getCacheFile(), "r") as f:
+                data = json.load(f)
+            if data["fingerprint"] != self._getFingerprint():
+                return False
+            if time.time() - data["timestamp"] > self.maxCacheAge:
+                return False
+            self.resamplerCosts = [tuple(x) for x in data["resampler"]]
+            self.selectorCosts = [tuple(x) for x in data["selector"]]
+            return True
+        except (FileNotFoundError, KeyError, ValueError, TypeError):
+            return False
+        except Exception:
+            logger.exception("Error loading cached service cost model")
+            return False
+
+    def _saveCache(self):
+        data = {
+            "fingerprint": self._getFingerprint(),
+            "timestamp": time.time(),
+            "resampler": self.resamplerCosts,
+            "selector": self.selectorCosts,
+        }
+        try:
+            with open(self._getCacheFile(), "w") as f:
+                json.dump(data, f, indent=2)
+        except Exception:
+            logger.exception("Error saving service cost model")
+
+    def _measure(self, chain, inputSamples: int, outputSamples: int) -> float:
+        # local imports since pycsdr is only needed for the calibration itself
+        from pycsdr.modules import Buffer
+        from pycsdr.types import Format
+
+        source = Buffer(Format.COMPLEX_FLOAT)
+        output = Buffer(chain.getOutputFormat())
+        chain.setReader(source.getReader())
+        chain.setWriter(output)
+        reader = output.getReader()
+        received = [0]
+        progress = threading.Condition()
+
+        def drain():
+            while True:
+                data = reader.read()
+                if data is None:
+                    break
+                with progress:
+                    received[0] += len(data) // 8
+                    progress.notify()
+
+        thread = threading.Thread(target=drain, name="service_cost_drain", daemon=True)
+        thread.start()
+
+        # uniform noise, the actual values do not matter to the DSP cost
+        chunkSamples = 65536
+        chunk = os.urandom(chunkSamples * 8)
+        written = 0
+        start = time.process_time()
+        while written < inputSamples:
+            source.write(chunk)
+            written += chunkSamples
+            # wait for the chain to keep up, so no data is lost in the buffers. this blocks instead of polling, so
+            # the waiting itself does not use up any of the measured cpu time.
+            expected = written * outputSamples / inputSamples * 0.9
+            with progress:
+                progress.wait_for(lambda: received[0] >= expected, timeout=5)
+        used = time.process_time() - start
+
+        chain.stop()
+        reader.stop()
+        return used / written
+
+    def _measureResampler(self, decimation: int) -> float:
+        from csdr.chain import Chain
+        from pycsdr.modules import Shift, FirDecimate
+
+        chain = Chain([Shift(0.1), FirDecimate(decimation, 0.15 / decimation)])
+        return self._measure(chain, self.calibrationSamples, self.calibrationSamples // decimation)
+
+    def _measureSelector(self, inputRate: int) -> float:
+        from csdr.chain.selector import Selector
+
+        chain = Selector(inputRate, self.selectorOutputRate, withSquelch=False)
+        chain.setFrequencyOffset(0)
+        chain.setBandpass(-1000, 1000)
+        samples = min(self.calibrationSamples, inputRate * 2)
+        return self._measure(chain, samples, samples * self.selectorOutputRate // inputRate)
+
+    @staticmethod
+    def _interpolate(table, x) -> float:
+        # linear interpolation on a log2 scale, clamped at the ends of the table
+        keys = [k for k, _ in table]
+        index = bisect.bisect_left(keys, x)
+        if index <= 0:
+            return table[0][1]
+        if index >= len(table):
+            return table[-1][1]
+        (x0, y0), (x1, y1) = table[index - 1], table[index]
+        position = (math.log2(x) - math.log2(x0)) / (math.log2(x1) - math.log2(x0))
+        return y0 + (y1 - y0) * position
+
+    def resamplerCost(self, inputRate: float, outputRate: float) -> float:
+        decimation = max(1, int(inputRate / outputRate))
+        return self._interpolate(self.resamplerCosts, decimation) * inputRate
+
+    def selectorCost(self, inputRate: float) -> float:
+        return self._interpolate(self.selectorCosts, inputRate) * inputRate
+
+    def formatCost(self, cost: float) -> str:
+        return "{:.1f}% CPU".format(cost * 100)
+
+
+def _runCalibration():
+    # runs in the calibration process
+    model = MeasuredCostModel()
+    resamplerCosts = [(d, model._measureResampler(d)) for d in model.decimations]
+    selectorCosts = [(r, model._measureSelector(r)) for r in model.selectorRates]
+    return resamplerCosts, selectorCosts
+
+
+def getCostModel() -> CostModel:
+    """
+    The measured cost model once it is calibrated, the bandwidth model until then.
+    """
+    measured = MeasuredCostModel.getSharedInstance()
+    if measured.isCalibrated():
+        return measured
+    return BandwidthCostModel()
+
+
+class ResamplingPlan(object):
+    def __init__(self, groups: List[list], cost: float, model: CostModel):
+        self.groups = groups
+        self.cost = cost
+        self.model = model
+
+    def getResampledGroups(self) -> List[list]:
+        return [g for g in self.groups if len(g) > 1]
+
+    def __dict__(self):
+        return {
+            "groups": len(self.getResampledGroups()),
+            "services": sum(len(g) for g in self.groups),
+            "cost": self.model.formatCost(self.cost),
+            "model": self.model.getName(),
+        }
+
+
+def findResamplingPlan(
+    freqs: list, sampleRate: float, model: CostModel, getBandwidth: Callable[[list], float]
+) -> Optional[ResamplingPlan]:
+    """
+    Find the cheapest way of splitting the dials into resampler groups.
+
+    Groups always consist of neighbouring dials, so this is solved exactly with dynamic programming over the dials
+    sorted by frequency. Each group is either resampled (at least two dials, one resampler plus one selector per
+    dial on the reduced rate) or served directly from the SDR (one selector per dial on the full rate).
+    Returns a plan with a list of groups; groups of one dial are not resampled.
+    """
+    freqs = sorted(freqs, key=lambda f: f["frequency"])
+    count = len(freqs)
+    if not count:
+        return None
+
+    directCost = model.selectorCost(sampleRate)
+
+    def groupCost(group):
+        bandwidth = getBandwidth(group)
+        # the resampler output rate is an integer fraction of the input, never lower than the requested bandwidth
+        outputRate = sampleRate / max(1, int(sampleRate / bandwidth))
+        return model.resamplerCost(sampleRate, outputRate) + len(group) * model.selectorCost(outputRate)
+
+    # best[i] is the cheapest cost for the first i dials, split[i] the start of the last group in that solution
+    best = [0.0] + [math.inf] * count
+    split = [0] * (count + 1)
+    resampled = [False] * (count + 1)
+    for end in range(1, count + 1):
+        # serve the last dial directly
+        best[end] = best[end - 1] + directCost
+        split[end] = end - 1
+        # or resample the dials from start to end together
+        for start in range(0, end - 1):
+            cost = best[start] + groupCost(freqs[start:end])
+            if cost < best[end]:
+                best[end] = cost
+                split[end] = start
+                resampled[end] = True
+
+    groups = []
+    end = count
+    while end > 0:
+        start = split[end]
+        if resampled[end] and end - start > 1:
+            groups.insert(0, freqs[start:end])
+        else:
+            groups.insert(0, [freqs[end - 1]])
+        end = start
+    return ResamplingPlan(groups, best[count], model)
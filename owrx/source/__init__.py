@@ -561,9 +561,9 @@ class SdrSource(ABC):
                 self.spectrumThread.stop()
                 self.spectrumThread = None
 
-    def writeSpectrumData(self, data):
-        for c in self.spectrumClients:
-            c.write_spectrum_data(data)
+    def getSpectrumClients(self):
+        # return a copy so that clients can come and go while a frame is being broadcast
+        return list(self.spectrumClients)
 
     def getState(self) -> SdrSourceState:
         return self.state
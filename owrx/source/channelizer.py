@@ -0,0 +1,147 @@
+from owrx.property import PropertyLayer
+from pycsdr.modules import Buffer
+from pycsdr.types import Format
+import threading
+import math
+
+import numpy
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelizerOutput(object):
+    """
+    One narrow channel produced by a Channelizer. Offers the parts of the SdrSource interface that service chains
+    use (getProps() and getBuffer()), so it can be used in place of a Resampler.
+    """
+    def __init__(self, props: PropertyLayer, offsetBin: int, decimation: int, response):
+        self.props = props
+        self.offsetBin = offsetBin
+        self.decimation = decimation
+        self.response = response
+        self.bins = None
+        self.buffer = Buffer(Format.COMPLEX_FLOAT)
+
+    def getProps(self):
+        return self.props
+
+    def getBuffer(self):
+        return self.buffer
+
+
+class Channelizer(object):
+    """
+    Splits the wideband stream of an SDR into several narrow channels in a single pass.
+
+    This is a fast convolution filter bank (overlap-save): every block of input samples is transformed with one large
+    FFT, and each channel is then produced by cutting its bins out of the spectrum, applying the channel filter and
+    running a small inverse FFT, which also takes care of the decimation. The cost of an additional channel is one
+    small inverse FFT, instead of another Shift and FirDecimate running on the full sample rate.
+    """
+
+    # fraction of each FFT block that is new input; the rest is overlap, which limits the filter length
+    overlapFactor = 4
+
+    def __init__(self, sdr, fftSize: int = None):
+        sdrProps = sdr.getProps()
+        self.sdr = sdr
+        self.centerFreq = sdrProps["center_freq"]
+        self.sampleRate = sdrProps["samp_rate"]
+        self.fftSize = fftSize if fftSize is not None else self.getFftSize(self.sampleRate)
+        self.step = self.fftSize * (self.overlapFactor - 1) // self.overlapFactor
+        self.channels = []
+        self.reader = None
+        self.thread = None
+        self.doRun = True
+
+    @staticmethod
+    def getFftSize(sampleRate) -> int:
+        # aim for a bin width of about 100Hz, which is the precision of the channel center frequencies
+        size = 2 ** math.ceil(math.log2(sampleRate / 100))
+        return min(max(size, 4096), 2 ** 18)
+
+    def addChannel(self, center_freq, bandwidth) -> ChannelizerOutput:
+        if self.thread is not None:
+            raise RuntimeError("cannot add channels to a running channelizer")
+
+        # decimation needs to divide the number of new samples per block, so it is limited to powers of two
+        maxDecimation = self.fftSize // self.overlapFactor
+        decimation = 2 ** int(math.floor(math.log2(max(1, self.sampleRate / bandwidth))))
+        decimation = max(1, min(decimation, maxDecimation))
+        outputRate = self.sampleRate / decimation
+        binCount = self.fftSize // decimation
+
+        offsetBin = round((center_freq - self.centerFreq) / self.sampleRate * self.fftSize)
+        # the channel is centered on the closest bin, so the actual center frequency may be slightly off
+        actualCenter = self.centerFreq + offsetBin * self.sampleRate / self.fftSize
+
+        output = ChannelizerOutput(
+            PropertyLayer(center_freq=actualCenter, samp_rate=outputRate),
+            offsetBin,
+            decimation,
+            self._getResponse(binCount, outputRate, bandwidth),
+        )
+        # bin indices in natural FFT order, relative to the channel center
+        offsets = numpy.fft.fftfreq(binCount, 1 / binCount).astype(int)
+        output.bins = (offsetBin + offsets) % self.fftSize
+        self.channels.append(output)
+        logger.debug(
+            "channel at %i Hz: decimation %i, output rate %i, %i bins", actualCenter, decimation, outputRate, binCount
+        )
+        return output
+
+    def _getResponse(self, binCount, outputRate, bandwidth):
+        # flat passband with a raised cosine transition up to the edge of the output band
+        frequencies = numpy.abs(numpy.fft.fftfreq(binCount, 1 / outputRate))
+        stop = outputRate / 2
+        passband = min(bandwidth / 2, stop * 0.85)
+        transition = numpy.clip((frequencies - passband) / (stop - passband), 0, 1)
+        # scale by the ratio of the inverse FFT sizes to keep the amplitude of the input
+        scale = binCount / self.fftSize
+        return (0.5 + 0.5 * numpy.cos(numpy.pi * transition)) * scale
+
+    def start(self):
+        if self.thread is not None or not self.channels:
+            return
+        self.reader = self.sdr.getBuffer().getReader()
+        self.thread = threading.Thread(target=self.run, name="channelizer")
+        self.thread.start()
+
+    def run(self):
+        overlap = self.fftSize - self.step
+        block = numpy.zeros(self.fftSize, dtype=numpy.complex64)
+        # samples that have been read, but do not make up a full step yet
+        pending = numpy.zeros(0, dtype=numpy.complex64)
+        blockCount = 0
+        while self.doRun:
+            data = self.reader.read()
+            if data is None:
+                break
+            pending = numpy.concatenate((pending, numpy.frombuffer(data, dtype=numpy.complex64)))
+            while len(pending) >= self.step:
+                block[:overlap] = block[self.step:]
+                block[overlap:] = pending[:self.step]
+                pending = pending[self.step:]
+                self.process(block, blockCount)
+                blockCount += 1
+
+    def process(self, block, blockCount):
+        spectrum = numpy.fft.fft(block)
+        overlap = self.fftSize - self.step
+        for channel in self.channels:
+            output = numpy.fft.ifft(spectrum[channel.bins] * channel.response)
+            # the inverse FFT moves the channel to baseband relative to the block start; this corrects the phase
+            # for the absolute position of the block, so that the output is continuous across blocks
+            rotation = (channel.offsetBin * self.step * blockCount) % self.fftSize
+            output *= numpy.exp(-2j * numpy.pi * rotation / self.fftSize)
+            # the overlapping part is affected by circular convolution and is discarded
+            samples = output[overlap // channel.decimation:].astype(numpy.complex64)
+            channel.buffer.write(samples.tobytes())
+
+    def stop(self):
+        self.doRun = False
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
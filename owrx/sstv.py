@@ -1,10 +1,6 @@
-from owrx.storage import Storage, DataRecorder
-from csdr.module import ThreadModule
-from pycsdr.types import Format
+from owrx.storage import Storage
+from owrx.image import ImageParser
 from datetime import datetime
-import base64
-import pickle
-import os
 
 import logging
 
@@ -62,50 +58,15 @@ modeNames = {
     115: "Pasokon P7",
 }
 
-class SstvParser(DataRecorder, ThreadModule):
+class SstvParser(ImageParser):
+    messageMode = "SSTV"
+
     def __init__(self, service: bool = False):
-        self.service = service
-        self.data    = bytearray(b'')
-        self.width   = 0
-        self.height  = 0
-        self.line    = 0
         self.mode    = 0
-        DataRecorder.__init__(self, "SSTV", ".bmp")
-        ThreadModule.__init__(self)
-
-    def getInputFormat(self) -> Format:
-        return Format.CHAR
-
-    def getOutputFormat(self) -> Format:
-        return Format.CHAR
-
-    def myName(self):
-        return "%s%s" % (
-            "Service" if self.service else "Client",
-            " at %dkHz" % (self.frequency // 1000) if self.frequency>0 else ""
-        )
+        super().__init__(service, "SSTV")
 
-    def run(self):
-        logger.debug("%s starting..." % self.myName())
-        # Run while there is input data
-        while self.doRun:
-            # Read input data
-            inp = self.reader.read()
-            # Terminate if no input data
-            if inp is None:
-                self.doRun = False
-                break
-            # Add read data to the buffer
-            self.data = self.data + inp.tobytes()
-            # Process buffer contents
-            out = self.process()
-            # Keep processing while there is input to parse
-            while out is not None:
-                if len(out)>0:
-                    self.writer.write(pickle.dumps(out))
-                out = self.process()
+    def finish(self):
         # We are done
-        logger.debug("%s exiting..." % self.myName())
         self.closeImage(self.line, self.height, self.height // 2)
 
     def process(self):
@@ -122,7 +83,7 @@ class SstvParser(DataRecorder, ThreadModule):
                     # If running as a service...
                     if self.service:
                         # Write a scanline into open image file
-                        self.writeFile(self.data[0:w])
+                        self.writeBuffer(w)
                         # Close once the last scanline reached
                         if self.line>=self.height:
                             self.closeImage(self.line, self.height)
@@ -130,13 +91,7 @@ class SstvParser(DataRecorder, ThreadModule):
                         out = {}
                     else:
                         # Compose result
-                        out = {
-                            "mode":   "SSTV",
-                            "pixels": base64.b64encode(self.data[0:w]).decode(),
-                            "line":   self.line-1,
-                            "width":  self.width,
-                            "height": self.height
-                        }
+                        out = self.makeScanline(self.line-1, w)
                     # If we reached the end of frame, finish scan
                     if self.line>=self.height:
                         self.width  = 0
@@ -144,7 +99,7 @@ class SstvParser(DataRecorder, ThreadModule):
                         self.line   = 0
                         self.mode   = 0
                     # Remove parsed data
-                    del self.data[0:w]
+                    self.data.skip(w)
 
             else:
                 # Search for the leading 'BM' or ' ['
@@ -153,33 +108,15 @@ class SstvParser(DataRecorder, ThreadModule):
                 # If not found...
                 if w<0 and d<0:
                     # Skip all but last character (may have 'B')
-                    del self.data[0:len(self.data)-1]
+                    self.data.skip(len(self.data)-1)
                 elif w<0 or (d>=0 and d<w):
                     # Skip everything until ' ['
-                    del self.data[0:d]
-                    # Look for the closing bracket
-                    w = self.data.find(b']')
-                    if w>=0:
-                        # Extract message contents
-                        msg = self.data[2:w].decode()
-                        # Remove parsed data
-                        del self.data[0:w+1]
-                        # Log message
-                        logger.debug("%s says [%s]" % (self.myName(), msg))
-                        # If running as a service...
-                        if self.service:
-                            # Empty result
-                            out = {}
-                        else:
-                            # Compose result
-                            out = {
-                                "mode":      "SSTV",
-                                "message":   msg,
-                                "frequency": self.frequency
-                            }
+                    self.data.skip(d)
+                    # Parse message until the closing bracket
+                    out = self.parseMessage()
                 else:
                     # Skip everything until 'BM'
-                    del self.data[0:w]
+                    self.data.skip(w)
                     # If got the entire header...
                     if len(self.data)>=54:
                         self.width  = self.data[18] + (self.data[19]<<8) + (self.data[20]<<16) + (self.data[21]<<24)
@@ -201,7 +138,7 @@ class SstvParser(DataRecorder, ThreadModule):
                         if self.service:
                             # Create a new image file and write BMP header
                             self.newFile(fileName + ".bmp")
-                            self.writeFile(self.data[0:54])
+                            self.writeBuffer(54)
                             # Empty result
                             out = {}
                         else:
@@ -216,7 +153,7 @@ class SstvParser(DataRecorder, ThreadModule):
                                 "frequency": self.frequency
                             }
                         # Remove parsed data
-                        del self.data[0:54]
+                        self.data.skip(54)
 
         except Exception as exptn:
             logger.debug("%s: Exception parsing: %s" % (self.myName(), str(exptn)))
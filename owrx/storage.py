@@ -1,9 +1,14 @@
 from owrx.config.core import CoreConfig
 from owrx.config import Config
+from owrx.metrics import Metrics, CounterMetric, DirectMetric, HistogramMetric
 from datetime import datetime
+from queue import Queue, Full
 
 import threading
 import subprocess
+import struct
+import time
+import zlib
 import os
 import re
 
@@ -15,6 +20,8 @@ class Storage(object):
     sharedInstance = None
     creationLock = threading.Lock()
     filePattern = r'[A-Z0-9]+-[0-9]+-[0-9]+(-[0-9]+)?(-[0-9]+)?\.(bmp|png|txt|mp3)'
+    # BMP files up to this size are converted to PNG in process
+    maxEncodeBytes = 4 * 1024 * 1024
 
     # Get shared instance of Storage class
     @staticmethod
@@ -27,6 +34,8 @@ class Storage(object):
     # Construct an instance of Storage class
     def __init__(self):
         self.lock = threading.Lock()
+        # Files being converted, left alone by cleanStoredFiles()
+        self.converting = set()
 
     # Create stored file by name, modifying the name if the file exists
     def newFile(self, fileName: str, buffering: int = -1):
@@ -72,6 +81,10 @@ class Storage(object):
 
         with self.lock:
             files = [os.path.join(dir, f) for f in os.listdir(dir) if re.match(self.filePattern, f)]
+            files = [f for f in files if f not in self.converting]
+            # Nothing to delete, no need to sort
+            if len(files) <= keep:
+                return
             files.sort(key=lambda x: os.path.getctime(x), reverse=True)
 
             for f in files[keep:]:
@@ -100,7 +113,9 @@ class Storage(object):
         f = ('-%d' % (frequency // 1000)) if frequency>0 else ''
         return pattern.format(d + f)
 
-    # Convert given file from BMP to PNG format using ImageMagick
+    # Convert given file from BMP to PNG format, in process if the
+    # image is small enough, using ImageMagick otherwise. Returns the
+    # method used ("png" or "imagemagick"), None if not converted.
     @staticmethod
     def convertImage(inFile: str):
         pm    = Config.get()
@@ -109,37 +124,340 @@ class Storage(object):
         compress_filter = pm["image_compress_filter"] # int 0-5. compression-filter in magick
         quantize = pm["image_quantize"] # boolean. Do quantization?
         quantize_colors = pm["image_quantize_colors"] # int. Number of colors in palette.
-        
+
         # Adds storage path
         if not inFile.startswith('/'):
-            inFile = self.getFilePath(inFile)
+            inFile = Storage.getFilePath(inFile)
         # Only converting BMP files for now
         outFile = re.sub(r'\.bmp$', '.png', inFile)
         if outFile==inFile:
-            return
+            return None
+        # Write to a hidden file first, so that only complete images
+        # show up in the storage
+        tmpFile = os.path.join(os.path.dirname(outFile), "." + os.path.basename(outFile))
+        storage = Storage.getSharedInstance()
+        with storage.lock:
+            storage.converting.add(inFile)
         try:
-            # Use ImageMagick to convert file
-            params = ['convert', inFile]
-
-            # Apply quantization if enabled
-            if quantize:
-                params.extend(["-colors", quantize_colors])
-
-            # Apply compression options if enabled
-            if compress:
-                params.extend([
-                    "-define", f"png:compression-level={compress_level}",
-                    "-define", f"png:compression-filter={compress_filter}"
-                ])
-
-            # Final output file
-            params.append(outFile)
-            logger.debug("Converting image %s->%s: %s", inFile, outFile, ' '.join(params))
-            subprocess.check_call(params)
-            # If conversion was successful, delete original file
-            os.unlink(inFile)
+            # ImageMagick defaults to level 7 with adaptive filtering
+            level  = int(compress_level) if compress else 7
+            filter = int(compress_filter) if compress else 5
+            colors = int(quantize_colors) if quantize else None
+            if Storage.encodeImage(inFile, tmpFile, level, filter, colors):
+                method = "png"
+            else:
+                # Use ImageMagick to convert file
+                params = ['convert', inFile]
+
+                # Apply quantization if enabled
+                if quantize:
+                    params.extend(["-colors", quantize_colors])
+
+                # Apply compression options if enabled
+                if compress:
+                    params.extend([
+                        "-define", f"png:compression-level={compress_level}",
+                        "-define", f"png:compression-filter={compress_filter}"
+                    ])
+
+                # Final output file
+                params.append(tmpFile)
+                logger.debug("Converting image %s->%s: %s", inFile, outFile, ' '.join(params))
+                subprocess.check_call(params)
+                method = "imagemagick"
+            # If conversion was successful, replace original file,
+            # so that cleanups never see both
+            with storage.lock:
+                os.replace(tmpFile, outFile)
+                os.unlink(inFile)
+            return method
         except Exception as e:
             logger.debug("convertImage(): " + str(e))
+            try:
+                os.unlink(tmpFile)
+            except OSError:
+                pass
+            return None
+        finally:
+            with storage.lock:
+                storage.converting.discard(inFile)
+
+    # Convert given BMP file to PNG without starting ImageMagick.
+    # Returns False if the image is too large or cannot be encoded
+    # with the given settings.
+    @staticmethod
+    def encodeImage(inFile: str, outFile: str, level: int, filter: int, colors: int = None):
+        if filter not in PNG_FILTERS or os.path.getsize(inFile) > Storage.maxEncodeBytes:
+            return False
+        image = BmpImage.read(inFile)
+        if image is None:
+            return False
+        if colors is not None:
+            # Only grayscale levels are quantized here, ImageMagick
+            # picks a better palette for color images
+            if not image.isGrayscale():
+                return False
+            image.quantize(colors)
+        logger.debug("Encoding image %s->%s, level %d, filter %d" % (inFile, outFile, level, filter))
+        data = encodePng(image, level, filter)
+        with open(outFile, "wb") as f:
+            f.write(data)
+        return True
+
+
+# PNG filters supported by the built-in encoder:
+# none, sub, up, adaptive (choosing one of the others per row)
+PNG_FILTERS = [0, 1, 2, 5]
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Filtered byte values as distances from zero, for choosing filters
+FILTER_WEIGHTS = bytes(min(i, 256 - i) for i in range(256))
+# 8bpp palette of the grayscale images, as RGB triplets
+GRAY_PALETTE = bytes(i for i in range(256) for _ in range(3))
+
+
+#
+# Uncompressed 8bpp (with palette) or 24bpp BMP image, as written by
+# the image decoders. Pixels are kept as top-down rows without padding,
+# in RGB order, the palette as RGB triplets.
+#
+class BmpImage(object):
+    def __init__(self, width: int, height: int, depth: int, pixels: bytes, palette: bytes = None):
+        self.width   = width
+        self.height  = height
+        self.depth   = depth
+        self.pixels  = pixels
+        self.palette = palette
+
+    @staticmethod
+    def read(fileName: str):
+        with open(fileName, "rb") as f:
+            return BmpImage.parse(f.read())
+
+    # Parse BMP file contents, return None if not supported
+    @staticmethod
+    def parse(data: bytes):
+        if len(data) < 54 or data[0:2] != b"BM":
+            return None
+        offset, headerSize, width, height, planes, depth, compression = struct.unpack_from("<10xIIiiHHI", data)
+        if headerSize < 40 or compression != 0 or depth not in (8, 24) or width <= 0 or height == 0:
+            return None
+        # Palette entries are BGR0, convert them to RGB
+        palette = None
+        if depth == 8:
+            count   = struct.unpack_from("<I", data, 46)[0] or 256
+            entries = data[14 + headerSize : 14 + headerSize + 4 * count]
+            palette = bytearray(len(entries) // 4 * 3)
+            palette[0::3] = entries[2::4]
+            palette[1::3] = entries[1::4]
+            palette[2::3] = entries[0::4]
+            palette = bytes(palette)
+        # Rows should be padded to 4 bytes, but the decoders may
+        # write them unpadded
+        rowBytes  = width * depth // 8
+        stride    = (rowBytes + 3) & ~3
+        available = len(data) - offset
+        if available < stride * abs(height):
+            stride = rowBytes
+        # Files may end before the last row
+        rows = min(abs(height), available // stride)
+        if rows <= 0:
+            return None
+        if stride == rowBytes:
+            pixels = bytearray(data[offset : offset + rows * stride])
+        else:
+            pixels = bytearray().join(
+                data[offset + i * stride : offset + i * stride + rowBytes] for i in range(rows)
+            )
+        # Positive height means bottom-up rows
+        if height > 0:
+            pixels = bytearray().join(
+                pixels[i * rowBytes : (i + 1) * rowBytes] for i in reversed(range(rows))
+            )
+        # Swap BGR pixels to RGB
+        if depth == 24:
+            rgb = bytearray(len(pixels))
+            rgb[0::3] = pixels[2::3]
+            rgb[1::3] = pixels[1::3]
+            rgb[2::3] = pixels[0::3]
+            pixels = rgb
+        return BmpImage(width, rows, depth, bytes(pixels), palette)
+
+    # Check if this is an 8bpp image with the grayscale palette
+    def isGrayscale(self) -> bool:
+        return self.palette is not None and self.palette == GRAY_PALETTE[0:len(self.palette)]
+
+    # Reduce grayscale image to given number of evenly spaced levels
+    def quantize(self, colors: int):
+        if colors < 2 or colors >= 256:
+            return
+        steps = colors - 1
+        levels = bytes(round(round(i * steps / 255) * 255 / steps) for i in range(256))
+        self.pixels = self.pixels.translate(levels)
+
+
+# Filter image rows for PNG encoding, return a filter type byte
+# followed by the filtered row for each row.
+def filterPngRows(pixels: bytes, rowBytes: int, bpp: int, filter: int) -> bytearray:
+    out  = bytearray()
+    rows = len(pixels) // rowBytes
+    if filter == 0:
+        for i in range(rows):
+            out.append(0)
+            out += pixels[i * rowBytes : (i + 1) * rowBytes]
+        return out
+
+    # Rows are subtracted as big integers, bytewise modulo 256
+    # without borrowing between the bytes
+    high = int.from_bytes(b"\x80" * rowBytes, "big")
+    low  = int.from_bytes(b"\x7f" * rowBytes, "big")
+
+    def subtract(x, y):
+        return ((x | high) - (y & low)) ^ ((x ^ y ^ high) & high)
+
+    prev = 0
+    for i in range(rows):
+        row = pixels[i * rowBytes : (i + 1) * rowBytes]
+        x   = int.from_bytes(row, "big")
+        if filter == 1:
+            best = (1, subtract(x, x >> (8 * bpp)).to_bytes(rowBytes, "big"))
+        elif filter == 2:
+            best = (2, subtract(x, prev).to_bytes(rowBytes, "big"))
+        else:
+            # Adaptive: the filter giving the smallest values
+            candidates = [
+                (0, row),
+                (1, subtract(x, x >> (8 * bpp)).to_bytes(rowBytes, "big")),
+                (2, subtract(x, prev).to_bytes(rowBytes, "big")),
+            ]
+            best = min(candidates, key=lambda c: sum(c[1].translate(FILTER_WEIGHTS)))
+        out.append(best[0])
+        out += best[1]
+        prev = x
+    return out
+
+
+def pngChunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+# Encode image as an 8 bit per channel PNG file
+def encodePng(image: BmpImage, level: int = 6, filter: int = 0) -> bytes:
+    chunks = []
+    if image.depth == 24:
+        colorType, bpp = 2, 3
+    elif image.isGrayscale():
+        colorType, bpp = 0, 1
+    else:
+        colorType, bpp = 3, 1
+        chunks.append(pngChunk(b"PLTE", image.palette))
+        # Palette images compress best unfiltered
+        filter = 0
+    header = struct.pack(">IIBBBBB", image.width, image.height, 8, colorType, 0, 0, 0)
+    rows   = filterPngRows(image.pixels, image.width * bpp, bpp, filter)
+    return b"".join(
+        [PNG_SIGNATURE, pngChunk(b"IHDR", header)]
+        + chunks
+        + [pngChunk(b"IDAT", zlib.compress(rows, level)), pngChunk(b"IEND", b"")]
+    )
+
+
+#
+# Finalizes closed files on a few worker threads, so that decoders do
+# not have to wait for image conversion and storage cleanup.
+#
+class FileFinalizer(object):
+    sharedInstance = None
+    creationLock = threading.Lock()
+    # Pending jobs beyond this are run by the thread closing the file
+    queueLength = 16
+    workers = 2
+    latencyBuckets = [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30]
+
+    # Get shared instance of FileFinalizer class
+    @staticmethod
+    def getSharedInstance():
+        with FileFinalizer.creationLock:
+            if FileFinalizer.sharedInstance is None:
+                FileFinalizer.sharedInstance = FileFinalizer()
+        return FileFinalizer.sharedInstance
+
+    def __init__(self):
+        self.queue = Queue(self.queueLength)
+        self.lock = threading.Lock()
+        self.cleanupPending = False
+
+        metrics = Metrics.getSharedInstance()
+        self.overflowCounter = CounterMetric()
+        metrics.addMetric("storage.finalize.overflow", self.overflowCounter)
+        self.errorCounter = CounterMetric()
+        metrics.addMetric("storage.convert.errors", self.errorCounter)
+        metrics.addMetric("storage.finalize.queue", DirectMetric(self.queue.qsize))
+
+        self.threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name="FileFinalizer.{0}".format(i), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    # Convert given BMP file to PNG, then clean up the storage
+    def convertImage(self, filePath: str):
+        self._put(filePath)
+
+    # Delete excessive files from storage, once for all the files
+    # closed while a cleanup is pending
+    def cleanStoredFiles(self):
+        with self.lock:
+            if self.cleanupPending:
+                return
+            self.cleanupPending = True
+        self._put(None)
+
+    # Wait until all pending jobs are done
+    def join(self):
+        self.queue.join()
+
+    def _put(self, job):
+        try:
+            self.queue.put_nowait(job)
+        except Full:
+            self.overflowCounter.inc()
+            logger.warning("File finalization queue full, finalizing on the calling thread")
+            self._process(job)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self._process(job)
+            except Exception as e:
+                logger.error("Exception finalizing file: %s" % str(e))
+            finally:
+                self.queue.task_done()
+
+    def _process(self, job):
+        if job is None:
+            with self.lock:
+                self.cleanupPending = False
+            logger.info("Performing storage cleanup...")
+            Storage.getSharedInstance().cleanStoredFiles()
+        else:
+            start  = time.monotonic()
+            method = Storage.convertImage(job)
+            if method is None:
+                self.errorCounter.inc()
+            else:
+                self._getLatencyMetric(method).observe(time.monotonic() - start)
+            # Only clean up once the image has its final name
+            self.cleanStoredFiles()
+
+    def _getLatencyMetric(self, method: str):
+        name = "storage.convert.latency.{0}".format(method)
+        metrics = Metrics.getSharedInstance()
+        metric = metrics.getMetric(name)
+        if metric is None:
+            metric = HistogramMetric(self.latencyBuckets)
+            metrics.addMetric(name, metric)
+        return metric
 
 
 class DataRecorder(object):
@@ -155,15 +473,15 @@ class DataRecorder(object):
         # Close currently open file, if any
         self.closeFile()
 
-    def closeFile(self):
+    def closeFile(self, cleanup: bool = True):
         if self.file is not None:
             try:
                 logger.info("Closing file '%s'." % self.file.name)
                 self.file.close()
                 self.file = None
                 # Delete excessive files from storage
-                logger.info("Performing storage cleanup...")
-                Storage.getSharedInstance().cleanStoredFiles()
+                if cleanup:
+                    FileFinalizer.getSharedInstance().cleanStoredFiles()
             except Exception as e:
                 logger.error("Exception closing file: %s" % str(e))
                 self.file = None
@@ -212,16 +530,17 @@ class DataRecorder(object):
                     self.file.seek(0, 2)
                 except Exception as e:
                     logger.debug("Exception updating image height: " + str(e))
-            # Close file
-            self.closeFile()
+            # Close file, storage is cleaned up once the image is done
+            self.closeFile(cleanup = False)
             if newHeight < minHeight:
                 # Delete images that are too short
                 logger.debug("Deleting '%s', shorter than %d lines..." % (filePath, minHeight))
                 os.unlink(filePath)
+                FileFinalizer.getSharedInstance().cleanStoredFiles()
             else:
-                # Convert image from BMP to PNG
-                logger.debug("Converting '%s' to PNG..." % filePath)
-                Storage.convertImage(filePath)
+                # Convert image from BMP to PNG, then clean up
+                logger.debug("Queueing '%s' for PNG conversion..." % filePath)
+                FileFinalizer.getSharedInstance().convertImage(filePath)
 
     def setDialFrequency(self, frequency: int) -> None:
         # Open a new file if frequency changes
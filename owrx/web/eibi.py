@@ -5,6 +5,7 @@ from datetime import datetime
 
 import threading
 import logging
+import bisect
 import re
 import math
 
@@ -100,21 +101,33 @@ class EIBI(WebAgent):
         super().__init__(dataName)
         self.patternCSV = re.compile(r"^([\d\.]+);(\d\d\d\d)-(\d\d\d\d);(\S*);(\S+);(.*);(.*);(.*);(.*);(\d+);(.*);(.*)$")
         self.patternDays = re.compile(r"^(.*)(Mo|Tu|We|Th|Fr|Sa|Su)-(Mo|Tu|We|Th|Fr|Sa|Su)(.*)$")
+        self.index = None
+
+    # Get the index for the current data, rebuilding it if the data or
+    # the receiver location have changed since it was built
+    def _getIndex(self):
+        pm = Config.get()
+        rxPos = (pm["receiver_gps"]["lat"], pm["receiver_gps"]["lon"])
+        index = self.index
+        if index is None or index.data is not self.data or index.rxPos != rxPos:
+            with self.lock:
+                index = self.index
+                # Another thread may have built it in the meantime
+                if index is None or index.data is not self.data or index.rxPos != rxPos:
+                    index = EibiIndex(self.data, rxPos)
+                    self.index = index
+        return index
 
     # Find all current broadcasts for a given source
     def findBySource(self, src: str):
         # Get entries active at the current time
         now = datetime.utcnow()
         now = now.hour * 100 + now.minute
-        result = []
         # Search for entries originating from given source at current time
-        with self.lock:
-            for entry in self.data:
-                if entry["time1"] <= now and entry["time2"] > now:
-                    if entry["src"] == src:
-                        result.append(entry)
-        # Done
-        return result
+        return [
+            entry for entry in self._getIndex().bySource.get(src, [])
+            if entry["time1"] <= now and entry["time2"] > now
+        ]
 
     # Find all current broadcasts for a given frequency range
     def findCurrent(self, freq1: int, freq2: int):
@@ -125,16 +138,11 @@ class EIBI(WebAgent):
 
     # Find all broadcasts for given frequency and time ranges
     def find(self, freq1: int, freq2: int, time1: int, time2: int):
-        result = []
         # Search for entries within given frequency and time ranges
-        with self.lock:
-            for entry in self.data:
-                f = entry["freq"]
-                if f >= freq1 and f <= freq2:
-                    if entry["time1"] <= time2 and entry["time2"] > time1:
-                        result.append(entry)
-        # Done
-        return result
+        return [
+            entry for _, entry in self._getIndex().inFrequencyRange(freq1, freq2)
+            if entry["time1"] <= time2 and entry["time2"] > time1
+        ]
 
     # Create list of currently broadcasting locations
     def currentTransmitters(self, hours: int = 1):
@@ -147,50 +155,44 @@ class EIBI(WebAgent):
         t2   = t1 + hours * 100
         result = {}
         # Search for current entries
-        with self.lock:
-            for entry in self.data:
-                try:
-                    # Check if entry is currently active
-                    entryActive = (
-                        entry["days"][day] != "."
-                    and (entry["date1"] == 0 or entry["date1"] <= date)
-                    and (entry["date2"] == 0 or entry["date2"] >= date)
-                    )
-                    # Check the hours, rolling over to the next day
-                    if entryActive:
-                        e1 = entry["time1"]
-                        e2 = entry["time2"]
-                        e2 = e2 if e2 > e1 else e2 + 2400
-                        entryActive = e1 < t2 and e2 > t1
-                    # For every currently active schedule entry...
-                    if entryActive:
-                        src = entry["src"]
-                        if src not in EIBI_Locations:
-                            # Warn if location not found
-                            # @@@ Too much output here
-                            #logger.debug("Location '{0}' for '{1}' not found!".format(src, entry["name"]))
-                            pass
-                        else:
-                            # Compute TTL for the entry
-                            ttl = ts + (
-                                ((e2 // 100) - (t1 // 100)) * 3600 +
-                                ((e2 % 100)  - (t1 % 100)) * 60
-                            )
-                            # Find all matching transmitter locations
-                            for loc in EIBI_Locations[src]:
-                                name = loc["name"]
-                                if name not in result:
-                                    # Add location to the result
-                                    result[name] = loc.copy()
-                                    result[name]["schedule"] = [ entry ]
-                                    result[name]["ttl"] = ttl
-                                else:
-                                    # Add schedule entry, update TTL
-                                    result[name]["schedule"].append(entry)
-                                    result[name]["ttl"] = max(ttl, result[name]["ttl"]);
+        for entry in self._getIndex().inTimeRange(day, t1, t2):
+            try:
+                # Check if entry is currently active
+                entryActive = (
+                    (entry["date1"] == 0 or entry["date1"] <= date)
+                and (entry["date2"] == 0 or entry["date2"] >= date)
+                )
+                # For every currently active schedule entry...
+                if entryActive:
+                    e2 = entry["time2"]
+                    e2 = e2 if e2 > entry["time1"] else e2 + 2400
+                    src = entry["src"]
+                    if src not in EIBI_Locations:
+                        # Warn if location not found
+                        # @@@ Too much output here
+                        #logger.debug("Location '{0}' for '{1}' not found!".format(src, entry["name"]))
+                        pass
+                    else:
+                        # Compute TTL for the entry
+                        ttl = ts + (
+                            ((e2 // 100) - (t1 // 100)) * 3600 +
+                            ((e2 % 100)  - (t1 % 100)) * 60
+                        )
+                        # Find all matching transmitter locations
+                        for loc in EIBI_Locations[src]:
+                            name = loc["name"]
+                            if name not in result:
+                                # Add location to the result
+                                result[name] = loc.copy()
+                                result[name]["schedule"] = [ entry ]
+                                result[name]["ttl"] = ttl
+                            else:
+                                # Add schedule entry, update TTL
+                                result[name]["schedule"].append(entry)
+                                result[name]["ttl"] = max(ttl, result[name]["ttl"]);
 
-                except Exception as e:
-                    logger.error("currentTransmitters() exception: {0}".format(e))
+            except Exception as e:
+                logger.error("currentTransmitters() exception: {0}".format(e))
 
         # Done
         return result
@@ -211,67 +213,54 @@ class EIBI(WebAgent):
         t1   = now.hour * 100 + now.minute
         t2   = t1 + hours * 100
 
-        # Get receiver location for computing distance
-        pm = Config.get()
-        rxPos = (pm["receiver_gps"]["lat"], pm["receiver_gps"]["lon"])
+        # Distances from the receiver are precomputed in the index
+        index = self._getIndex()
 
         # No result yet
         result = {}
 
         logger.info("Creating bookmarks for {0}-{1}kHz within {2}km...".format(f1//1000, f2//1000, rangeKm))
 
-        # Search for current entries
-        with self.lock:
-            for entry in self.data:
-                try:
-                    # No distance or duration yet
-                    dist = MAX_DISTANCE
-                    duration = 10000
+        # Search for current entries, only looking at the frequency range
+        for position, entry in index.inFrequencyRange(f1, f2):
+            try:
+                # No duration yet
+                duration = 10000
 
-                    # Check if entry active and within frequency range
-                    f = entry["freq"]
-                    entryActive = (
-                        f1 <= f <= f2 and entry["days"][day] != "."
-                    and (entry["date1"] == 0 or entry["date1"] <= date)
-                    and (entry["date2"] == 0 or entry["date2"] >= date)
-                    )
+                # Check if entry active
+                f = entry["freq"]
+                entryActive = (
+                    entry["days"][day] != "."
+                and (entry["date1"] == 0 or entry["date1"] <= date)
+                and (entry["date2"] == 0 or entry["date2"] >= date)
+                )
 
-                    # Check the hours, rolling over to the next day
-                    if entryActive:
-                        e1 = entry["time1"]
-                        e2 = entry["time2"]
-                        e2 = e2 if e2 > e1 else e2 + 2400
-                        entryActive = e1 < t2 and e2 > t1
-                        duration = e2 - e1
+                # Check the hours, rolling over to the next day
+                if entryActive:
+                    e1 = entry["time1"]
+                    e2 = entry["time2"]
+                    e2 = e2 if e2 > e1 else e2 + 2400
+                    entryActive = e1 < t2 and e2 > t1
+                    duration = e2 - e1
 
-                    # Find closest transmitter for this entry
-                    if entryActive:
-                        src = entry["src"]
-                        if src not in EIBI_Locations:
-                            # Warn if location not found
-                            # @@@ Too much output here
-                            #logger.debug("Location '{0}' for '{1}' not found!".format(src, entry["name"]))
-                            pass
-                        else:
-                            # Find closest source
-                            for loc in EIBI_Locations[src]:
-                                txPos = (loc["lat"], loc["lon"])
-                                dist  = min(dist, EIBI.distKm(rxPos, txPos))
-                            # Prefer closer transmitters, apply range
-                            entryActive = ((dist <= rangeKm) and (
-                                (f not in result) or (dist < result[f][1])
-                            ))
+                # Find closest transmitter for this entry
+                if entryActive:
+                    dist = index.distances[position]
+                    if dist is None:
+                        # Location not found
+                        dist = MAX_DISTANCE
+                    else:
+                        # Prefer closer transmitters, apply range
+                        entryActive = ((dist <= rangeKm) and (
+                            (f not in result) or (dist < result[f][1])
+                        ))
 
-                    # Add entry to the result
-                    if entryActive:
-                        #if f in result:
-                        #    logger.debug("Replacing '{0}' ({1}km) with '{2}' ({3}km)".format(
-                        #        result[f][0]["name"], result[f][1], entry["name"], dist
-                        #    ))
-                        result[f] = ( entry, dist, duration )
+                # Add entry to the result
+                if entryActive:
+                    result[f] = ( entry, dist, duration )
 
-                except Exception as e:
-                    logger.error("currentBookmarks() exception: {0}".format(e))
+            except Exception as e:
+                logger.error("currentBookmarks() exception: {0}".format(e))
 
         logger.info("Created {0} bookmarks for {1}-{2}kHz within {3}km.".format(len(result), f1//1000, f2//1000, rangeKm))
 
@@ -428,6 +417,67 @@ class EIBI(WebAgent):
         return result
 
 
+#
+# Lookup structure for the EIBI schedule, built once per data refresh
+# and receiver location. Queries work on the index without locking.
+#
+class EibiIndex(object):
+    def __init__(self, data, rxPos):
+        self.data  = data
+        self.rxPos = rxPos
+        # Distance to the closest transmitter of each entry, None if the
+        # transmitter location is not known
+        srcDistances = {}
+        for src in set(entry["src"] for entry in data):
+            if src in EIBI_Locations:
+                srcDistances[src] = min(
+                    EIBI.distKm(rxPos, (loc["lat"], loc["lon"])) for loc in EIBI_Locations[src]
+                )
+        self.distances = [srcDistances.get(entry["src"]) for entry in data]
+        # Entries sorted by frequency, keeping schedule order for the same
+        # frequency, as (position, entry) pairs
+        self.byFrequency = sorted(enumerate(data), key=lambda e: e[1]["freq"])
+        self.frequencies = [entry["freq"] for _, entry in self.byFrequency]
+        # Entries by source
+        self.bySource = {}
+        for entry in data:
+            self.bySource.setdefault(entry["src"], []).append(entry)
+        # Positions of entries by weekday and hour, with entries running
+        # past midnight also found in the hours 24-47 of their start day
+        self.byDayHour = [[[] for _ in range(48)] for _ in range(7)]
+        for position, entry in enumerate(data):
+            e1 = entry["time1"]
+            e2 = entry["time2"]
+            e2 = e2 if e2 > e1 else e2 + 2400
+            hours = range(e1 // 100, min((e2 - 1) // 100 + 1, 48))
+            for day in range(min(len(entry["days"]), 7)):
+                if entry["days"][day] != ".":
+                    for hour in hours:
+                        self.byDayHour[day][hour].append(position)
+
+    # Entries within the frequency range, as (position, entry) pairs
+    def inFrequencyRange(self, freq1: int, freq2: int):
+        start = bisect.bisect_left(self.frequencies, freq1)
+        end   = bisect.bisect_right(self.frequencies, freq2)
+        return self.byFrequency[start:end]
+
+    # Entries active on the given weekday and overlapping the time range,
+    # rolling over to the next day, in schedule order
+    def inTimeRange(self, day: int, time1: int, time2: int):
+        positions = set()
+        for hour in range(time1 // 100, min((max(time2, time1 + 1) - 1) // 100 + 1, 48)):
+            positions.update(self.byDayHour[day][hour])
+        result = []
+        for position in sorted(positions):
+            entry = self.data[position]
+            e1 = entry["time1"]
+            e2 = entry["time2"]
+            e2 = e2 if e2 > e1 else e2 + 2400
+            if e1 < time2 and e2 > time1:
+                result.append(entry)
+        return result
+
+
 #
 # Normal days of the week
 #
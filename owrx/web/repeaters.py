@@ -6,6 +6,7 @@ from owrx.version import openwebrx_version
 import urllib
 import threading
 import logging
+import bisect
 import json
 import os
 import math
@@ -73,16 +74,15 @@ class Repeaters(WebAgent):
 
     # Compose textual description of an entry
     @staticmethod
-    def getDescription(entry):
+    def getDescription(entry, dist: int = None):
         description = []
         # Add information from the entry to the description
         if "status" in entry:
-            pm = Config.get()
-            rxPos = (pm["receiver_gps"]["lat"], pm["receiver_gps"]["lon"])
-            description += ["{0}, {1}km away.".format(
-                entry["status"],
-                Repeaters.distKm(rxPos, (entry["lat"], entry["lon"]))
-            )]
+            if dist is None:
+                pm = Config.get()
+                rxPos = (pm["receiver_gps"]["lat"], pm["receiver_gps"]["lon"])
+                dist = Repeaters.distKm(rxPos, (entry["lat"], entry["lon"]))
+            description += ["{0}, {1}km away.".format(entry["status"], dist)]
         if "updated" in entry:
             description += ["Last updated " + entry["updated"] + "."]
         if "comment" in entry:
@@ -95,8 +95,24 @@ class Repeaters(WebAgent):
         # Update repeater list when receiver location changes
         pm = Config.get()
         self.location = (pm["receiver_gps"]["lat"], pm["receiver_gps"]["lon"])
+        self.index = None
         pm.wireProperty("receiver_gps", self._updateLocation)
 
+    # Get the index for the current data, rebuilding it if the data or
+    # the receiver location have changed since it was built
+    def _getIndex(self):
+        pm = Config.get()
+        rxPos = (pm["receiver_gps"]["lat"], pm["receiver_gps"]["lon"])
+        index = self.index
+        if index is None or index.data is not self.data or index.rxPos != rxPos:
+            with self.lock:
+                index = self.index
+                # Another thread may have built it in the meantime
+                if index is None or index.data is not self.data or index.rxPos != rxPos:
+                    index = RepeaterIndex(self.data, rxPos)
+                    self.index = index
+        return index
+
     # Delete current repeater list when receiver location changes.
     def _updateLocation(self, location):
         location = (location["lat"], location["lon"])
@@ -176,26 +192,17 @@ class Repeaters(WebAgent):
             f1 = f2
             f2 = f
 
-        # Get receiver location for computing distance
-        pm = Config.get()
-        rxPos = (pm["receiver_gps"]["lat"], pm["receiver_gps"]["lon"])
+        # Distances from the receiver are precomputed in the index
+        index = self._getIndex()
 
         # No result yet
         logger.info("Creating bookmarks for {0}-{1}kHz within {2}km...".format(f1//1000, f2//1000, rangeKm))
         result = {}
 
         # Search for repeaters within frequency and distance ranges
-        with self.lock:
-            for entry in self.data:
-                try:
-                    f = entry["freq"]
-                    if f1 <= f <= f2:
-                        d = self.distKm(rxPos, (entry["lat"], entry["lon"]))
-                        if d <= rangeKm and (f not in result or d < result[f][1]):
-                            result[f] = (entry, d)
-
-                except Exception as e:
-                    logger.error("getBookmarks() exception: {0}".format(e))
+        for entry, d in index.inFrequencyRange(f1, f2):
+            if d <= rangeKm and (entry["freq"] not in result or d < result[entry["freq"]][1]):
+                result[entry["freq"]] = (entry, d)
 
         # Return bookmarks for all found entries
         logger.info("Created {0} bookmarks for {1}-{2}kHz within {3}km.".format(len(result), f1//1000, f2//1000, rangeKm))
@@ -203,7 +210,7 @@ class Repeaters(WebAgent):
             "name"        : result[f][0]["name"],
             "modulation"  : result[f][0]["mode"],
             "frequency"   : result[f][0]["freq"],
-            "description" : Repeaters.getDescription(result[f][0])
+            "description" : Repeaters.getDescription(result[f][0], result[f][1])
         }, srcFile = "RepeaterBook") for f in result.keys() ]
 
     #
@@ -211,25 +218,50 @@ class Repeaters(WebAgent):
     # range from the receiver.
     #
     def getAllInRange(self, rangeKm: int = MAX_DISTANCE):
-        # Get receiver location for computing distance
-        pm = Config.get()
-        rxPos = (pm["receiver_gps"]["lat"], pm["receiver_gps"]["lon"])
-
         # No result yet
         logger.info("Looking for repeaters within {0}km...".format(rangeKm))
-        result = []
 
         # Search for repeaters within given distance range
-        with self.lock:
-            for entry in self.data:
-                try:
-                    if self.distKm(rxPos, (entry["lat"], entry["lon"])) <= rangeKm:
-                        result += [entry]
-
-                except Exception as e:
-                    logger.error("getAllInRange() exception: {0}".format(e))
+        result = self._getIndex().inDistanceRange(rangeKm)
 
         # Done
         logger.info("Found {0} repeaters within {1}km.".format(len(result), rangeKm))
         return result
 
+
+#
+# Lookup structure for the repeater list, built once per data refresh
+# and receiver location. Queries work on the index without locking.
+#
+class RepeaterIndex(object):
+    def __init__(self, data, rxPos):
+        self.data  = data
+        self.rxPos = rxPos
+        # (position, entry, distance) for all entries with valid locations
+        entries = []
+        for position, entry in enumerate(data):
+            try:
+                dist = Repeaters.distKm(rxPos, (entry["lat"], entry["lon"]))
+                # Make sure the entry can be sorted by frequency
+                int(entry["freq"])
+                entries.append((position, entry, dist))
+            except Exception as e:
+                logger.error("RepeaterIndex() exception: {0}".format(e))
+        # Entries sorted by frequency, keeping data order for the same
+        # frequency
+        self.byFrequency = sorted(entries, key=lambda e: e[1]["freq"])
+        self.frequencies = [e[1]["freq"] for e in self.byFrequency]
+        # Entries sorted by distance
+        self.byDistance = sorted(entries, key=lambda e: e[2])
+        self.distances = [e[2] for e in self.byDistance]
+
+    # Entries within the frequency range, as (entry, distance) pairs
+    def inFrequencyRange(self, freq1: int, freq2: int):
+        start = bisect.bisect_left(self.frequencies, freq1)
+        end   = bisect.bisect_right(self.frequencies, freq2)
+        return [(e[1], e[2]) for e in self.byFrequency[start:end]]
+
+    # Entries within the distance from the receiver, in data order
+    def inDistanceRange(self, rangeKm: int):
+        end = bisect.bisect_right(self.distances, rangeKm)
+        return [e[1] for e in sorted(self.byDistance[:end], key=lambda e: e[0])]
@@ -3,22 +3,46 @@ import base64
 import hashlib
 import json
 from multiprocessing import Pipe
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import asyncio
+import heapq
+import itertools
 import select
+import socket
 import threading
+import time
 from abc import ABC, abstractmethod
 from datetime import datetime
-from ssl import SSLWantReadError
+from ssl import SSLWantReadError, SSLWantWriteError, SSLSocket
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+OPCODE_CONTINUATION = 0x00
 OPCODE_TEXT_MESSAGE = 0x01
 OPCODE_BINARY_MESSAGE = 0x02
 OPCODE_CLOSE = 0x08
 OPCODE_PING = 0x09
 OPCODE_PONG = 0x0A
 
+# seconds a socket may stay unwritable before the connection is considered dead
+SEND_TIMEOUT = 10
+# seconds of inactivity after which a ping is sent
+PING_INTERVAL = 30
+# seconds to wait for any data after a ping before the peer is considered dead
+PING_TIMEOUT = 30
+# seconds to wait for the remainder of a partially received frame
+READ_TIMEOUT = 10
+# largest message (after reassembly of fragments) accepted from clients
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
 
 class WebSocketException(IOError):
     pass
@@ -32,6 +56,226 @@ class Drained(WebSocketException):
     pass
 
 
+class MessageTooBig(WebSocketException):
+    pass
+
+
+class SendTimeout(WebSocketException):
+    pass
+
+
+def unmask(data: bytes, masking_key: bytes) -> bytes:
+    """
+    Apply a websocket masking key to a payload.
+    Works on the whole payload at once, either through numpy (if available) or through python's big integers.
+    """
+    length = len(data)
+    if length == 0:
+        return b""
+    if numpy is not None and length >= 256:
+        key = numpy.resize(numpy.frombuffer(masking_key, dtype=numpy.uint8), length)
+        return numpy.bitwise_xor(numpy.frombuffer(data, dtype=numpy.uint8), key).tobytes()
+    key = (masking_key * ((length + 3) // 4))[:length]
+    return (int.from_bytes(data, "little") ^ int.from_bytes(key, "little")).to_bytes(length, "little")
+
+
+class VectoredWriter(object):
+    """
+    Outgoing ring for a single websocket connection.
+
+    Frames are appended to the ring and written with as few sendmsg() calls as possible, each one carrying multiple
+    complete frames. Only one thread writes to the socket at a time; threads that find the writer busy just leave
+    their frame in the ring, and the writing thread picks it up before it lets go.
+    Connections running on the event loop use append() and writeAvailable() instead, which never block.
+    """
+
+    # maximum number of buffers passed to a single sendmsg() call
+    maxBuffers = 64
+    # once this many bytes are waiting, droppable frames are discarded (oldest first)
+    maxQueuedBytes = 1024 * 1024
+
+    def __init__(self, sock, timeout: float = SEND_TIMEOUT):
+        self.sock = sock
+        self.timeout = timeout
+        # entries are [memoryview, droppable]
+        self.ring = deque()
+        # number of ring entries currently handed to sendmsg(); these must not be dropped
+        self.inFlight = 0
+        self.ringLock = threading.Lock()
+        self.writeLock = threading.Lock()
+        self.bytesQueued = 0
+        self.bytesSent = 0
+        self.framesSent = 0
+        self.framesDropped = 0
+        self.timeBlocked = 0.0
+        self.lastProgress = time.monotonic()
+
+    def write(self, data, droppable: bool = False, wait: bool = False):
+        """
+        Queue a frame and flush the ring.
+        If another thread is currently writing, this returns immediately unless wait is set.
+        """
+        self.append(data, droppable)
+        self.flush(wait)
+
+    def append(self, data, droppable: bool = False):
+        view = memoryview(data)
+        with self.ringLock:
+            self.ring.append([view, droppable])
+            self.bytesQueued += len(view)
+            if self.bytesQueued > self.maxQueuedBytes:
+                self._dropFrames()
+
+    def _dropFrames(self):
+        # must be called with ringLock held
+        index = self.inFlight
+        while self.bytesQueued > self.maxQueuedBytes and index < len(self.ring):
+            view, droppable = self.ring[index]
+            if droppable:
+                del self.ring[index]
+                self.bytesQueued -= len(view)
+                self.framesDropped += 1
+            else:
+                index += 1
+
+    def flush(self, wait: bool = False):
+        while True:
+            if not self.writeLock.acquire(blocking=wait):
+                # another thread is writing and will send our data as well
+                return
+            try:
+                self._writeAll()
+            finally:
+                self.writeLock.release()
+            # data may have been added after the last write, but before the lock was released
+            with self.ringLock:
+                if not self.ring:
+                    return
+
+    def _writeAll(self):
+        while not self.writeAvailable():
+            self._waitWritable()
+
+    def writeAvailable(self) -> bool:
+        """
+        Write as much as the socket accepts without blocking.
+        Returns True once the ring has been emptied.
+        """
+        while True:
+            with self.ringLock:
+                if not self.ring:
+                    return True
+                self.inFlight = min(len(self.ring), self.maxBuffers)
+                buffers = [self.ring[i][0] for i in range(self.inFlight)]
+            try:
+                sent = self._send(buffers)
+            except (BlockingIOError, InterruptedError, SSLWantWriteError):
+                sent = 0
+            except Exception:
+                with self.ringLock:
+                    self.inFlight = 0
+                raise
+            # the entries stay pinned until the sent bytes have been consumed, so append() cannot drop them
+            self._consume(sent)
+            if not sent:
+                return False
+
+    def _send(self, buffers) -> int:
+        # SSL sockets do not implement sendmsg(), so they get one buffer at a time
+        if isinstance(self.sock, SSLSocket):
+            return self.sock.send(buffers[0])
+        return self.sock.sendmsg(buffers)
+
+    def _consume(self, sent: int):
+        if sent:
+            self.lastProgress = time.monotonic()
+        with self.ringLock:
+            self.inFlight = 0
+            self.bytesQueued -= sent
+            self.bytesSent += sent
+            while sent:
+                view = self.ring[0][0]
+                if sent >= len(view):
+                    self.ring.popleft()
+                    self.framesSent += 1
+                    sent -= len(view)
+                else:
+                    # partially sent frames must be completed, so they are no longer droppable
+                    self.ring[0] = [view[sent:], False]
+                    sent = 0
+
+    def _waitWritable(self):
+        start = time.monotonic()
+        (_, write, _) = select.select([], [self.sock], [], self.timeout)
+        self.timeBlocked += time.monotonic() - start
+        if self.sock not in write:
+            raise SendTimeout("socket not writable for {0} seconds".format(self.timeout))
+
+    def getStats(self):
+        return {
+            "bytes_queued": self.bytesQueued,
+            "bytes_sent": self.bytesSent,
+            "frames_sent": self.framesSent,
+            "frames_dropped": self.framesDropped,
+            "time_blocked": self.timeBlocked,
+        }
+
+
+class PingScheduler(object):
+    """
+    Single timer thread scheduling keepalive pings for all threaded websocket connections.
+
+    Connections only record the time of their last activity. The scheduler keeps a heap of the times when each
+    connection needs to be checked next, and handles all connections that are due in one go. It never writes to a
+    socket itself: the pings are sent by the threads of the connections, so a stalled peer cannot hold up the others.
+    """
+    sharedInstance = None
+    creationLock = threading.Lock()
+
+    @staticmethod
+    def getSharedInstance():
+        with PingScheduler.creationLock:
+            if PingScheduler.sharedInstance is None:
+                PingScheduler.sharedInstance = PingScheduler()
+        return PingScheduler.sharedInstance
+
+    def __init__(self):
+        self.heap = []
+        # tie-breaker for connections due at the same time
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def add(self, connection, due: float = None):
+        if due is None:
+            due = connection.lastActivity + PING_INTERVAL
+        with self.condition:
+            heapq.heappush(self.heap, (due, next(self.counter), connection))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="websocket_ping", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    due.append(heapq.heappop(self.heap)[2])
+                if not due:
+                    self.condition.wait(self.heap[0][0] - now if self.heap else None)
+                    continue
+            for connection in due:
+                try:
+                    next_due = connection.keepalive(now)
+                except Exception:
+                    logger.exception("exception while sending keepalive")
+                    next_due = None
+                if next_due is not None:
+                    self.add(connection, next_due)
+
+
 class Handler(ABC):
     @abstractmethod
     def handleTextMessage(self, connection, message: str):
@@ -48,6 +292,39 @@ class Handler(ABC):
 
 class WebSocketConnection(object):
     connections = []
+    # "threaded" runs a read loop thread per connection, "asyncio" serves all connections from WebSocketLoop
+    ioMode = "threaded"
+    # "vectored" uses VectoredWriter where the socket supports it, "select" always uses the chunked select() writer
+    writerMode = "vectored"
+
+    @staticmethod
+    def setWriterMode(mode: str):
+        if mode not in ["vectored", "select"]:
+            raise ValueError("invalid websocket writer mode: {0}".format(mode))
+        WebSocketConnection.writerMode = mode
+
+    @staticmethod
+    def setIoMode(mode: str):
+        if mode not in ["threaded", "asyncio"]:
+            raise ValueError("invalid websocket io mode: {0}".format(mode))
+        WebSocketConnection.ioMode = mode
+
+    @staticmethod
+    def create(handler, messageHandler: Handler):
+        if WebSocketConnection.ioMode == "asyncio":
+            return AsyncWebSocketConnection(handler, messageHandler)
+        return WebSocketConnection(handler, messageHandler)
+
+    @staticmethod
+    def getWriterStats():
+        stats = {"connections": 0, "bytes_queued": 0, "bytes_sent": 0, "frames_sent": 0, "frames_dropped": 0, "time_blocked": 0.0}
+        for c in WebSocketConnection.connections:
+            if c.writer is None:
+                continue
+            stats["connections"] += 1
+            for k, v in c.writer.getStats().items():
+                stats[k] += v
+        return stats
 
     @staticmethod
     def closeAll():
@@ -63,10 +340,11 @@ class WebSocketConnection(object):
         self.handler.connection.setblocking(0)
         self.messageHandler = None
         self.setMessageHandler(messageHandler)
-        (self.interruptPipeRecv, self.interruptPipeSend) = Pipe(duplex=False)
+        (self.interruptPipeRecv, self.interruptPipeSend) = self._createInterruptPipe()
         self.open = True
         self.socketError = False
         self.sendLock = threading.Lock()
+        self.writer = None
 
         headers = {key.lower(): value for key, value in self.handler.headers.items()}
         if "upgrade" not in headers:
@@ -85,13 +363,29 @@ class WebSocketConnection(object):
                 ws_key_toreturn.decode()
             ).encode()
         )
-        self.pingTimer = None
-        self.resetPing()
+        # sendmsg() is not available on SSL sockets, those have to use the select() writer
+        if WebSocketConnection.writerMode == "vectored" and not isinstance(self.handler.connection, SSLSocket):
+            self.writer = VectoredWriter(self.handler.connection)
+        self.lastActivity = time.monotonic()
+        self.pingSent = None
+        self.pingRequested = False
+        self.rtt = None
+        self.startKeepalive()
+
+    def _createInterruptPipe(self):
+        return Pipe(duplex=False)
 
     def setMessageHandler(self, messageHandler: Handler):
         self.messageHandler = messageHandler
 
-    def get_header(self, size, opcode):
+    def sendsNonBlocking(self) -> bool:
+        """
+        True if send() only queues data and never blocks the calling thread.
+        """
+        return False
+
+    @staticmethod
+    def get_header(size, opcode):
         ws_first_byte = 0b10000000 | (opcode & 0x0F)
         if size > 2 ** 16 - 1:
             # frame size can be increased up to 2^64 by setting the size to 127
@@ -117,7 +411,12 @@ class WebSocketConnection(object):
             # 125 bytes binary message in a single unmasked frame
             return bytes([ws_first_byte, size])
 
-    def send(self, data):
+    @staticmethod
+    def encodeFrame(data) -> bytes:
+        """
+        Build a complete websocket frame (header + payload) for the given message.
+        The result is immutable and can be handed to any number of connections via sendFrame().
+        """
         # convenience
         if type(data) == dict:
             # allow_nan = False disallows NaN and Infinty to be encoded. Browser JSON will not parse them anyway.
@@ -125,16 +424,45 @@ class WebSocketConnection(object):
 
         # string-type messages are sent as text frames
         if type(data) == str:
-            header = self.get_header(len(data), OPCODE_TEXT_MESSAGE)
-            data_to_send = header + data.encode("utf-8")
+            data = data.encode("utf-8")
+            header = WebSocketConnection.get_header(len(data), OPCODE_TEXT_MESSAGE)
         # anything else as binary
         else:
-            header = self.get_header(len(data), OPCODE_BINARY_MESSAGE)
-            data_to_send = header + data
+            header = WebSocketConnection.get_header(len(data), OPCODE_BINARY_MESSAGE)
 
-        self._sendBytes(data_to_send)
+        return header + data
+
+    def send(self, data):
+        self._sendBytes(self.encodeFrame(data))
 
-    def _sendBytes(self, data_to_send):
+    def sendFrame(self, frame: bytes, droppable: bool = True):
+        # frame has already been encoded by encodeFrame(), possibly shared between connections
+        self._sendBytes(frame, droppable=droppable)
+
+    def _sendBytes(self, data_to_send, droppable: bool = False, wait: bool = False):
+        if self.writer is not None:
+            self._sendVectored(data_to_send, droppable, wait)
+        else:
+            self._sendChunked(data_to_send)
+
+    def _sendVectored(self, data_to_send, droppable: bool = False, wait: bool = False):
+        if self.socketError:
+            logger.warning("_sendBytes() after socket error, ignoring")
+            return
+        try:
+            self.writer.write(data_to_send, droppable=droppable, wait=wait)
+        except SendTimeout:
+            logger.debug("socket not writable before timeout; closing")
+            self.close(socketError=True)
+        # these exception happen when the socket is closed
+        except OSError:
+            logger.exception("OSError while writing data")
+            self.close(socketError=True)
+        except ValueError:
+            logger.exception("ValueError while writing data")
+            self.close(socketError=True)
+
+    def _sendChunked(self, data_to_send):
         def chunks(input, n):
             """Yield successive n-sized chunks from input."""
             for i in range(0, len(input), n):
@@ -146,7 +474,7 @@ class WebSocketConnection(object):
             else:
                 try:
                     for chunk in chunks(data_to_send, 1024):
-                        (_, write, _) = select.select([], [self.handler.wfile], [], 10)
+                        (_, write, _) = select.select([], [self.handler.wfile], [], SEND_TIMEOUT)
                         if self.handler.wfile in write:
                             written = self.handler.wfile.write(chunk)
                             if written != len(chunk):
@@ -166,10 +494,15 @@ class WebSocketConnection(object):
                     self.close(socketError=True)
 
     def interrupt(self):
-        if self.interruptPipeSend is None:
+        pipe = self.interruptPipeSend
+        if pipe is None:
             logger.debug("interrupt with closed pipe")
             return
-        self.interruptPipeSend.send(bytes(0x00))
+        try:
+            pipe.send(bytes(0x00))
+        except OSError:
+            # read_loop() has ended and closed the pipe in the meantime
+            logger.debug("interrupt with closed pipe")
 
     def handle(self):
         WebSocketConnection.connections.append(self)
@@ -187,7 +520,8 @@ class WebSocketConnection(object):
                 logger.debug("websocket loop ended; sending close frame")
 
                 header = self.get_header(0, OPCODE_CLOSE)
-                self._sendBytes(header)
+                # the socket gets closed once we return, so make sure the close frame is actually out
+                self._sendBytes(header, wait=True)
 
             try:
                 WebSocketConnection.connections.remove(self)
@@ -195,60 +529,105 @@ class WebSocketConnection(object):
                 pass
 
     def read_loop(self):
-        def protected_read(num):
-            data = self.handler.rfile.read(num)
+        def protected_read(num, drain=False):
+            if num == 0:
+                return b""
+            try:
+                data = self.handler.rfile.read(num)
+            except SSLWantReadError:
+                data = None
             if data is None:
-                raise Drained()
-            if len(data) != num:
+                # only a read at a frame boundary may end the loop, frames must not be torn apart
+                if drain:
+                    raise Drained()
+                data = b""
+            elif len(data) == 0:
                 raise IncompleteRead()
-            return data
+            if len(data) == num:
+                return data
+            # wait for the rest of the frame to arrive
+            buffer = bytearray(data)
+            while len(buffer) < num:
+                (read, _, _) = select.select([self.handler.rfile], [], [], READ_TIMEOUT)
+                if self.handler.rfile not in read:
+                    raise IncompleteRead()
+                try:
+                    chunk = self.handler.rfile.read(num - len(buffer))
+                except SSLWantReadError:
+                    continue
+                if chunk is None:
+                    continue
+                if len(chunk) == 0:
+                    raise IncompleteRead()
+                buffer += chunk
+            return bytes(buffer)
+
+        # opcode and payload parts of a fragmented message
+        fragmentOpcode = None
+        fragments = []
+        fragmentsLength = 0
 
         self.open = True
         while self.open:
             (read, _, _) = select.select([self.interruptPipeRecv, self.handler.rfile], [], [], 15)
+            if self.interruptPipeRecv in read:
+                self.interruptPipeRecv.recv()
+                if self.pingRequested:
+                    self.pingRequested = False
+                    self.sendPing()
             if self.handler.rfile in read:
                 available = True
                 self.resetPing()
                 while self.open and available:
                     try:
-                        header = protected_read(2)
+                        header = protected_read(2, drain=True)
+                        fin = header[0] & 0x80
                         opcode = header[0] & 0x0F
                         length = header[1] & 0x7F
                         mask = (header[1] & 0x80) >> 7
                         if length == 126:
-                            header = protected_read(2)
-                            length = (header[0] << 8) + header[1]
+                            length = int.from_bytes(protected_read(2), "big")
+                        elif length == 127:
+                            length = int.from_bytes(protected_read(8), "big")
+                        if length > MAX_MESSAGE_SIZE:
+                            raise MessageTooBig()
                         if mask:
                             masking_key = protected_read(4)
-                            data = protected_read(length)
-                            data = bytes([b ^ masking_key[index % 4] for (index, b) in enumerate(data)])
+                            data = unmask(protected_read(length), masking_key)
                         else:
                             data = protected_read(length)
-                        if opcode == OPCODE_TEXT_MESSAGE:
-                            message = data.decode("utf-8")
-                            try:
-                                self.messageHandler.handleTextMessage(self, message)
-                            except Exception:
-                                logger.exception("Exception in websocket handler handleTextMessage()")
-                        elif opcode == OPCODE_BINARY_MESSAGE:
-                            try:
-                                self.messageHandler.handleBinaryMessage(self, data)
-                            except Exception:
-                                logger.exception("Exception in websocket handler handleBinaryMessage()")
-                        elif opcode == OPCODE_PING:
-                            self.sendPong()
-                        elif opcode == OPCODE_PONG:
-                            # since every read resets the ping timer, there's nothing to do here.
-                            pass
-                        elif opcode == OPCODE_CLOSE:
-                            logger.debug("websocket close frame received; closing connection")
-                            self.open = False
-                        else:
-                            logger.warning("unsupported opcode: {0}".format(opcode))
+
+                        if opcode == OPCODE_CONTINUATION:
+                            if fragmentOpcode is None:
+                                logger.warning("continuation frame without initial frame; discarding")
+                                continue
+                            fragmentsLength += length
+                            if fragmentsLength > MAX_MESSAGE_SIZE:
+                                raise MessageTooBig()
+                            fragments.append(data)
+                            if not fin:
+                                continue
+                            opcode = fragmentOpcode
+                            data = b"".join(fragments)
+                            fragmentOpcode = None
+                            fragments = []
+                            fragmentsLength = 0
+                        elif not fin and opcode in [OPCODE_TEXT_MESSAGE, OPCODE_BINARY_MESSAGE]:
+                            # first frame of a fragmented message
+                            fragmentOpcode = opcode
+                            fragments = [data]
+                            fragmentsLength = length
+                            continue
+
+                        self._handleFrame(opcode, data)
                     except Drained:
                         available = False
                     except SSLWantReadError:
                         available = False
+                    except MessageTooBig:
+                        logger.warning("websocket message exceeds size limit; closing connection")
+                        self.socketError = True
+                        self.open = False
                     except IncompleteRead:
                         logger.warning("incomplete read on websocket; closing connection")
                         self.socketError = True
@@ -270,6 +649,30 @@ class WebSocketConnection(object):
         self.interruptPipeRecv.close()
         self.interruptPipeRecv = None
 
+    def _handleFrame(self, opcode, data):
+        if opcode == OPCODE_TEXT_MESSAGE:
+            message = data.decode("utf-8")
+            try:
+                self.messageHandler.handleTextMessage(self, message)
+            except Exception:
+                logger.exception("Exception in websocket handler handleTextMessage()")
+        elif opcode == OPCODE_BINARY_MESSAGE:
+            try:
+                self.messageHandler.handleBinaryMessage(self, data)
+            except Exception:
+                logger.exception("Exception in websocket handler handleBinaryMessage()")
+        elif opcode == OPCODE_PING:
+            self.sendPong()
+        elif opcode == OPCODE_PONG:
+            # every read resets the ping timer, so the only thing left to do is measure the round trip time
+            if self.pingSent is not None:
+                self.rtt = time.monotonic() - self.pingSent
+        elif opcode == OPCODE_CLOSE:
+            logger.debug("websocket close frame received; closing connection")
+            self.open = False
+        else:
+            logger.warning("unsupported opcode: {0}".format(opcode))
+
     def close(self, socketError: bool = False):
         # only set flag if it is True
         if socketError:
@@ -279,25 +682,441 @@ class WebSocketConnection(object):
         self.open = False
         self.interrupt()
 
+    def startKeepalive(self):
+        PingScheduler.getSharedInstance().add(self)
+
     def cancelPing(self):
-        if self.pingTimer:
-            old = self.pingTimer
-            self.pingTimer = None
-            old.cancel()
+        # the scheduler drops connections that are no longer open
+        pass
 
     def resetPing(self):
-        self.cancelPing()
+        # called for every read, so this only records a timestamp; pings are sent by the PingScheduler
+        self.lastActivity = time.monotonic()
+
+    def keepalive(self, now: float):
+        """
+        Send a ping if the connection has been idle, or close it if a ping has not been answered in time.
+        Returns the time when the connection needs to be checked again, or None if it is no longer open.
+        """
         if not self.open:
-            logger.debug("resetPing() while closed. passing...")
-            return
-        self.pingTimer = threading.Timer(30, self.sendPing)
-        self.pingTimer.start()
+            return None
+        if self.pingSent is not None and self.lastActivity < self.pingSent:
+            if now - self.pingSent >= PING_TIMEOUT:
+                logger.debug("no response to ping within %i seconds; closing", PING_TIMEOUT)
+                self.close(socketError=True)
+                return None
+            return self.pingSent + PING_TIMEOUT
+        if now - self.lastActivity >= PING_INTERVAL:
+            self.pingSent = now
+            self.requestPing()
+            return now + PING_TIMEOUT
+        return self.lastActivity + PING_INTERVAL
+
+    def getRtt(self):
+        """
+        Round trip time of the last ping in seconds, None if no ping has been answered yet.
+        """
+        return self.rtt
+
+    def requestPing(self):
+        # called by the PingScheduler, which must not block on the socket; read_loop() sends the ping
+        self.pingRequested = True
+        self.interrupt()
 
     def sendPing(self):
+        self.pingSent = time.monotonic()
         header = self.get_header(0, OPCODE_PING)
         self._sendBytes(header)
-        self.resetPing()
 
     def sendPong(self):
         header = self.get_header(0, OPCODE_PONG)
         self._sendBytes(header)
+
+
+class FrameParser(object):
+    """
+    Incremental websocket frame parser for connections that receive data in arbitrary chunks.
+    Fragmented messages are reassembled, control frames are passed through as they arrive.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.fragmentOpcode = None
+        self.fragments = []
+        self.fragmentsLength = 0
+
+    def feed(self, data: bytes):
+        """
+        Add received data, returns a list of complete (opcode, payload) messages.
+        """
+        self.buffer += data
+        messages = []
+        offset = 0
+        while len(self.buffer) - offset >= 2:
+            fin = self.buffer[offset] & 0x80
+            opcode = self.buffer[offset] & 0x0F
+            length = self.buffer[offset + 1] & 0x7F
+            mask = self.buffer[offset + 1] & 0x80
+            pos = offset + 2
+            if length == 126:
+                if len(self.buffer) < pos + 2:
+                    break
+                length = int.from_bytes(self.buffer[pos:pos + 2], "big")
+                pos += 2
+            elif length == 127:
+                if len(self.buffer) < pos + 8:
+                    break
+                length = int.from_bytes(self.buffer[pos:pos + 8], "big")
+                pos += 8
+            if length > MAX_MESSAGE_SIZE:
+                raise MessageTooBig()
+            if mask:
+                masking_key = bytes(self.buffer[pos:pos + 4])
+                pos += 4
+            if len(self.buffer) < pos + length:
+                break
+            data = bytes(self.buffer[pos:pos + length])
+            if mask:
+                data = unmask(data, masking_key)
+            offset = pos + length
+            message = self._reassemble(fin, opcode, data)
+            if message is not None:
+                messages.append(message)
+        del self.buffer[:offset]
+        return messages
+
+    def _reassemble(self, fin, opcode, data):
+        if opcode == OPCODE_CONTINUATION:
+            if self.fragmentOpcode is None:
+                logger.warning("continuation frame without initial frame; discarding")
+                return None
+            self.fragmentsLength += len(data)
+            if self.fragmentsLength > MAX_MESSAGE_SIZE:
+                raise MessageTooBig()
+            self.fragments.append(data)
+            if not fin:
+                return None
+            message = (self.fragmentOpcode, b"".join(self.fragments))
+            self.fragmentOpcode = None
+            self.fragments = []
+            self.fragmentsLength = 0
+            return message
+        elif not fin and opcode in [OPCODE_TEXT_MESSAGE, OPCODE_BINARY_MESSAGE]:
+            self.fragmentOpcode = opcode
+            self.fragments = [data]
+            self.fragmentsLength = len(data)
+            return None
+        return (opcode, data)
+
+
+class WebSocketLoop(object):
+    """
+    Event loop serving reads, writes and pings of all websocket connections in "asyncio" mode.
+    Message handlers may block (e.g. when starting an SDR), so they run on a small shared thread pool, but the
+    messages of each connection are still handled one at a time and in order.
+    """
+    sharedInstance = None
+    creationLock = threading.Lock()
+    # seconds to wait for the connections to send their close frames on shutdown
+    stopTimeout = 5
+
+    @staticmethod
+    def getSharedInstance():
+        with WebSocketLoop.creationLock:
+            if WebSocketLoop.sharedInstance is None:
+                WebSocketLoop.sharedInstance = WebSocketLoop()
+        return WebSocketLoop.sharedInstance
+
+    @staticmethod
+    def stopAll():
+        with WebSocketLoop.creationLock:
+            if WebSocketLoop.sharedInstance is not None:
+                WebSocketLoop.sharedInstance.stop()
+                WebSocketLoop.sharedInstance = None
+
+    def __init__(self, handlerThreads: int = 4):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=handlerThreads, thread_name_prefix="websocket_handler")
+        # connections that have not finished yet, and futures waiting for them. only used on the loop thread.
+        self.connections = set()
+        self.drainWaiters = []
+        self.thread = threading.Thread(target=self._run, name="websocket_loop", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def isLoopThread(self) -> bool:
+        return threading.current_thread() is self.thread
+
+    def call(self, callback, *args):
+        """
+        Run callback on the event loop. Can be used from any thread.
+        """
+        if self.isLoopThread():
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def submit(self, callback, *args):
+        return self.executor.submit(callback, *args)
+
+    def addConnection(self, connection):
+        self.connections.add(connection)
+
+    def removeConnection(self, connection):
+        self.connections.discard(connection)
+        if not self.connections:
+            for waiter in self.drainWaiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+            self.drainWaiters = []
+
+    async def _drain(self):
+        if self.connections:
+            waiter = self.loop.create_future()
+            self.drainWaiters.append(waiter)
+            await waiter
+
+    def stop(self):
+        # let closing connections finish (handleClose() on the executor, then the close frame on the loop) first
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(), self.loop).result(self.stopTimeout)
+        except FutureTimeoutError:
+            logger.warning("websocket connections did not close within %i seconds", self.stopTimeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+
+
+# marker in the inbox of an AsyncWebSocketConnection, the message handler is closed when it is processed
+HandlerClose = object()
+
+
+class AsyncWebSocketConnection(WebSocketConnection):
+    """
+    Websocket connection served by the WebSocketLoop.
+
+    The handshake happens on the HTTP request thread as usual. After that, the socket is detached from the HTTP
+    server and the request thread is released; reads, pings and outgoing data are handled on the event loop.
+    send() can be used from any thread (DSP pumps, timers, ...) and only queues data on the connection's
+    VectoredWriter, which is then flushed from the loop via call_soon_threadsafe().
+    """
+    def __init__(self, handler, messageHandler: Handler):
+        self.wsLoop = WebSocketLoop.getSharedInstance()
+        self.sock = handler.connection
+        self.parser = FrameParser()
+        self.lastActivity = time.monotonic()
+        self.pingHandle = None
+        self.flushScheduled = False
+        self.flushLock = threading.Lock()
+        self.writerRegistered = False
+        self.timeoutHandle = None
+        self.inbox = deque()
+        self.inboxLock = threading.Lock()
+        self.dispatching = False
+        self.closed = False
+        super().__init__(handler, messageHandler)
+        # unlike the threaded writer, this one works on SSL sockets as well
+        self.writer = VectoredWriter(self.sock)
+
+    def _createInterruptPipe(self):
+        # the event loop is woken up through call_soon_threadsafe(), no pipe required
+        return None, None
+
+    def sendsNonBlocking(self) -> bool:
+        return True
+
+    def handle(self):
+        # data that was received together with the upgrade request is still in the request handler's buffer
+        try:
+            pending = self.handler.rfile.read1(65536) or b""
+        except (BlockingIOError, SSLWantReadError, ValueError):
+            pending = b""
+        WebSocketConnection.connections.append(self)
+        self.handler.detach()
+        self.wsLoop.call(self._register, pending)
+
+    def _register(self, pending: bytes):
+        self.wsLoop.addConnection(self)
+        if self.closed:
+            return
+        self.wsLoop.loop.add_reader(self.sock, self._onReadable)
+        self._checkPing()
+        if pending:
+            self._process(pending)
+        # data may have been queued before the connection was registered
+        self._flush()
+
+    def _onReadable(self):
+        while not self.closed:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError, SSLWantReadError, SSLWantWriteError):
+                return
+            except OSError:
+                logger.exception("OSError while reading data; closing connection")
+                self.close(socketError=True)
+                return
+            if not data:
+                logger.debug("websocket peer closed the connection")
+                self.close(socketError=True)
+                return
+            self.resetPing()
+            self._process(data)
+
+    def _process(self, data: bytes):
+        try:
+            messages = self.parser.feed(data)
+        except MessageTooBig:
+            logger.warning("websocket message exceeds size limit; closing connection")
+            self.close(socketError=True)
+            return
+        for (opcode, payload) in messages:
+            if opcode in [OPCODE_TEXT_MESSAGE, OPCODE_BINARY_MESSAGE]:
+                self._dispatch((opcode, payload))
+            elif opcode == OPCODE_CLOSE:
+                logger.debug("websocket close frame received; closing connection")
+                self.close()
+                return
+            else:
+                self._handleFrame(opcode, payload)
+
+    def _dispatch(self, item):
+        with self.inboxLock:
+            self.inbox.append(item)
+            if self.dispatching:
+                return
+            self.dispatching = True
+        self.wsLoop.submit(self._processInbox)
+
+    def _processInbox(self):
+        while True:
+            with self.inboxLock:
+                if not self.inbox:
+                    self.dispatching = False
+                    return
+                item = self.inbox.popleft()
+            if item is HandlerClose:
+                try:
+                    self.messageHandler.handleClose()
+                except Exception:
+                    logger.exception("Exception in websocket handler handleClose()")
+                self.wsLoop.call(self._finish)
+            else:
+                self._handleFrame(*item)
+
+    def _sendBytes(self, data_to_send, droppable: bool = False, wait: bool = False):
+        if self.closed or self.socketError:
+            return
+        self.writer.append(data_to_send, droppable)
+        # one pending flush takes care of everything queued up to that point
+        with self.flushLock:
+            if self.flushScheduled:
+                return
+            self.flushScheduled = True
+        self.wsLoop.call(self._flush)
+
+    def _flush(self):
+        with self.flushLock:
+            self.flushScheduled = False
+        if self.closed:
+            return
+        try:
+            done = self.writer.writeAvailable()
+        except OSError:
+            logger.exception("OSError while writing data")
+            self.close(socketError=True)
+            return
+        if done:
+            if self.writerRegistered:
+                self.wsLoop.loop.remove_writer(self.sock)
+                self.writerRegistered = False
+        elif not self.writerRegistered and not self.closed:
+            self.wsLoop.loop.add_writer(self.sock, self._flush)
+            self.writerRegistered = True
+            self._scheduleTimeoutCheck()
+
+    def _scheduleTimeoutCheck(self):
+        if self.timeoutHandle is not None:
+            return
+        delay = max(0, self.writer.lastProgress + SEND_TIMEOUT - time.monotonic())
+        self.timeoutHandle = self.wsLoop.loop.call_later(delay, self._checkTimeout)
+
+    def _checkTimeout(self):
+        self.timeoutHandle = None
+        if not self.writerRegistered or self.closed:
+            return
+        if time.monotonic() - self.writer.lastProgress >= SEND_TIMEOUT:
+            logger.debug("socket not writable before timeout; closing")
+            self.close(socketError=True)
+        else:
+            self._scheduleTimeoutCheck()
+
+    def startKeepalive(self):
+        # pings are scheduled on the event loop once the connection has been registered
+        pass
+
+    def cancelPing(self):
+        if self.pingHandle is not None:
+            self.pingHandle.cancel()
+            self.pingHandle = None
+
+    def requestPing(self):
+        # runs on the event loop, where sending only queues the frame
+        self.sendPing()
+
+    def _checkPing(self):
+        self.pingHandle = None
+        if self.closed:
+            return
+        due = self.keepalive(time.monotonic())
+        if due is not None:
+            self.pingHandle = self.wsLoop.loop.call_at(due, self._checkPing)
+
+    def interrupt(self):
+        pass
+
+    def close(self, socketError: bool = False):
+        if socketError:
+            self.socketError = True
+        self.open = False
+        self.wsLoop.call(self._shutdown)
+
+    def _shutdown(self):
+        if self.closed:
+            return
+        self.closed = True
+        logger.debug("websocket connection closing; shutting down")
+        self.wsLoop.loop.remove_reader(self.sock)
+        if self.writerRegistered:
+            self.wsLoop.loop.remove_writer(self.sock)
+            self.writerRegistered = False
+        self.cancelPing()
+        if self.timeoutHandle is not None:
+            self.timeoutHandle.cancel()
+            self.timeoutHandle = None
+        # handleClose() has to run after all messages that are still waiting in the inbox
+        self._dispatch(HandlerClose)
+
+    def _finish(self):
+        if self.socketError:
+            logger.debug("websocket closed in error, skipping close frame")
+        else:
+            logger.debug("sending close frame")
+            self.writer.append(self.get_header(0, OPCODE_CLOSE))
+            try:
+                # best effort, the socket will not be waited for
+                self.writer.writeAvailable()
+            except OSError:
+                pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        try:
+            WebSocketConnection.connections.remove(self)
+        except ValueError:
+            pass
+        self.wsLoop.removeConnection(self)
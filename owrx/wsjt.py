@@ -38,6 +38,10 @@ class WsjtProfile(AudioChopperProfile, metaclass=ABCMeta):
     def getFileTimestampFormat(self):
         return "%y%m%d_" + self.getTimestampFormat()
 
+    def getDecodingBudget(self):
+        # decodes are only useful for a QSO if they arrive early enough to answer in the next period
+        return self.getInterval() * 2 / 3
+
     @abstractmethod
     def getMode(self):
         pass
@@ -122,6 +126,10 @@ class WsprProfile(WsjtProfile):
     def getInterval(self):
         return 120
 
+    def getDecodingBudget(self):
+        # beacon spots are still worth reporting after the next period has started
+        return 2 * self.getInterval()
+
     def decoder_commandline(self, file):
         cmd = ["wsprd"]
         if self.decoding_depth() > 1:
@@ -194,6 +202,10 @@ class Fst4wProfile(WsjtProfile):
     def decoder_commandline(self, file):
         return ["jt9", "--fst4w", "-p", str(self.interval), "-d", str(self.decoding_depth()), file]
 
+    def getDecodingBudget(self):
+        # beacon spots are still worth reporting after the next period has started
+        return 2 * self.interval
+
     def getMode(self):
         return "FST4W"
 
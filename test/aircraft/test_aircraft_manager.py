@@ -0,0 +1,115 @@
+from unittest import TestCase
+from unittest.mock import patch
+from owrx.aircraft import AircraftManager
+import time
+
+
+class AircraftManagerTestCase(TestCase):
+    maxCount = 10000
+
+    def setUp(self):
+        config = {
+            "adsb_ttl": 900,
+            "acars_ttl": 1800,
+            "vdl2_ttl": 1800,
+            "hfdl_ttl": 1800,
+            "aircraft_max_count": self.maxCount,
+        }
+        patches = [
+            patch("owrx.aircraft.Config"),
+            patch("owrx.aircraft.Map"),
+            patch.object(AircraftManager, "_cleanupThread"),
+        ]
+        mocks = []
+        for p in patches:
+            mocks.append(p.start())
+            self.addCleanup(p.stop)
+        mocks[0].get.return_value = config
+        self.map = mocks[1].getSharedInstance.return_value
+        self.manager = AircraftManager()
+        self.now = round(time.time() * 1000)
+
+    def update(self, age=0, **data):
+        data.setdefault("mode", "ADSB")
+        data["timestamp"] = self.now - age * 1000
+        return self.manager.update(data)
+
+    def ids(self, items):
+        return [AircraftManager.getAircraftId(item) for item in items]
+
+
+class AircraftChangesTest(AircraftManagerTestCase):
+    def testFirstCallReturnsAll(self):
+        self.update(icao="A1")
+        self.update(icao="A2")
+        changed, removed, generation = self.manager.getChanges()
+        self.assertEqual(self.ids(changed), ["A1", "A2"])
+        self.assertEqual(removed, [])
+        self.assertEqual(generation, 2)
+
+    def testOnlyChangesAreReturned(self):
+        self.update(icao="A1", age=10)
+        self.update(icao="A2", age=10)
+        _, _, generation = self.manager.getChanges()
+        self.update(icao="A1")
+        # older data does not change anything
+        self.update(icao="A2", age=20)
+        changed, removed, generation = self.manager.getChanges(generation)
+        self.assertEqual(self.ids(changed), ["A1"])
+        changed, removed, _ = self.manager.getChanges(generation)
+        self.assertEqual(changed, [])
+
+    def testRemovalsAreReturned(self):
+        self.update(icao="A1", age=1000)
+        _, _, generation = self.manager.getChanges()
+        self.manager.cleanup()
+        changed, removed, _ = self.manager.getChanges(generation)
+        self.assertEqual(changed, [])
+        self.assertEqual(removed, ["A1"])
+
+
+class AircraftStorageTest(AircraftManagerTestCase):
+    maxCount = 3
+
+    def testAliasesShareRecord(self):
+        self.update(icao="A1", age=10)
+        self.update(mode="HFDL", flight="FL1", aircraft="N1", message="hello")
+        self.assertIsNot(self.manager.getAircraft("N1"), self.manager.getAircraft("A1"))
+        # a message with both IDs links them
+        self.update(icao="A1", aircraft="N1", age=5)
+        item = self.manager.getAircraft("A1")
+        self.assertIs(self.manager.getAircraft("N1"), item)
+        self.assertIs(self.manager.getAircraft("FL1"), item)
+        self.assertEqual(item["msglog"], ["hello"])
+        self.assertEqual(len(self.manager.getData()), 1)
+
+    def testRecordsAreNotModified(self):
+        self.update(icao="A1", age=10, altitude=1000)
+        before = self.manager.getAircraft("A1")
+        self.update(icao="A1", altitude=2000)
+        self.assertEqual(before["altitude"], 1000)
+        self.assertEqual(self.manager.getAircraft("A1")["altitude"], 2000)
+
+    def testExpiry(self):
+        self.update(icao="A1", age=1000, lat=1, lon=2)
+        self.update(icao="A2", age=10)
+        self.manager.cleanup()
+        self.assertEqual(self.manager.getAircraft("A1"), {})
+        self.assertNotEqual(self.manager.getAircraft("A2"), {})
+        self.map.removeLocation.assert_called_once_with("A1")
+
+    def testUpdatedRecordIsNotExpired(self):
+        # scheduled with the expired time-to-live, then updated
+        self.update(icao="A1", age=1000)
+        self.update(icao="A1")
+        self.manager.cleanup()
+        self.assertNotEqual(self.manager.getAircraft("A1"), {})
+        self.assertEqual(len(self.manager.expiry), 1)
+
+    def testLeastRecentlyUpdatedIsEvicted(self):
+        for id in ["A1", "A2", "A3"]:
+            self.update(icao=id, age=10)
+        self.update(icao="A1")
+        self.update(icao="A4")
+        self.assertCountEqual(self.ids(self.manager.getData()), ["A1", "A3", "A4"])
+        self.assertEqual(self.manager.getAircraft("A2"), {})
@@ -0,0 +1,58 @@
+"""
+Benchmark comparing decoder startup through the forking pool (nice + decoder, started from this process) with the
+pre-forked decoder slots. Reports decodes per second and the p95 latency of a single decode.
+
+The default decoder is "true", which only measures the startup overhead. Any other command can be given instead,
+e.g. a real decoder run on a recorded file:
+
+Run with: python3 -m test.audio.benchmark_pool [command ...]
+"""
+from owrx.audio.pool import ForkingDecoderPool, PreforkDecoderPool
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
+import time
+import sys
+import os
+
+DECODES = 400
+WORKERS = 2
+# memory that a receiver process typically has mapped, which makes forking from it more expensive
+BALLAST = 200 * 1024 * 1024
+
+
+def run(pool, command):
+    cwd = tempfile.gettempdir()
+    latencies = []
+
+    def decode(_):
+        start = time.monotonic()
+        pool.decode(command, cwd)
+        latencies.append(time.monotonic() - start)
+
+    # warm up, this also starts the slots of the prefork pool
+    with ThreadPoolExecutor(WORKERS) as executor:
+        list(executor.map(decode, range(WORKERS * 2)))
+    latencies.clear()
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(WORKERS) as executor:
+        list(executor.map(decode, range(DECODES)))
+    elapsed = time.monotonic() - start
+    latencies.sort()
+    return DECODES / elapsed, latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    command = sys.argv[1:] or ["true"]
+    ballast = bytearray(os.urandom(1024)) * (BALLAST // 1024)
+    print("{0} decodes of {1}, {2} workers".format(DECODES, " ".join(command), WORKERS))
+    pools = [("fork", ForkingDecoderPool()), ("prefork", PreforkDecoderPool())]
+    for name, pool in pools:
+        rate, p95 = run(pool, command)
+        print("{0:>8}: {1:7.1f} decodes/s, p95 latency {2:6.1f} ms".format(name, rate, p95 * 1000))
+        pool.stop()
+    del ballast
+
+
+if __name__ == "__main__":
+    main()
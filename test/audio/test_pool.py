@@ -0,0 +1,37 @@
+from unittest import TestCase
+from owrx.audio.pool import ForkingDecoderPool, PreforkDecoderPool
+import tempfile
+
+
+class DecoderPoolTest(TestCase):
+    def testForking(self):
+        lines, rc = ForkingDecoderPool().decode(["echo", "hello"], tempfile.gettempdir())
+        self.assertEqual(lines, [b"hello\n"])
+        self.assertEqual(rc, 0)
+
+    def testPrefork(self):
+        pool = PreforkDecoderPool()
+        try:
+            lines, rc = pool.decode(["sh", "-c", "echo one; echo two; exit 3"], tempfile.gettempdir())
+            self.assertEqual(lines, [b"one\n", b"two\n"])
+            self.assertEqual(rc, 3)
+            # the slot is reused for the next decoder
+            pool.decode(["true"], tempfile.gettempdir())
+            self.assertEqual(pool.slots, 1)
+        finally:
+            pool.stop()
+
+    def testPreforkReplacesDeadSlot(self):
+        pool = PreforkDecoderPool()
+        try:
+            pool.decode(["true"], tempfile.gettempdir())
+            slot = pool.idle.get()
+            slot.process.kill()
+            slot.process.join()
+            with self.assertRaises((EOFError, OSError)):
+                slot.decode(["true"], tempfile.gettempdir())
+            pool._returnSlot(slot)
+            lines, rc = pool.decode(["echo", "back"], tempfile.gettempdir())
+            self.assertEqual(lines, [b"back\n"])
+        finally:
+            pool.stop()
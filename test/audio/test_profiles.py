@@ -0,0 +1,19 @@
+from unittest import TestCase
+from owrx.wsjt import Ft8Profile, Ft4Profile, WsprProfile, Fst4wProfile
+from owrx.audio.queue import QueueJob
+
+
+class DecodingBudgetTest(TestCase):
+    def testQsoModesNeedResultsBeforeTheNextPeriodEnds(self):
+        self.assertEqual(Ft8Profile().getDecodingBudget(), 10)
+        self.assertEqual(Ft4Profile().getDecodingBudget(), 5)
+
+    def testBeaconModesAllowLateResults(self):
+        self.assertEqual(WsprProfile().getDecodingBudget(), 240)
+        self.assertEqual(Fst4wProfile(300).getDecodingBudget(), 600)
+
+    def testDeadlines(self):
+        ft8 = QueueJob(Ft8Profile(), None, None, "ft8.wav")
+        wspr = QueueJob(WsprProfile(), None, None, "wspr.wav")
+        self.assertAlmostEqual(ft8.deadline - ft8.created, 10)
+        self.assertLess(ft8.deadline, wspr.deadline)
@@ -0,0 +1,128 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from owrx.audio import AudioChopperProfile
+from owrx.audio.queue import DecoderQueue, QueueJob
+from owrx.metrics import HistogramMetric
+from queue import Empty
+import math
+import time
+
+
+class FakeProfile(AudioChopperProfile):
+    def __init__(self, mode, interval):
+        self.mode = mode
+        self.interval = interval
+
+    def getMode(self):
+        return self.mode
+
+    def getInterval(self):
+        return self.interval
+
+    def getFileTimestampFormat(self):
+        return "%y%m%d_%H%M%S"
+
+    def decoder_commandline(self, file):
+        return []
+
+
+class DecoderQueueTest(TestCase):
+    def setUp(self):
+        config = patch("owrx.audio.queue.Config")
+        values = {"decoding_queue_length": 3, "decoding_queue_workers": 0}
+        config.start().get.return_value.__getitem__.side_effect = values.__getitem__
+        self.addCleanup(config.stop)
+        metrics = patch("owrx.audio.queue.Metrics")
+        self.metrics = metrics.start().getSharedInstance.return_value
+        self.metrics.getMetric.return_value = None
+        self.addCleanup(metrics.stop)
+        self.queue = DecoderQueue()
+        # no automatic worker scaling, the tests take the jobs themselves
+        self.queue.resizeInterval = math.inf
+
+    def job(self, mode, interval, age=0):
+        job = QueueJob(FakeProfile(mode, interval), None, None, "/nonexistent/{0}".format(mode))
+        job.created -= age
+        job.deadline -= age
+        job.unlink = MagicMock()
+        return job
+
+    def testOrderedByDeadline(self):
+        wspr = self.job("WSPR", 120)
+        ft8 = self.job("FT8", 15)
+        self.queue.put(wspr)
+        self.queue.put(ft8)
+        self.assertIs(self.queue.get_nowait(), ft8)
+        self.assertIs(self.queue.get_nowait(), wspr)
+
+    def testSkipsJobsThatCannotFinish(self):
+        self.queue.onDuration(self.job("FT8", 15), 5)
+        late = self.job("FT8", 15, age=12)
+        onTime = self.job("FT8", 15, age=2)
+        self.queue.put(late)
+        self.queue.put(onTime)
+        self.assertIs(self.queue.get_nowait(), onTime)
+        late.unlink.assert_called_once()
+        self.assertEqual(self.queue.expiredCounter.getValue()["count"], 1)
+        with self.assertRaises(Empty):
+            self.queue.get_nowait()
+
+    def testOverflowDropsStalestJob(self):
+        jobs = [self.job("WSPR", 120, age=age) for age in [10, 30, 20]]
+        for job in jobs:
+            self.queue.put(job)
+        new = self.job("WSPR", 120)
+        self.queue.put(new)
+        jobs[1].unlink.assert_called_once()
+        self.assertEqual(self.queue.qsize(), 3)
+        self.assertEqual([self.queue.get_nowait() for _ in range(3)], [jobs[2], jobs[0], new])
+
+    def testLoad(self):
+        for _ in range(10):
+            job = self.job("FT8", 15)
+            self.queue.put(job)
+            self.queue.get_nowait()
+            self.queue.onDuration(job, 3)
+        self.queue.arrivals[0] = (time.time() - 15, "FT8_15")
+        self.assertAlmostEqual(self.queue.getLoad(), 2, places=1)
+
+    def testShrinkingStopsWorkers(self):
+        self.queue.maxWorkers = 3
+        self.queue._resize(3)
+        workers = list(self.queue.workers)
+        self.assertEqual(len(workers), 3)
+        self.queue._resize(1)
+        self.assertEqual(self.queue.getWorkerCount(), 1)
+        for worker in workers:
+            worker.join(0.1)
+        self.assertEqual(len([w for w in workers if w.is_alive()]), 1)
+        self.assertEqual(len(self.queue.workers), 1)
+        self.queue.stop()
+        self.assertFalse(any(w.is_alive() for w in workers))
+
+    def testStopWhileShrinking(self):
+        # the PoisonPills of shrinking are still queued when the queue is stopped
+        self.queue.maxWorkers = 3
+        with patch.object(DecoderQueue, "newWorker", side_effect=lambda: MagicMock(is_alive=lambda: False)):
+            self.queue._resize(3)
+        self.queue._resize(1)
+        self.assertEqual(self.queue.qsize(), 2)
+        self.queue.stop()
+        self.assertEqual(self.queue.qsize(), 0)
+
+    def testLatencyHistogram(self):
+        self.queue.onSuccess(self.job("FT8", 15, age=3))
+        name, metric = self.metrics.addMetric.call_args.args
+        self.assertEqual(name, "decoding.queue.latency.ft8")
+        value = metric.getValue()
+        self.assertEqual(value["count"], 1)
+        self.assertEqual(value["buckets"]["2"], 0)
+        self.assertEqual(value["buckets"]["5"], 1)
+
+
+class HistogramMetricTest(TestCase):
+    def testBuckets(self):
+        metric = HistogramMetric([1, 10])
+        for value in [0.5, 5, 50]:
+            metric.observe(value)
+        self.assertEqual(metric.getValue(), {"buckets": {"1": 1, "10": 2}, "sum": 55.5, "count": 3})
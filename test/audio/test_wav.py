@@ -0,0 +1,86 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from owrx.audio import AudioChopperProfile
+from owrx.audio.queue import QueueJob
+from owrx.audio.wav import MemoryAudioWriter
+import tempfile
+import shutil
+import wave
+import os
+
+
+class FakeProfile(AudioChopperProfile):
+    def getInterval(self):
+        return 15
+
+    def getFileTimestampFormat(self):
+        return "%y%m%d_%H%M%S"
+
+    def decoder_commandline(self, file):
+        return []
+
+
+class MemoryAudioWriterTest(TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        coreConfig = patch("owrx.audio.wav.CoreConfig")
+        coreConfig.start().return_value.get_temporary_directory.return_value = self.tmpDir
+        self.addCleanup(coreConfig.stop)
+        queue = patch("owrx.audio.wav.DecoderQueue")
+        self.queue = queue.start().getSharedInstance.return_value
+        self.addCleanup(queue.stop)
+        self.chopper = Mock()
+        self.chopper.createJob.side_effect = lambda profile, filename, memoryFile=None: QueueJob(
+            profile, None, None, filename, memoryFile
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def switch(self, writer):
+        with patch.object(writer, "_scheduleNextSwitch"):
+            writer._switchFiles()
+        return [call.args[0] for call in self.queue.put.call_args_list]
+
+    def testJobsShareOneMemoryFile(self):
+        writer = MemoryAudioWriter(self.chopper, 15, [FakeProfile(), FakeProfile()])
+        writer.timestamp = writer.getNextDecodingTime()
+        writer.write(b"\x01\x02" * 1000)
+        jobs = self.switch(writer)
+        self.assertEqual(len(jobs), 2)
+        self.assertIs(jobs[0].memoryFile, jobs[1].memoryFile)
+        for job in jobs:
+            self.assertTrue(os.path.islink(job.file))
+            with wave.open(job.file, "rb") as w:
+                self.assertEqual(w.readframes(2000), b"\x01\x02" * 1000)
+        memoryFile = jobs[0].memoryFile
+        for job in jobs:
+            job.unlink()
+        self.assertIsNone(memoryFile.fd)
+        self.assertEqual(os.listdir(self.tmpDir), [])
+
+    def testOverflowIsTruncated(self):
+        writer = MemoryAudioWriter(self.chopper, 1, [FakeProfile()])
+        writer.timestamp = writer.getNextDecodingTime()
+        for _ in range(10):
+            writer.write(bytes(24000))
+        self.assertEqual(writer.getLength(), writer.maxLength)
+        job, = self.switch(writer)
+        self.assertEqual(writer.getLength(), 0)
+        job.unlink()
+
+    def testChunksAreRecycled(self):
+        writer = MemoryAudioWriter(self.chopper, 60, [FakeProfile()])
+        writer.timestamp = writer.getNextDecodingTime()
+        data = os.urandom(writer.chunkSize * 2 + 1000)
+        writer.write(data[:1000])
+        writer.write(data[1000:])
+        self.assertEqual(len(writer.chunks), 3)
+        chunks = list(writer.chunks)
+        job, = self.switch(writer)
+        with wave.open(job.file, "rb") as w:
+            self.assertEqual(w.readframes(len(data)), data)
+        job.unlink()
+        writer.write(bytes(10))
+        self.assertTrue(any(writer.chunks[0] is c for c in chunks))
+        self.assertEqual(len(writer.freeChunks), 2)
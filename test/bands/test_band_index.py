@@ -0,0 +1,47 @@
+from unittest import TestCase
+from owrx.bands import Band, BandIndex
+import random
+
+
+class BandIndexTest(TestCase):
+    def randomBands(self, count):
+        bands = []
+        for i in range(count):
+            lower = random.randrange(0, 1000) * 10
+            upper = lower + random.randrange(0, 50) * 10
+            band = Band({"name": "band{}".format(i), "lower_bound": lower, "upper_bound": upper})
+            band.frequencies = [{"frequency": random.randint(lower, upper)} for _ in range(random.randrange(0, 4))]
+            bands.append(band)
+        return bands
+
+    def testEmpty(self):
+        index = BandIndex([])
+        self.assertEqual(index.findBands(14000000), [])
+        self.assertEqual(index.findBandsInRange(14000000, 15000000), [])
+        self.assertEqual(index.collectDialFrequencies((14000000, 15000000)), [])
+
+    def testBoundsAreInclusive(self):
+        band = Band({"name": "20m", "lower_bound": 14000000, "upper_bound": 14350000})
+        index = BandIndex([band])
+        self.assertEqual(index.findBands(14000000), [band])
+        self.assertEqual(index.findBands(14350000), [band])
+        self.assertEqual(index.findBands(14350001), [])
+        self.assertEqual(index.findBandsInRange(14350000, 14400000), [])
+
+    def testMatchesLinearSearch(self):
+        random.seed(42)
+        for _ in range(20):
+            bands = self.randomBands(30)
+            index = BandIndex(bands)
+            for _ in range(200):
+                freq = random.randrange(-100, 10600)
+                self.assertEqual(index.findBands(freq), [b for b in bands if b.inBand(freq)])
+                low = random.randrange(-100, 10600)
+                high = low + random.randrange(-20, 500)
+                self.assertEqual(
+                    index.findBandsInRange(low, high), [b for b in bands if b.inRange(low, high)]
+                )
+                self.assertEqual(
+                    index.collectDialFrequencies((low, high)),
+                    [e for b in bands for e in b.getDialFrequencies((low, high))],
+                )
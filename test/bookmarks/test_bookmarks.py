@@ -0,0 +1,67 @@
+from unittest import TestCase
+from unittest.mock import patch, Mock
+from owrx.bookmarks import Bookmark, Bookmarks
+import tempfile
+import json
+import os
+
+
+class BookmarksTest(TestCase):
+    def setUp(self):
+        fd, self.file = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        self.writeBookmarks([
+            {"name": "b{}".format(f), "frequency": f, "modulation": "usb"} for f in [7000, 3000, 5000, 1000, 9000]
+        ])
+        patches = [
+            patch("owrx.bookmarks.Config", Mock()),
+            patch.object(Bookmarks, "_getBookmarkFiles", return_value=[self.file]),
+            patch.object(Bookmarks, "_getMainBookmarkFile", return_value=self.file),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.bookmarks = Bookmarks()
+
+    def tearDown(self):
+        os.unlink(self.file)
+
+    def writeBookmarks(self, bookmarks):
+        with open(self.file, "w") as f:
+            json.dump(bookmarks, f)
+
+    def testRangeQuery(self):
+        result = self.bookmarks.getBookmarks((3000, 7000))
+        self.assertEqual([b.getFrequency() for b in result], [3000, 5000, 7000])
+        self.assertEqual(self.bookmarks.getBookmarks((7001, 8999)), [])
+
+    def testSerializedBookmarksAreShared(self):
+        first = self.bookmarks.getSerializedBookmarks((0, 4000))
+        self.assertEqual([b["name"] for b in first], ["b1000", "b3000"])
+        self.assertIs(self.bookmarks.getSerializedBookmarks((0, 4000)), first)
+
+    def testChangesInvalidateCache(self):
+        first = self.bookmarks.getSerializedBookmarks((0, 4000))
+        bookmark = Bookmark({"name": "new", "frequency": 2000, "modulation": "am"})
+        self.bookmarks.addBookmark(bookmark)
+        second = self.bookmarks.getSerializedBookmarks((0, 4000))
+        self.assertEqual([b["name"] for b in second], ["b1000", "new", "b3000"])
+        bookmark.frequency = 6000
+        self.bookmarks.store()
+        self.assertEqual([b["name"] for b in self.bookmarks.getSerializedBookmarks((0, 4000))], ["b1000", "b3000"])
+        self.assertEqual(first, self.bookmarks.getSerializedBookmarks((0, 4000)))
+
+    def testEncodedBookmarksAreShared(self):
+        first = self.bookmarks.getEncodedBookmarks((0, 4000))
+        self.assertEqual(json.loads(first), self.bookmarks.getSerializedBookmarks((0, 4000)))
+        self.assertIs(self.bookmarks.getEncodedBookmarks((0, 4000)), first)
+        self.bookmarks.addBookmark(Bookmark({"name": "new", "frequency": 2000, "modulation": "am"}))
+        second = json.loads(self.bookmarks.getEncodedBookmarks((0, 4000)))
+        self.assertEqual([b["name"] for b in second], ["b1000", "new", "b3000"])
+
+    def testSubscriptionCanBeCancelled(self):
+        callback = Mock()
+        sub = self.bookmarks.subscribe((0, 4000), callback)
+        sub.cancel()
+        self.bookmarks.addBookmark(Bookmark({"name": "new", "frequency": 2000, "modulation": "am"}))
+        callback.assert_not_called()
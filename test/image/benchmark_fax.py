@@ -0,0 +1,55 @@
+"""
+Benchmark for the fax parser, feeding it a multi-page fax byte stream in chunks as they come from the decoder.
+Reports the parsing throughput and the cost of sending a scanline to a client, as a binary frame and, for
+comparison, as the base64 JSON message used before.
+
+Run with: python3 -m test.image.benchmark_fax
+"""
+from unittest.mock import patch
+from owrx.fax import FaxParser
+from owrx.image import encodeScanline
+from test.image.stream import faxPages, chunks
+import base64
+import json
+import time
+
+PAGES = 4
+# IOC 576 at 8 bits per pixel
+WIDTH = 1809
+HEIGHT = 1200
+CHUNK = 4096
+
+
+def main():
+    stream = faxPages(PAGES, WIDTH, HEIGHT)
+    with patch("owrx.fax.Config") as configMock:
+        configMock.get.return_value = {"fax_min_length": 200}
+        parser = FaxParser()
+        scanlines = []
+        start = time.perf_counter()
+        for chunk in chunks(stream, CHUNK):
+            parser.data.append(chunk)
+            out = parser.process()
+            while out is not None:
+                if "pixels" in out:
+                    scanlines.append(out)
+                out = parser.process()
+        elapsed = time.perf_counter() - start
+    print("{:<40} {:>10.2f} MB/s".format("parse ({} scanlines)".format(len(scanlines)), len(stream) / elapsed / 1e6))
+
+    start = time.perf_counter()
+    for scanline in scanlines:
+        encodeScanline(scanline)
+    elapsed = time.perf_counter() - start
+    print("{:<40} {:>10.2f} µs".format("binary frame per scanline", elapsed / len(scanlines) * 1e6))
+
+    start = time.perf_counter()
+    for scanline in scanlines:
+        message = dict(scanline, pixels=base64.b64encode(scanline["pixels"]).decode())
+        json.dumps({"type": "secondary_demod", "value": message})
+    elapsed = time.perf_counter() - start
+    print("{:<40} {:>10.2f} µs".format("base64 JSON per scanline", elapsed / len(scanlines) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+def faxHeader(width: int, height: int, ioc: int = 576, lpm: int = 120) -> bytes:
+    # BMP header as written by the fax decoder, with an 8 bit grayscale palette
+    header = bytearray(54)
+    header[0:2] = b"BM"
+    header[2:6] = (54 + 1024 + width * height).to_bytes(4, "little")
+    header[6] = ioc // 4
+    header[7] = lpm
+    header[10:14] = (54 + 1024).to_bytes(4, "little")
+    header[14] = 40
+    header[18:22] = width.to_bytes(4, "little")
+    header[22:26] = (-height & 0xFFFFFFFF).to_bytes(4, "little")
+    header[26] = 1
+    header[28] = 8
+    palette = b"".join(bytes([i, i, i, 0]) for i in range(256))
+    return bytes(header) + palette
+
+
+def faxLine(width: int, page: int, line: int) -> bytes:
+    return bytes((page * 31 + line * 7 + x) & 0xFF for x in range(width))
+
+
+def faxPages(pages: int, width: int, height: int):
+    """
+    A byte stream as produced by the fax decoder: messages, and pages with a header followed by their scanlines.
+    Every other page is cut short by an END-PAGE marker line.
+    """
+    stream = bytearray(b"noise")
+    for page in range(pages):
+        stream += b" [Receiving page %d]" % page
+        stream += faxHeader(width, height)
+        lines = height if page % 2 == 0 else height // 2
+        for line in range(lines):
+            stream += faxLine(width, page, line)
+        if lines < height:
+            stream += b"END-PAGE!" + bytes(width - 9)
+    return bytes(stream)
+
+
+def chunks(stream: bytes, size: int):
+    for i in range(0, len(stream), size):
+        yield stream[i:i + size]
@@ -0,0 +1,71 @@
+from unittest import TestCase
+from unittest.mock import patch
+from owrx.fax import FaxParser
+from owrx.image import StreamBuffer, encodeScanline, SCANLINE_HEADER
+from test.image.stream import faxPages, faxLine, chunks
+
+
+class StreamBufferTest(TestCase):
+    def testConsumeAndAppend(self):
+        buffer = StreamBuffer()
+        buffer.append(b"0123456789")
+        buffer.skip(4)
+        self.assertEqual(len(buffer), 6)
+        self.assertEqual(buffer[0], ord("4"))
+        self.assertEqual(buffer.find(b"7"), 3)
+        self.assertEqual(buffer.find(b"7", 0, 3), -1)
+        self.assertEqual(buffer.find(b"2"), -1)
+        self.assertTrue(buffer.startswith(b"45"))
+        self.assertEqual(buffer.getBytes(1, 3), b"56")
+        buffer.skip(2)
+        # consumed data is dropped here
+        buffer.append(b"abc")
+        self.assertEqual(buffer.getBytes(0, len(buffer)), b"6789abc")
+        with buffer.view(0, 2) as view:
+            self.assertEqual(bytes(view), b"67")
+        buffer.skip(100)
+        self.assertEqual(len(buffer), 0)
+
+
+class FaxParserTest(TestCase):
+    width = 64
+    height = 20
+
+    def setUp(self):
+        patcher = patch("owrx.fax.Config")
+        patcher.start().get.return_value = {"fax_min_length": 10}
+        self.addCleanup(patcher.stop)
+
+    def parse(self, stream, chunkSize):
+        parser = FaxParser()
+        result = []
+        for chunk in chunks(stream, chunkSize):
+            parser.data.append(chunk)
+            out = parser.process()
+            while out is not None:
+                if len(out) > 0:
+                    result.append(out)
+                out = parser.process()
+        return result
+
+    def testPages(self):
+        for chunkSize in [7, 1000, 100000]:
+            result = self.parse(faxPages(3, self.width, self.height), chunkSize)
+            messages = [r["message"] for r in result if "message" in r]
+            self.assertEqual(messages, ["Receiving page 0", "Receiving page 1", "Receiving page 2"])
+            headers = [r for r in result if "faxMode" in r]
+            self.assertEqual(len(headers), 3)
+            self.assertEqual(headers[0]["faxMode"], "IOC-576 120LPM")
+            lines = [r for r in result if "pixels" in r]
+            # the second page ends halfway, marked by one more line
+            self.assertEqual(len(lines), self.height * 2 + self.height // 2 + 1)
+            self.assertEqual(lines[0]["pixels"], faxLine(self.width, 0, 0))
+            self.assertEqual(lines[self.height + 3]["pixels"], faxLine(self.width, 1, 3))
+            self.assertTrue(lines[self.height + self.height // 2]["ended"])
+
+    def testScanlineFrame(self):
+        pixels = bytes(range(12))
+        frame = encodeScanline({"mode": "Fax", "line": 3, "width": 12, "height": 1500, "depth": 8, "ended": True, "pixels": pixels})
+        self.assertEqual(frame[0], 0x05)
+        self.assertEqual(SCANLINE_HEADER.unpack(frame[1:1 + SCANLINE_HEADER.size]), (1, 1, 8, 12, 3, 1500))
+        self.assertEqual(frame[1 + SCANLINE_HEADER.size:], pixels)
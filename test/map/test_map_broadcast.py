@@ -0,0 +1,114 @@
+from unittest import TestCase
+from unittest.mock import patch
+from owrx.map import Map, LatLngLocation
+from owrx.property import PropertyLayer
+from datetime import datetime, timedelta, timezone
+import json
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.frames = []
+
+    def write_update_frame(self, frame):
+        self.frames.append(frame)
+
+    def getUpdates(self):
+        def payload(frame):
+            length = frame[1] & 0x7F
+            return frame[{126: 4, 127: 10}.get(length, 2):]
+
+        return [json.loads(payload(frame))["value"] for frame in self.frames]
+
+
+class MapBroadcastTest(TestCase):
+    def setUp(self):
+        self.config = PropertyLayer(
+            map_position_retention_time=3600,
+            map_ignore_indirect_reports=False,
+            map_prefer_recent_reports=True,
+            map_max_calls=2,
+        )
+        patcher = patch("owrx.map.Config")
+        self.addCleanup(patcher.stop)
+        patcher.start().get.return_value = self.config
+        self.map = Map()
+        # batches are only sent when the test calls flush()
+        self.map.broadcastInterval = 3600
+
+    def testUpdatesAreMergedIntoOneBatch(self):
+        client = FakeClient()
+        self.map.addClient(client)
+        self.map.updateLocation("A", LatLngLocation(1, 2), "APRS")
+        self.map.updateLocation("B", LatLngLocation(3, 4), "APRS")
+        self.map.updateLocation("A", LatLngLocation(5, 6), "APRS")
+        self.map.flush()
+        updates = client.getUpdates()
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[0], [])
+        self.assertEqual([(u["callsign"], u["location"]["lat"]) for u in updates[1]], [("A", 5), ("B", 3)])
+
+    def testBatchIsSharedBetweenClients(self):
+        clients = [FakeClient() for _ in range(3)]
+        for c in clients:
+            self.map.addClient(c)
+        self.map.updateLocation("A", LatLngLocation(1, 2), "APRS")
+        self.map.flush()
+        self.assertIs(clients[0].frames[-1], clients[1].frames[-1])
+        self.assertIs(clients[1].frames[-1], clients[2].frames[-1])
+
+    def testNothingToSend(self):
+        client = FakeClient()
+        self.map.addClient(client)
+        self.map.flush()
+        self.assertEqual(len(client.frames), 1)
+
+    def testSnapshotIsUpdatedIncrementally(self):
+        self.map.updateLocation("A", LatLngLocation(1, 2), "APRS")
+        self.map.updateLocation("B", LatLngLocation(3, 4), "APRS")
+        self.map.flush()
+        self.map.updateLocation("B", LatLngLocation(7, 8), "APRS")
+        self.map.removeLocation("A")
+        self.map.updateCall("B", "B", "FT8")
+        self.map.updateCall("B", "B", "FT8")
+        self.map.updateCall("B", "B", "FT4")
+        # not part of the snapshot before the next batch
+        client = FakeClient()
+        self.map.addClient(client)
+        self.assertEqual([u["callsign"] for u in client.getUpdates()[0]], ["A", "B"])
+        self.map.flush()
+        client = FakeClient()
+        self.map.addClient(client)
+        snapshot = client.getUpdates()[0]
+        self.assertEqual([u["location"]["lat"] for u in snapshot if "callsign" in u], [7])
+        self.assertEqual([u["mode"] for u in snapshot if "caller" in u], ["FT8", "FT4"])
+
+    def testSnapshotIsShared(self):
+        self.map.updateLocation("A", LatLngLocation(1, 2), "APRS")
+        self.map.flush()
+        first = FakeClient()
+        second = FakeClient()
+        self.map.addClient(first)
+        self.map.addClient(second)
+        self.assertIs(first.frames[0], second.frames[0])
+
+    def testRemovalIsBroadcast(self):
+        client = FakeClient()
+        self.map.addClient(client)
+        self.map.updateLocation("A", LatLngLocation(1, 2), "APRS")
+        self.map.flush()
+        self.map.removeLocation("A")
+        self.map.flush()
+        self.assertEqual(client.getUpdates()[-1], [{"callsign": "A", "removed": True}])
+
+    def testExpiry(self):
+        now = datetime.now(timezone.utc)
+        self.map.updateLocation("old", LatLngLocation(1, 2), "APRS", timestamp=now - timedelta(seconds=3000))
+        self.map.updateLocation("updated", LatLngLocation(1, 2), "APRS", timestamp=now - timedelta(seconds=3000))
+        self.map.updateLocation("new", LatLngLocation(1, 2), "APRS")
+        self.map.updateLocation("updated", LatLngLocation(3, 4), "APRS")
+        self.config["map_position_retention_time"] = 2000
+        self.map.removeOldPositions()
+        self.assertEqual(sorted(self.map.positions.keys()), ["new", "updated"])
+        # the updated position is rescheduled instead of being kept in the heap twice
+        self.assertEqual(len(self.map.expiry), 2)
@@ -0,0 +1,58 @@
+"""
+Benchmark for the property system, modeled after a receiver with several config layers and many connected clients.
+Reports the time for lookups through a PropertyStack and for delivering a change to hundreds of filtered subscribers.
+
+Run with: python3 -m test.property.benchmark_property
+"""
+from owrx.property import PropertyLayer, PropertyStack, PropertyFilter
+from owrx.property.filter import ByPropertyName
+import time
+
+LAYERS = 5
+KEYS = 200
+FILTERS = 500
+ITERATIONS = 100000
+
+
+def measure(name, function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    elapsed = time.perf_counter() - start
+    print("{:<40} {:>10.2f} µs".format(name, elapsed / iterations * 1e6))
+
+
+def main():
+    stack = PropertyStack()
+    layers = []
+    for priority in range(LAYERS):
+        layer = PropertyLayer(**{"key_{}_{}".format(priority, i): i for i in range(KEYS)})
+        layer["shared"] = priority
+        layers.append(layer)
+        stack.addLayer(priority, layer)
+
+    measure("getitem (top layer)", lambda: stack["shared"], ITERATIONS)
+    measure("getitem (bottom layer)", lambda: stack["key_{}_0".format(LAYERS - 1)], ITERATIONS)
+    measure("contains (missing key)", lambda: "missing" in stack, ITERATIONS)
+    measure("__dict__", stack.__dict__, ITERATIONS // 100)
+
+    # one filter per client, each interested in a few keys, as with the client config of every connection
+    filters = []
+    for i in range(FILTERS):
+        f = PropertyFilter(stack, ByPropertyName("shared", "key_0_{}".format(i % KEYS)))
+        f.wire(lambda changes: None)
+        filters.append(f)
+
+    def change():
+        layers[0]["key_0_1"] += 1
+
+    measure("change with {} filters".format(FILTERS), change, ITERATIONS // 100)
+
+    for i in range(FILTERS):
+        stack.wireProperty("key_0_{}".format(i % KEYS), lambda value: None)
+
+    measure("change with {} property subscribers".format(FILTERS), change, ITERATIONS // 100)
+
+
+if __name__ == "__main__":
+    main()
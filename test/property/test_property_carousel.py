@@ -123,3 +123,18 @@ class PropertyCarouselTest(TestCase):
         pl = PropertyLayer(testkey="othervalue")
         pc.addLayer("x", pl)
         mock.method.assert_called_once_with({"testkey": "othervalue"})
+
+    def testOnlySubscribedWhileInUse(self):
+        pc = PropertyCarousel()
+        pl = PropertyLayer(testkey="testvalue")
+        pc.addLayer("x", pl)
+        pc.switch("x")
+        self.assertEqual(pl.getSubscriberCount(), 0)
+        sub = pc.wire(Mock().method)
+        self.assertEqual(pl.getSubscriberCount(), 1)
+        pc.switch()
+        self.assertEqual(pl.getSubscriberCount(), 0)
+        pc.switch("x")
+        self.assertEqual(pl.getSubscriberCount(), 1)
+        sub.cancel()
+        self.assertEqual(pl.getSubscriberCount(), 0)
@@ -80,3 +80,24 @@ class PropertyFilterTest(TestCase):
         pf.wire(mock.method)
         del pf["testkey"]
         mock.method.assert_called_once_with({"testkey": PropertyDeleted})
+
+    def testOnlySubscribedWhileInUse(self):
+        pm = PropertyLayer()
+        pf = pm.filter("testkey")
+        self.assertEqual(pm.getSubscriberCount(), 0)
+        sub = pf.wire(Mock().method)
+        propertySub = pf.wireProperty("testkey", Mock().method)
+        self.assertEqual(pm.getSubscriberCount(), 1)
+        sub.cancel()
+        self.assertEqual(pm.getSubscriberCount(), 1)
+        propertySub.cancel()
+        self.assertEqual(pm.getSubscriberCount(), 0)
+
+    def testResubscribes(self):
+        pm = PropertyLayer()
+        pf = pm.filter("testkey")
+        pf.wire(Mock().method).cancel()
+        mock = Mock()
+        pf.wire(mock.method)
+        pm["testkey"] = "testvalue"
+        mock.method.assert_called_once_with({"testkey": "testvalue"})
@@ -238,3 +238,39 @@ class PropertyStackTest(TestCase):
         ps.wire(mock.method)
         del high_pm["testkey"]
         mock.method.assert_called_once_with({"testkey": "lowvalue"})
+
+    def testSamePriorityKeepsInsertionOrder(self):
+        stack = PropertyStack()
+        first = PropertyLayer(testkey="first")
+        second = PropertyLayer(testkey="second")
+        stack.addLayer(1, first)
+        stack.addLayer(1, second)
+        self.assertEqual(stack["testkey"], "first")
+        stack.removeLayer(first)
+        self.assertEqual(stack["testkey"], "second")
+
+    def testKeyAddedToLowerLayerDoesNotOverride(self):
+        stack = PropertyStack()
+        low_pm = PropertyLayer()
+        high_pm = PropertyLayer(testkey="high value")
+        stack.addLayer(1, low_pm)
+        stack.addLayer(0, high_pm)
+        mock = Mock()
+        stack.wireProperty("testkey", mock.method)
+        mock.reset_mock()
+        low_pm["testkey"] = "low value"
+        self.assertEqual(stack["testkey"], "high value")
+        mock.method.assert_not_called()
+        del high_pm["testkey"]
+        self.assertEqual(stack["testkey"], "low value")
+        mock.method.assert_called_once_with("low value")
+
+    def testKeyAddedToHigherLayerOverrides(self):
+        stack = PropertyStack()
+        low_pm = PropertyLayer(testkey="low value")
+        high_pm = PropertyLayer()
+        stack.addLayer(1, low_pm)
+        stack.addLayer(0, high_pm)
+        high_pm["testkey"] = "high value"
+        self.assertEqual(stack["testkey"], "high value")
+        self.assertEqual(stack.__dict__(), {"testkey": "high value"})
@@ -0,0 +1,60 @@
+"""
+Benchmark for the pskreporter spot handling, modeled after a busy receiver decoding FT8 and FT4 on a dozen bands.
+Reports the time spent in the decoder threads for every spot, and the time to turn a full upload window into packets.
+
+Run with: python3 -m test.reporting.benchmark_pskreporter
+"""
+from unittest.mock import patch
+from owrx.property import PropertyLayer
+from owrx.reporting.pskreporter import PskReporter
+import random
+import time
+
+SPOTS = 10000
+# share of spots decoded twice, e.g. on overlapping dials
+DUPLICATES = 0.1
+
+
+def getSpots():
+    random.seed(0)
+    spots = []
+    for i in range(SPOTS):
+        callsign = "N{}CALL".format(i)
+        spots.append({
+            "callsign": callsign,
+            "timestamp": 1700000000000 + (i // 100) * 15000,
+            "locator": "JN{:02d}".format(i % 100),
+            "mode": random.choice(["FT8", "FT4"]),
+            "msg": "CQ {} JN58".format(callsign),
+            "freq": 14074000 + random.randrange(0, 3000),
+            "db": random.randrange(-24, 10),
+        })
+    spots += random.sample(spots, int(SPOTS * DUPLICATES))
+    return spots
+
+
+def main():
+    config = PropertyLayer(pskreporter_callsign="N0CALL", receiver_gps={"lat": 48.0, "lon": 11.0})
+    with patch("owrx.reporting.pskreporter.Config") as configMock, \
+            patch("owrx.reporting.pskreporter.Metrics"), \
+            patch.object(PskReporter, "scheduleNextUpload", lambda self: None):
+        configMock.get.return_value = config
+        reporter = PskReporter()
+        spots = getSpots()
+
+        start = time.perf_counter()
+        for spot in spots:
+            reporter.spot(spot)
+        elapsed = time.perf_counter() - start
+        print("{:<40} {:>10.2f} µs".format("spot ({} spots)".format(len(spots)), elapsed / len(spots) * 1e6))
+
+        encoded = reporter.spots
+        start = time.perf_counter()
+        packets = reporter.uploader.getPackets(encoded)
+        elapsed = time.perf_counter() - start
+        print("{:<40} {:>10.2f} ms".format("getPackets ({} packets)".format(len(packets)), elapsed * 1e3))
+        reporter.uploader.socket.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+from unittest import TestCase
+from unittest.mock import patch
+from owrx.property import PropertyLayer
+from owrx.reporting.pskreporter import PskReporter, Uploader
+
+
+def getSpot(callsign="N0CALL", timestamp=1700000000000, **extra):
+    spot = {
+        "callsign": callsign,
+        "timestamp": timestamp,
+        "locator": "JN58",
+        "mode": "FT8",
+        "msg": "CQ {} JN58".format(callsign),
+        "freq": 14074500,
+        "db": -12,
+    }
+    spot.update(extra)
+    return spot
+
+
+class PskReporterTest(TestCase):
+    def setUp(self):
+        # no metrics and no upload timers
+        for patcher in [patch("owrx.reporting.pskreporter.Metrics"), patch.object(PskReporter, "scheduleNextUpload")]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.reporter = PskReporter()
+        self.addCleanup(self.reporter.stop)
+        self.addCleanup(self.reporter.uploader.socket.close)
+        # spots are not actually sent anywhere
+        self.uploaded = []
+        self.reporter.uploader.upload = self.uploaded.append
+
+    def testDuplicatesAreDropped(self):
+        self.reporter.spot(getSpot())
+        self.reporter.spot(getSpot())
+        self.reporter.spot(getSpot(db=-5))
+        self.reporter.spot(getSpot(timestamp=1700000015000))
+        self.assertEqual(len(self.reporter.spots), 2)
+        self.assertEqual(self.reporter.dupeCounter.getValue()["count"], 2)
+
+    def testDuplicatesAreDroppedInTheNextWindow(self):
+        self.reporter.spot(getSpot())
+        self.reporter.upload()
+        self.reporter.spot(getSpot())
+        self.reporter.upload()
+        self.reporter.spot(getSpot())
+        self.assertEqual(self.uploaded, [[Uploader().encodeSpot(getSpot())]])
+        self.assertEqual(len(self.reporter.spots), 1)
+
+    def testErroneousSpotsAreNotUploaded(self):
+        self.reporter.spot(getSpot(db="not a number"))
+        self.assertEqual(self.reporter.spots, [])
+
+
+class UploaderTest(TestCase):
+    def setUp(self):
+        config = PropertyLayer(pskreporter_callsign="N0CALL", receiver_gps={"lat": 48.0, "lon": 11.0})
+        patcher = patch("owrx.reporting.pskreporter.Config")
+        patcher.start().get.return_value = config
+        self.addCleanup(patcher.stop)
+        self.uploader = Uploader()
+        self.addCleanup(self.uploader.socket.close)
+
+    def testEncodeSpot(self):
+        self.assertEqual(
+            self.uploader.encodeSpot(getSpot(callsign="Ö1ABC")),
+            b"\x06\xc3\x961ABC" + b"\x00\x00\xd6\xc2\x84" + b"\xf4" + b"\x03FT8" + b"\x04JN58" + b"\x01" + b"\x65\x53\xf1\x00",
+        )
+
+    def testPacketsStayBelowMtu(self):
+        encoded = [self.uploader.encodeSpot(getSpot(callsign="N{}CALL".format(i))) for i in range(200)]
+        packets = self.uploader.getPackets(encoded)
+        self.assertGreater(len(packets), 1)
+        for packet in packets:
+            self.assertLess(len(packet), 1500)
+            self.assertEqual(int.from_bytes(packet[2:4], "big"), len(packet))
+        self.assertEqual(self.uploader.sequence, 200)
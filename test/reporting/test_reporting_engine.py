@@ -0,0 +1,171 @@
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+from owrx.property import PropertyLayer
+from owrx.reporting import ReportingEngine
+from owrx.reporting.queue import ReporterQueue
+from owrx.reporting.reporter import Reporter, FilteredReporter, Backpressure
+import importlib.util
+import threading
+import json
+
+
+class StandInReporter(Reporter):
+    queueSize = 5
+    batchSize = 3
+
+    def __init__(self):
+        self.batches = []
+        self.stopped = False
+        # cleared to simulate a reporter that cannot keep up
+        self.running = threading.Event()
+        self.running.set()
+
+    def stop(self):
+        self.stopped = True
+
+    def spot(self, spot):
+        pass
+
+    def spotBatch(self, spots):
+        self.running.wait()
+        self.batches.append(spots)
+
+    def getSpots(self):
+        return [s for b in self.batches for s in b]
+
+
+class BlockingReporter(StandInReporter):
+    backpressure = Backpressure.BLOCK
+
+
+class FT8Reporter(StandInReporter, FilteredReporter):
+    def getSupportedModes(self):
+        return ["FT8"]
+
+
+class ReporterQueueTest(TestCase):
+    def setUp(self):
+        patcher = patch("owrx.reporting.queue.Metrics")
+        patcher.start().getSharedInstance.return_value.getMetric.return_value = None
+        self.addCleanup(patcher.stop)
+
+    def testSpotsAreDeliveredInBatches(self):
+        reporter = StandInReporter()
+        reporter.running.clear()
+        queue = ReporterQueue("test", reporter)
+        for i in range(5):
+            queue.put({"id": i})
+        reporter.running.set()
+        queue.stop()
+        self.assertEqual([s["id"] for s in reporter.getSpots()], list(range(5)))
+        self.assertTrue(all(len(b) <= 3 for b in reporter.batches))
+        self.assertTrue(reporter.stopped)
+
+    def testOldestSpotsAreDropped(self):
+        reporter = StandInReporter()
+        reporter.running.clear()
+        queue = ReporterQueue("test", reporter)
+        for i in range(20):
+            queue.put({"id": i})
+        self.assertEqual(queue.qsize(), 5)
+        reporter.running.set()
+        queue.stop()
+        # the worker may have picked up the first batch before the reporter got stuck
+        self.assertEqual([s["id"] for s in reporter.getSpots()][-5:], list(range(15, 20)))
+        self.assertGreaterEqual(queue.dropCounter.getValue()["count"], 12)
+
+    def testBlockingQueueKeepsAllSpots(self):
+        reporter = BlockingReporter()
+        reporter.running.clear()
+        queue = ReporterQueue("test", reporter)
+
+        def produce():
+            for i in range(20):
+                queue.put({"id": i})
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        producer.join(0.1)
+        # the producer is held up by the full queue
+        self.assertTrue(producer.is_alive())
+        reporter.running.set()
+        producer.join(5)
+        queue.stop()
+        self.assertEqual([s["id"] for s in reporter.getSpots()], list(range(20)))
+        self.assertEqual(queue.dropCounter.getValue()["count"], 0)
+
+
+class ReportingEngineTest(TestCase):
+    def setUp(self):
+        self.config = PropertyLayer(standin_enabled=True, ft8_enabled=True)
+        patchers = [
+            patch("owrx.reporting.Config"),
+            patch("owrx.reporting.queue.Metrics"),
+            patch.object(ReportingEngine, "reporterClasses", {"standin": StandInReporter, "ft8": FT8Reporter}),
+        ]
+        mocks = [p.start() for p in patchers]
+        for p in patchers:
+            self.addCleanup(p.stop)
+        mocks[0].get.return_value = self.config
+        mocks[1].getSharedInstance.return_value.getMetric.return_value = None
+        self.engine = ReportingEngine()
+
+    def getReporter(self, reporterClass):
+        return next(q.reporter for q in self.engine.reporters if type(q.reporter) is reporterClass)
+
+    def testSpotsAreFilteredAndCopied(self):
+        standin = self.getReporter(StandInReporter)
+        ft8 = self.getReporter(FT8Reporter)
+        spot = {"mode": "FT8", "callsign": "N0CALL"}
+        self.engine.spot(spot)
+        self.engine.spot({"mode": "APRS"})
+        # callers may change their spot after it has been reported
+        spot["callsign"] = "CHANGED"
+        self.engine.stop()
+        self.assertEqual(standin.getSpots(), [{"mode": "FT8", "callsign": "N0CALL"}, {"mode": "APRS"}])
+        self.assertEqual(ft8.getSpots(), [{"mode": "FT8", "callsign": "N0CALL"}])
+
+    def testReporterIsStoppedWhenDisabled(self):
+        ft8 = self.getReporter(FT8Reporter)
+        self.config["ft8_enabled"] = False
+        self.assertTrue(ft8.stopped)
+        self.assertEqual([type(q.reporter) for q in self.engine.reporters], [StandInReporter])
+        self.engine.stop()
+
+
+class StandInMqttClient(object):
+    """
+    Takes the place of the paho client, recording published messages instead of talking to a broker.
+    """
+    def __init__(self, clientId):
+        self.published = []
+
+    def connect(self, host, port):
+        pass
+
+    def loop_forever(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload):
+        self.published.append((topic, json.loads(payload)))
+
+
+@skipUnless(importlib.util.find_spec("paho"), "paho-mqtt is not installed")
+class MqttReporterTest(TestCase):
+    def testSpotsArePublished(self):
+        from owrx.reporting.mqtt import MqttReporter
+
+        config = PropertyLayer(mqtt_host="localhost", mqtt_use_ssl=False)
+        with patch("owrx.reporting.mqtt.Config") as configMock, \
+                patch("owrx.reporting.mqtt.Client", StandInMqttClient), \
+                patch("owrx.reporting.queue.Metrics") as metricsMock:
+            configMock.get.return_value = config
+            metricsMock.getSharedInstance.return_value.getMetric.return_value = None
+            reporter = MqttReporter()
+            queue = ReporterQueue("mqtt", reporter)
+            queue.put({"mode": "FT8", "callsign": "N0CALL"})
+            queue.stop()
+            self.assertEqual(reporter.client.published, [("openwebrx/FT8", {"mode": "FT8", "callsign": "N0CALL"})])
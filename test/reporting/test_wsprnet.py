@@ -0,0 +1,191 @@
+from unittest import TestCase
+from unittest.mock import patch
+from owrx.property import PropertyLayer
+from owrx.reporting.wsprnet import WsprnetReporter, Worker, Spool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib import parse
+import tempfile
+import threading
+import json
+import os
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        spot = parse.parse_qs(body.decode())
+        with server.lock:
+            if server.redirect is not None and self.path != server.redirect:
+                status = 301
+            elif server.failing:
+                status = 500
+            elif spot["tcall"][0] in server.rejected:
+                status = 400
+            else:
+                status = 200
+                server.spots.append(spot)
+                server.connections.add(self.client_address)
+            server.requests += 1
+            server.received.notify_all()
+        self.send_response(status)
+        if status == 301:
+            self.send_header("Location", server.redirect)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Takes the place of wsprnet.org, recording the posted spots.
+    """
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.spots = []
+        self.connections = set()
+        self.failing = False
+        # callsigns answered with HTTP 400
+        self.rejected = set()
+        # path that other paths are redirected to
+        self.redirect = None
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.received = threading.Condition(self.lock)
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+
+    def getUrl(self):
+        return "http://127.0.0.1:{0}/post/".format(self.server_address[1])
+
+    def waitForSpots(self, count):
+        with self.received:
+            return self.received.wait_for(lambda: len(self.spots) >= count, timeout=5)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def getSpot(callsign):
+    return {
+        "timestamp": 1610655960000,
+        "db": -23.0,
+        "dt": 0.3,
+        "freq": 7040048,
+        "drift": -1,
+        "msg": "{0} JO59 37".format(callsign),
+        "callsign": callsign,
+        "locator": "JO59",
+        "dbm": 37,
+        "mode": "WSPR",
+        "interval": 120,
+    }
+
+
+class WsprnetTest(TestCase):
+    def setUp(self):
+        self.server = StandInServer()
+        self.addCleanup(self.server.stop)
+        config = PropertyLayer(
+            wsprnet_callsign="N0CALL", wsprnet_url=self.server.getUrl(), receiver_gps={"lat": 48.0, "lon": 11.0}
+        )
+        for patcher in [patch("owrx.reporting.wsprnet.Config"), patch("owrx.reporting.wsprnet.Metrics")]:
+            mock = patcher.start()
+            self.addCleanup(patcher.stop)
+            mock.get.return_value = config
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spoolFile = os.path.join(directory.name, "wsprnet_spool.json")
+
+    def getSpooledCallsigns(self):
+        with open(self.spoolFile, "r") as f:
+            return [s["callsign"] for b in json.load(f) for s in b]
+
+    def testBatchIsUploadedOverOneConnection(self):
+        reporter = WsprnetReporter(Spool(self.spoolFile))
+        self.addCleanup(reporter.stop)
+        reporter.spotBatch([getSpot("DF2UU"), getSpot("LA3JJ")])
+        reporter.spot(getSpot("DD5JFK"))
+        # nothing is sent before the batch is complete
+        self.assertEqual(self.server.spots, [])
+        reporter.flush()
+        self.assertTrue(self.server.waitForSpots(3))
+        self.assertEqual([s["tcall"][0] for s in self.server.spots], ["DF2UU", "LA3JJ", "DD5JFK"])
+        self.assertEqual(self.server.spots[0]["rcall"], ["N0CALL"])
+        self.assertEqual(len(self.server.connections), 1)
+
+    def testUnsentSpotsAreSpooled(self):
+        self.server.failing = True
+        reporter = WsprnetReporter(Spool(self.spoolFile))
+        reporter.spotBatch([getSpot("DF2UU"), getSpot("LA3JJ")])
+        reporter.stop()
+        self.assertEqual(self.getSpooledCallsigns(), ["DF2UU", "LA3JJ"])
+
+        # sent by the next worker
+        self.server.failing = False
+        worker = Worker(Spool(self.spoolFile))
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.assertTrue(self.server.waitForSpots(2))
+        with worker.condition:
+            worker.condition.wait_for(lambda: not worker.batches, timeout=5)
+        self.assertEqual(self.getSpooledCallsigns(), [])
+
+    def runWorker(self, batch):
+        spool = Spool(self.spoolFile)
+        spool.store([batch])
+        worker = Worker(spool)
+        worker.start()
+        self.addCleanup(worker.stop)
+        with worker.condition:
+            self.assertTrue(worker.condition.wait_for(lambda: not worker.batches, timeout=5))
+        return worker
+
+    def testRejectedSpotsAreDropped(self):
+        self.server.rejected.add("LA3JJ")
+        worker = self.runWorker([getSpot("DF2UU"), getSpot("LA3JJ"), getSpot("DD5JFK")])
+        self.assertEqual([s["tcall"][0] for s in self.server.spots], ["DF2UU", "DD5JFK"])
+        self.assertEqual(worker.failures, 0)
+        self.assertEqual(self.getSpooledCallsigns(), [])
+
+    def testRedirectsAreFollowed(self):
+        self.server.redirect = "/moved/"
+        self.runWorker([getSpot("DF2UU"), getSpot("LA3JJ")])
+        self.assertEqual([s["tcall"][0] for s in self.server.spots], ["DF2UU", "LA3JJ"])
+        # only the first spot was redirected
+        self.assertEqual(self.server.requests, 3)
+
+    def testServerErrorsAreRetried(self):
+        self.server.failing = True
+        worker = Worker(Spool(self.spoolFile))
+        with patch.object(worker, "getRetryDelay", return_value=0.05):
+            worker.start()
+            self.addCleanup(worker.stop)
+            worker.addBatch([getSpot("DF2UU")])
+            with self.server.received:
+                self.assertTrue(self.server.received.wait_for(lambda: self.server.requests >= 2, timeout=5))
+            self.server.failing = False
+            self.assertTrue(self.server.waitForSpots(1))
+            with worker.condition:
+                self.assertTrue(worker.condition.wait_for(lambda: not worker.batches, timeout=5))
+
+    def testSpoolIsLimited(self):
+        spool = Spool(self.spoolFile)
+        spool.maxSpots = 3
+        batches = [[getSpot("DF2UU"), getSpot("LA3JJ")], [getSpot("DD5JFK"), getSpot("N0CALL")]]
+        spool.store(batches)
+        self.assertEqual(self.getSpooledCallsigns(), ["DD5JFK", "N0CALL"])
+
+    def testRetryDelayGrowsExponentially(self):
+        worker = Worker(Spool(self.spoolFile))
+        delays = []
+        for failures in range(1, 12):
+            worker.failures = failures
+            delays.append(worker.getRetryDelay())
+        self.assertEqual(delays[:4], [10, 20, 40, 80])
+        self.assertEqual(delays[-1], Worker.maxRetryDelay)
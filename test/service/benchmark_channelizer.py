@@ -0,0 +1,114 @@
+"""
+Benchmark comparing the CPU time of the service channelizer with the Shift + FirDecimate resampler groups it can
+replace. Needs numpy, and pycsdr for the resampler part.
+
+Run with: python3 -m test.service.benchmark_channelizer
+"""
+from owrx.source.channelizer import Channelizer
+from owrx.property import PropertyLayer
+import numpy
+import threading
+import time
+
+SAMPLE_RATE = 2400000
+CENTER_FREQ = 14100000
+SECONDS = 5
+# center frequencies and bandwidths of typical resampler groups on a 2.4MS/s HF source
+GROUPS = [
+    (14074000, 30000),
+    (14080000, 25000),
+    (14095600, 25000),
+    (14105000, 25000),
+    (13530000, 25000),
+    (14670000, 25000),
+    (14230000, 60000),
+    (13800000, 40000),
+    (14450000, 25000),
+    (14900000, 25000),
+]
+
+
+class SyntheticSource(object):
+    def getProps(self):
+        return PropertyLayer(center_freq=CENTER_FREQ, samp_rate=SAMPLE_RATE)
+
+
+def synthetic_iq():
+    rng = numpy.random.default_rng(0)
+    samples = SAMPLE_RATE * SECONDS
+    return (rng.standard_normal(samples) + 1j * rng.standard_normal(samples)).astype(numpy.complex64)
+
+
+def run_channelizer(iq, channels):
+    channelizer = Channelizer(SyntheticSource())
+    for cf, bw in GROUPS[:channels]:
+        channelizer.addChannel(cf, bw)
+    step = channelizer.step
+    block = numpy.zeros(channelizer.fftSize, dtype=numpy.complex64)
+    overlap = channelizer.fftSize - step
+    start = time.process_time()
+    for i in range(len(iq) // step):
+        block[:overlap] = block[step:]
+        block[overlap:] = iq[i * step:(i + 1) * step]
+        channelizer.process(block, i)
+    return time.process_time() - start
+
+
+def run_resamplers(iq, channels):
+    from csdr.chain import Chain
+    from pycsdr.modules import Buffer, FirDecimate, Shift
+    from pycsdr.types import Format
+
+    source = Buffer(Format.COMPLEX_FLOAT)
+    chains = []
+    readers = []
+    for cf, bw in GROUPS[:channels]:
+        shift = (CENTER_FREQ - cf) / SAMPLE_RATE
+        decimation = int(SAMPLE_RATE / bw)
+        transition_bw = 0.15 * (1 / decimation)
+        chain = Chain([Shift(shift), FirDecimate(decimation, transition_bw)])
+        chain.setReader(source.getReader())
+        output = Buffer(Format.COMPLEX_FLOAT)
+        chain.setWriter(output)
+        chains.append(chain)
+        readers.append(output.getReader())
+
+    def drain(reader):
+        while reader.read() is not None:
+            pass
+
+    threads = [threading.Thread(target=drain, args=(r,)) for r in readers]
+    for t in threads:
+        t.start()
+    start = time.process_time()
+    chunk = 65536
+    for i in range(0, len(iq), chunk):
+        source.write(iq[i:i + chunk].tobytes())
+    # give the workers some time to process the remaining data
+    time.sleep(1)
+    used = time.process_time() - start
+    for c in chains:
+        c.stop()
+    for r in readers:
+        r.stop()
+    return used
+
+
+def run():
+    iq = synthetic_iq()
+    try:
+        import pycsdr.modules
+        resamplers = True
+    except ImportError:
+        print("pycsdr not available, only measuring the channelizer")
+        resamplers = False
+    print("{} seconds of {} S/s IQ data, CPU seconds used:".format(SECONDS, SAMPLE_RATE))
+    print("{:>9} {:>12} {:>12}".format("channels", "channelizer", "resamplers"))
+    for channels in [1, 2, 4, 6, 10]:
+        channelizer = run_channelizer(iq, channels)
+        resampler = "{:.2f}".format(run_resamplers(iq, channels)) if resamplers else "n/a"
+        print("{:>9} {:>12.2f} {:>12}".format(channels, channelizer, resampler))
+
+
+if __name__ == "__main__":
+    run()
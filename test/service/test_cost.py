@@ -0,0 +1,78 @@
+from unittest import TestCase
+from owrx.service.cost import BandwidthCostModel, MeasuredCostModel, findResamplingPlan
+import itertools
+import random
+
+
+def get_bandwidth(group):
+    frequencies = [f["frequency"] for f in group]
+    return max((max(frequencies) - min(frequencies) + 3000) * 1.15, 25000)
+
+
+class FixedCostModel(MeasuredCostModel):
+    def __init__(self):
+        super().__init__()
+        self.resamplerCosts = [(4, 4e-9), (64, 2e-9)]
+        self.selectorCosts = [(24000, 10e-9), (3072000, 20e-9)]
+
+
+def partitions(items):
+    # all ways to split a sorted list into contiguous groups
+    for cuts in itertools.product([False, True], repeat=len(items) - 1):
+        groups = [[items[0]]]
+        for item, cut in zip(items[1:], cuts):
+            if cut:
+                groups.append([item])
+            else:
+                groups[-1].append(item)
+        yield groups
+
+
+class ResamplingPlanTest(TestCase):
+    sampleRate = 2400000
+
+    def bruteForce(self, freqs, model):
+        def cost(groups):
+            total = 0
+            for group in groups:
+                if len(group) > 1:
+                    bandwidth = get_bandwidth(group)
+                    outputRate = self.sampleRate / max(1, int(self.sampleRate / bandwidth))
+                    grouped = model.resamplerCost(self.sampleRate, outputRate) + len(group) * model.selectorCost(outputRate)
+                    total += min(grouped, len(group) * model.selectorCost(self.sampleRate))
+                else:
+                    total += model.selectorCost(self.sampleRate)
+            return total
+
+        return min(cost(groups) for groups in partitions(sorted(freqs, key=lambda f: f["frequency"])))
+
+    def randomDials(self, count):
+        return [{"frequency": 14000000 + random.randrange(0, self.sampleRate)} for _ in range(count)]
+
+    def testEmpty(self):
+        self.assertIsNone(findResamplingPlan([], self.sampleRate, BandwidthCostModel(), get_bandwidth))
+
+    def testSingleDialIsNotResampled(self):
+        plan = findResamplingPlan(self.randomDials(1), self.sampleRate, BandwidthCostModel(), get_bandwidth)
+        self.assertEqual(plan.getResampledGroups(), [])
+
+    def testCloseDialsAreGrouped(self):
+        dials = [{"frequency": f} for f in [14074000, 14080000, 14095600, 15000000]]
+        plan = findResamplingPlan(dials, self.sampleRate, BandwidthCostModel(), get_bandwidth)
+        self.assertEqual(plan.getResampledGroups(), [dials[0:3]])
+        self.assertEqual(len(plan.groups), 2)
+
+    def testPlanIsOptimal(self):
+        random.seed(42)
+        for model in [BandwidthCostModel(), FixedCostModel()]:
+            for count in range(1, 9):
+                dials = self.randomDials(count)
+                plan = findResamplingPlan(dials, self.sampleRate, model, get_bandwidth)
+                self.assertAlmostEqual(plan.cost, self.bruteForce(dials, model))
+                self.assertEqual(sum(len(g) for g in plan.groups), count)
+
+    def testInterpolation(self):
+        model = FixedCostModel()
+        self.assertAlmostEqual(model.resamplerCost(2400000, 2400000 / 16), 3e-9 * 2400000)
+        self.assertAlmostEqual(model.selectorCost(12000), 10e-9 * 12000)
+        self.assertAlmostEqual(model.selectorCost(6144000), 20e-9 * 6144000)
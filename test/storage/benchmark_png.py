@@ -0,0 +1,47 @@
+"""
+Benchmark for the image conversion, encoding a fax page and an SSTV image to PNG in process with every supported
+filter, and, if ImageMagick is installed, converting the same files with it for comparison.
+
+Run with: python3 -m test.storage.benchmark_png
+"""
+from owrx.storage import BmpImage, encodePng, PNG_FILTERS
+from test.storage.test_png import bmpFile
+from test.image.stream import faxLine
+import subprocess
+import tempfile
+import shutil
+import time
+import os
+
+LEVEL = 7
+# IOC 576 fax page and a Scottie 1 SSTV image
+IMAGES = {
+    "fax 1809x1200": lambda: bmpFile(1809, 1200, 8, [faxLine(1809, 0, y) for y in range(1200)]),
+    "sstv 320x256": lambda: bmpFile(320, 256, 24, [bytes((x // 3 + y) & 0xFF for x in range(960)) for y in range(256)]),
+}
+
+
+def main():
+    for name, make in IMAGES.items():
+        data = make()
+        for filter in PNG_FILTERS:
+            start = time.perf_counter()
+            png = encodePng(BmpImage.parse(data), LEVEL, filter)
+            elapsed = time.perf_counter() - start
+            print("{:<40} {:>10.1f} ms {:>10} bytes".format("{} filter {}".format(name, filter), elapsed * 1e3, len(png)))
+
+        if shutil.which("convert") is None:
+            continue
+        with tempfile.TemporaryDirectory() as dir:
+            inFile = os.path.join(dir, "image.bmp")
+            outFile = os.path.join(dir, "image.png")
+            with open(inFile, "wb") as f:
+                f.write(data)
+            start = time.perf_counter()
+            subprocess.check_call(["convert", inFile, "-define", "png:compression-level={}".format(LEVEL), outFile])
+            elapsed = time.perf_counter() - start
+            print("{:<40} {:>10.1f} ms {:>10} bytes".format(name + " imagemagick", elapsed * 1e3, os.path.getsize(outFile)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+from unittest import TestCase
+from unittest.mock import patch, Mock
+from owrx.storage import FileFinalizer, DataRecorder, Storage
+from owrx.metrics import HistogramMetric
+from test.storage.test_png import bmpFile
+import tempfile
+import threading
+import os
+
+
+class FileFinalizerTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.config = {
+            "keep_files": 20,
+            "image_compress": True,
+            "image_compress_level": "7",
+            "image_compress_filter": "5",
+            "image_quantize": False,
+            "image_quantize_colors": "256",
+        }
+        config = patch("owrx.storage.Config")
+        config.start().get.return_value = self.config
+        self.addCleanup(config.stop)
+        coreConfig = patch("owrx.storage.CoreConfig")
+        coreConfig.start().return_value.get_temporary_directory.return_value = self.dir.name
+        self.addCleanup(coreConfig.stop)
+        metrics = patch("owrx.storage.Metrics")
+        self.metrics = metrics.start().getSharedInstance.return_value
+        self.metrics.getMetric.return_value = None
+        self.addCleanup(metrics.stop)
+        self.finalizer = FileFinalizer()
+
+    def writeImage(self, name, width=64, height=64):
+        rows = [bytes((x + y) & 0xFF for x in range(width)) for y in range(height)]
+        path = os.path.join(self.dir.name, name)
+        with open(path, "wb") as f:
+            f.write(bmpFile(width, height, 8, rows))
+        return path
+
+    @staticmethod
+    def fakeConvert(params):
+        # stands in for ImageMagick, writing the output file
+        with open(params[-1], "wb") as f:
+            f.write(b"PNG")
+
+    def latencyMetrics(self):
+        return {
+            call.args[0]: call.args[1] for call in self.metrics.addMetric.call_args_list
+            if isinstance(call.args[1], HistogramMetric)
+        }
+
+    def testConvertsInProcess(self):
+        path = self.writeImage("FAX-240101-120000.bmp")
+        with patch("owrx.storage.subprocess.check_call") as convert:
+            self.finalizer.convertImage(path)
+            self.finalizer.join()
+        convert.assert_not_called()
+        self.assertEqual(os.listdir(self.dir.name), ["FAX-240101-120000.png"])
+        self.assertEqual(self.latencyMetrics()["storage.convert.latency.png"].getValue()["count"], 1)
+
+    def testUsesImageMagickOtherwise(self):
+        # average filter is not implemented in process
+        self.config["image_compress_filter"] = "3"
+        path = self.writeImage("FAX-240101-120000.bmp")
+        with patch("owrx.storage.subprocess.check_call", side_effect=self.fakeConvert) as convert:
+            self.finalizer.convertImage(path)
+            self.finalizer.join()
+        convert.assert_called_once()
+        self.assertIn("png:compression-filter=3", convert.call_args.args[0])
+        self.assertIn("storage.convert.latency.imagemagick", self.latencyMetrics())
+        self.assertEqual(os.listdir(self.dir.name), ["FAX-240101-120000.png"])
+
+    def testLargeImagesUseImageMagick(self):
+        path = self.writeImage("FAX-240101-120000.bmp")
+        with patch.object(Storage, "maxEncodeBytes", 1024), \
+                patch("owrx.storage.subprocess.check_call", side_effect=self.fakeConvert) as convert:
+            self.finalizer.convertImage(path)
+            self.finalizer.join()
+        convert.assert_called_once()
+
+    def testOverflowFinalizesOnCaller(self):
+        blocked = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def convertImage(path):
+            calls.append((path, threading.current_thread()))
+            if path.startswith("block"):
+                blocked.set()
+                release.wait(5)
+            return "png"
+
+        with patch.object(FileFinalizer, "queueLength", 1), patch.object(FileFinalizer, "workers", 1):
+            finalizer = FileFinalizer()
+        # conversions only, without their cleanups
+        finalizer.cleanStoredFiles = Mock()
+        with patch.object(Storage, "convertImage", side_effect=convertImage):
+            finalizer.convertImage("block")
+            self.assertTrue(blocked.wait(5))
+            finalizer.convertImage("queued")
+            finalizer.convertImage("overflow")
+            # the overflowing job has been run right away
+            self.assertEqual(calls[-1], ("overflow", threading.current_thread()))
+            release.set()
+            finalizer.join()
+        self.assertEqual([c[0] for c in calls], ["block", "overflow", "queued"])
+        self.assertEqual(finalizer.overflowCounter.getValue(), {"count": 1})
+
+    def testCleanupsAreCoalesced(self):
+        with patch.object(Storage, "cleanStoredFiles") as clean, patch.object(self.finalizer, "_put") as put:
+            self.finalizer.cleanStoredFiles()
+            self.finalizer.cleanStoredFiles()
+            put.assert_called_once_with(None)
+            self.finalizer._process(None)
+            self.finalizer.cleanStoredFiles()
+            self.assertEqual(put.call_count, 2)
+            clean.assert_called_once()
+
+    def testCleanupFollowsConversion(self):
+        calls = []
+        with patch.object(Storage, "convertImage", side_effect=lambda path: calls.append("convert") or "png"), \
+                patch.object(Storage, "cleanStoredFiles", side_effect=lambda: calls.append("clean")):
+            self.finalizer.convertImage("FAX-240101-120000.bmp")
+            self.finalizer.join()
+        self.assertEqual(calls, ["convert", "clean"])
+
+    def testCleanupSkipsImagesBeingConverted(self):
+        self.config["keep_files"] = 0
+        path = self.writeImage("FAX-240101-120000.bmp")
+        storage = Storage()
+        storage.converting.add(path)
+        storage.cleanStoredFiles()
+        self.assertTrue(os.path.exists(path))
+        storage.converting.clear()
+        storage.cleanStoredFiles()
+        self.assertFalse(os.path.exists(path))
+
+    def testCloseImage(self):
+        recorder = DataRecorder("FAX", ".bmp")
+        with patch.object(FileFinalizer, "getSharedInstance", return_value=self.finalizer):
+            rows = [bytes(16)] * 100
+            data = bmpFile(16, 100, 8, rows)
+            # only 80 lines have been received
+            recorder.writeFile(data[:-16 * 20])
+            recorder.closeImage(80, 100)
+            self.finalizer.join()
+        files = os.listdir(self.dir.name)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith(".png"))
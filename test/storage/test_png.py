@@ -0,0 +1,118 @@
+from unittest import TestCase
+from owrx.storage import BmpImage, encodePng
+import struct
+import zlib
+
+
+def bmpFile(width: int, height: int, depth: int, rows: list, palette: bytes = None, bottomUp: bool = False, pad: bool = True) -> bytes:
+    # BMP file as written by the image decoders
+    if depth == 8 and palette is None:
+        palette = b"".join(bytes([i, i, i, 0]) for i in range(256))
+    palette = palette or b""
+    rowBytes = width * depth // 8
+    stride = (rowBytes + 3) & ~3 if pad else rowBytes
+    pixels = b"".join(r + bytes(stride - rowBytes) for r in (reversed(rows) if bottomUp else rows))
+    offset = 54 + len(palette)
+    header = struct.pack(
+        "<2sIHHIIiiHHIIiiII",
+        b"BM", offset + len(pixels), 0, 0, offset, 40, width, height if bottomUp else -height, 1, depth, 0,
+        len(pixels), 0, 0, len(palette) // 4 if depth == 8 else 0, 0,
+    )
+    return header + palette + pixels
+
+
+def decodePng(data: bytes):
+    # minimal decoder for the PNG files written by encodePng()
+    assert data[0:8] == b"\x89PNG\r\n\x1a\n"
+    pos = 8
+    chunks = {}
+    while pos < len(data):
+        length, kind = struct.unpack_from(">I4s", data, pos)
+        body = data[pos + 8 : pos + 8 + length]
+        crc, = struct.unpack_from(">I", data, pos + 8 + length)
+        assert crc == zlib.crc32(kind + body)
+        chunks[kind] = body
+        pos += 12 + length
+    width, height, bits, colorType = struct.unpack_from(">IIBB", chunks[b"IHDR"])
+    bpp = 3 if colorType == 2 else 1
+    raw = zlib.decompress(chunks[b"IDAT"])
+    rowBytes = width * bpp
+    rows = []
+    prev = bytes(rowBytes)
+    filters = set()
+    for i in range(height):
+        line = raw[i * (rowBytes + 1) : (i + 1) * (rowBytes + 1)]
+        filters.add(line[0])
+        row = bytearray(line[1:])
+        for x in range(rowBytes):
+            if line[0] == 1:
+                row[x] = (row[x] + (row[x - bpp] if x >= bpp else 0)) & 0xFF
+            elif line[0] == 2:
+                row[x] = (row[x] + prev[x]) & 0xFF
+            else:
+                assert line[0] == 0
+        rows.append(bytes(row))
+        prev = row
+    return width, height, colorType, chunks.get(b"PLTE"), rows, filters
+
+
+class PngEncoderTest(TestCase):
+    def grayRows(self, width, height):
+        return [bytes((x * 7 + y * 13) & 0xFF for x in range(width)) for y in range(height)]
+
+    def testGrayscale(self):
+        rows = self.grayRows(37, 11)
+        image = BmpImage.parse(bmpFile(37, 11, 8, rows))
+        self.assertTrue(image.isGrayscale())
+        for filter in [0, 1, 2, 5]:
+            width, height, colorType, palette, decoded, _ = decodePng(encodePng(image, 6, filter))
+            self.assertEqual((width, height, colorType, palette), (37, 11, 0, None))
+            self.assertEqual(decoded, rows)
+
+    def testFilters(self):
+        image = BmpImage.parse(bmpFile(16, 4, 8, self.grayRows(16, 4)))
+        self.assertEqual(decodePng(encodePng(image, 6, 1))[5], {1})
+        self.assertEqual(decodePng(encodePng(image, 6, 2))[5], {2})
+
+    def testColor(self):
+        # BMP pixels are BGR
+        rows = [bytes((x * 3 + c * 50 + y) & 0xFF for x in range(10) for c in range(3)) for y in range(5)]
+        image = BmpImage.parse(bmpFile(10, 5, 24, rows, bottomUp=True))
+        for filter in [0, 1, 2, 5]:
+            width, height, colorType, _, decoded, _ = decodePng(encodePng(image, 6, filter))
+            self.assertEqual((width, height, colorType), (10, 5, 2))
+            for bgr, rgb in zip(rows, decoded):
+                self.assertEqual(rgb[0::3], bgr[2::3])
+                self.assertEqual(rgb[1::3], bgr[1::3])
+                self.assertEqual(rgb[2::3], bgr[0::3])
+
+    def testPalette(self):
+        palette = b"".join(bytes([i, 255 - i, 0, 0]) for i in range(256))
+        rows = self.grayRows(9, 3)
+        image = BmpImage.parse(bmpFile(9, 3, 8, rows, palette=palette))
+        self.assertFalse(image.isGrayscale())
+        _, _, colorType, plte, decoded, filters = decodePng(encodePng(image, 6, 5))
+        self.assertEqual(colorType, 3)
+        self.assertEqual(plte[0:6], bytes([0, 255, 0, 0, 254, 1]))
+        self.assertEqual(decoded, rows)
+        self.assertEqual(filters, {0})
+
+    def testUnpaddedRows(self):
+        rows = self.grayRows(37, 11)
+        image = BmpImage.parse(bmpFile(37, 11, 8, rows, pad=False))
+        self.assertEqual(decodePng(encodePng(image))[4], rows)
+
+    def testTruncatedFile(self):
+        rows = self.grayRows(40, 10)
+        image = BmpImage.parse(bmpFile(40, 10, 8, rows)[:-100])
+        self.assertEqual(image.height, 7)
+        self.assertEqual(decodePng(encodePng(image))[4], rows[0:7])
+
+    def testUnsupported(self):
+        self.assertIsNone(BmpImage.parse(b"GIF89a" + bytes(100)))
+        self.assertIsNone(BmpImage.parse(bmpFile(4, 4, 24, [bytes(12)] * 4)[:-48]))
+
+    def testQuantize(self):
+        image = BmpImage.parse(bmpFile(256, 1, 8, [bytes(range(256))]))
+        image.quantize(4)
+        self.assertEqual(set(decodePng(encodePng(image))[4][0]), {0, 85, 170, 255})
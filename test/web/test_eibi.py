@@ -0,0 +1,62 @@
+from unittest import TestCase
+from owrx.web.eibi import EibiIndex, EIBI, EIBI_Locations
+import random
+
+
+class EibiIndexTest(TestCase):
+    rxPos = (52.5, 13.4)
+
+    def randomEntries(self, count):
+        sources = random.sample(sorted(EIBI_Locations.keys()), 20) + ["unknown"]
+        entries = []
+        for _ in range(count):
+            time1 = random.randrange(0, 24) * 100 + random.choice([0, 15, 30, 45])
+            time2 = random.randrange(0, 24) * 100 + random.choice([0, 15, 30, 45])
+            days = "".join(str(d + 1) if random.random() < 0.6 else "." for d in range(7))
+            entries.append({
+                "freq": random.randrange(100, 200) * 5000,
+                "time1": time1,
+                "time2": time2,
+                "days": days,
+                "src": random.choice(sources),
+            })
+        return entries
+
+    def testFrequencyRange(self):
+        random.seed(1)
+        entries = self.randomEntries(500)
+        index = EibiIndex(entries, self.rxPos)
+        for _ in range(100):
+            f1 = random.randrange(500000, 1000000)
+            f2 = f1 + random.randrange(0, 100000)
+            expected = [(i, e) for i, e in enumerate(entries) if f1 <= e["freq"] <= f2]
+            self.assertEqual(sorted(index.inFrequencyRange(f1, f2), key=lambda x: x[0]), expected)
+
+    def testTimeRange(self):
+        random.seed(2)
+        entries = self.randomEntries(500)
+        index = EibiIndex(entries, self.rxPos)
+        for _ in range(200):
+            day = random.randrange(0, 7)
+            t1 = random.randrange(0, 24) * 100 + random.randrange(0, 60)
+            t2 = t1 + random.randrange(0, 3) * 100
+
+            def active(e):
+                e1 = e["time1"]
+                e2 = e["time2"] if e["time2"] > e1 else e["time2"] + 2400
+                return e["days"][day] != "." and e1 < t2 and e2 > t1
+
+            self.assertEqual(index.inTimeRange(day, t1, t2), [e for e in entries if active(e)])
+
+    def testDistances(self):
+        random.seed(3)
+        entries = self.randomEntries(50)
+        index = EibiIndex(entries, self.rxPos)
+        for entry, distance in zip(entries, index.distances):
+            if entry["src"] not in EIBI_Locations:
+                self.assertIsNone(distance)
+            else:
+                self.assertEqual(
+                    distance,
+                    min(EIBI.distKm(self.rxPos, (loc["lat"], loc["lon"])) for loc in EIBI_Locations[entry["src"]])
+                )
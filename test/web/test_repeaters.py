@@ -0,0 +1,42 @@
+from unittest import TestCase
+from owrx.web.repeaters import RepeaterIndex, Repeaters
+import random
+
+
+class RepeaterIndexTest(TestCase):
+    rxPos = (52.5, 13.4)
+
+    def randomEntries(self, count):
+        return [{
+            "name": "R{}".format(i),
+            "lat": 52.5 + random.uniform(-2, 2),
+            "lon": 13.4 + random.uniform(-3, 3),
+            "freq": 145000000 + random.randrange(0, 80) * 12500,
+            "mode": "nfm",
+        } for i in range(count)]
+
+    def testFrequencyRange(self):
+        random.seed(1)
+        entries = self.randomEntries(300)
+        index = RepeaterIndex(entries, self.rxPos)
+        for _ in range(50):
+            f1 = 145000000 + random.randrange(0, 80) * 12500
+            f2 = f1 + random.randrange(0, 20) * 12500
+            expected = sorted(
+                [(e, Repeaters.distKm(self.rxPos, (e["lat"], e["lon"]))) for e in entries if f1 <= e["freq"] <= f2],
+                key=lambda x: x[0]["freq"],
+            )
+            self.assertEqual(index.inFrequencyRange(f1, f2), expected)
+
+    def testDistanceRange(self):
+        random.seed(2)
+        entries = self.randomEntries(300)
+        index = RepeaterIndex(entries, self.rxPos)
+        for rangeKm in [0, 10, 50, 100, 200, 1000]:
+            expected = [e for e in entries if Repeaters.distKm(self.rxPos, (e["lat"], e["lon"])) <= rangeKm]
+            self.assertEqual(index.inDistanceRange(rangeKm), expected)
+
+    def testSkipsInvalidEntries(self):
+        entries = [{"name": "R1", "freq": 145000000}] + self.randomEntries(1)
+        index = RepeaterIndex(entries, self.rxPos)
+        self.assertEqual(index.inDistanceRange(1000), entries[1:])
@@ -0,0 +1,29 @@
+"""
+Micro-benchmark comparing the websocket unmasking routine to the per-byte list comprehension it replaced.
+
+Run with: python3 -m test.websocket.benchmark_unmask
+"""
+from owrx.websocket import unmask
+import os
+import timeit
+
+
+def unmask_bytewise(data: bytes, masking_key: bytes) -> bytes:
+    return bytes([b ^ masking_key[index % 4] for (index, b) in enumerate(data)])
+
+
+def run():
+    key = os.urandom(4)
+    print("{:>10} {:>14} {:>14} {:>8}".format("size", "bytewise MB/s", "unmask MB/s", "speedup"))
+    for size in [64, 1024, 16 * 1024, 256 * 1024, 1024 * 1024]:
+        data = os.urandom(size)
+        assert unmask(data, key) == unmask_bytewise(data, key)
+        number = max(1, 4 * 1024 * 1024 // size)
+        old = min(timeit.repeat(lambda: unmask_bytewise(data, key), number=number, repeat=3))
+        new = min(timeit.repeat(lambda: unmask(data, key), number=number, repeat=3))
+        total = size * number / 1e6
+        print("{:>10} {:>14.1f} {:>14.1f} {:>7.1f}x".format(size, total / old, total / new, old / new))
+
+
+if __name__ == "__main__":
+    run()
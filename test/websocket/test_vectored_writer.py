@@ -0,0 +1,47 @@
+from unittest import TestCase
+from owrx.websocket import VectoredWriter
+
+
+class FakeSocket(object):
+    def __init__(self, limit: int):
+        # bytes accepted per sendmsg() call
+        self.limit = limit
+        self.received = bytearray()
+
+    def sendmsg(self, buffers):
+        data = b"".join(bytes(b) for b in buffers)[0:self.limit]
+        self.received += data
+        return len(data)
+
+
+class VectoredWriterTest(TestCase):
+    def testWritesFrames(self):
+        sock = FakeSocket(5)
+        writer = VectoredWriter(sock)
+        writer.append(b"abc")
+        writer.append(b"defgh", droppable=True)
+        self.assertTrue(writer.writeAvailable())
+        self.assertEqual(bytes(sock.received), b"abcdefgh")
+        self.assertEqual(writer.getStats()["frames_sent"], 2)
+
+    def testSentFramesAreNotDropped(self):
+        sock = FakeSocket(6)
+        writer = VectoredWriter(sock)
+        writer.maxQueuedBytes = 8
+        writer.append(b"aaaa", droppable=True)
+        writer.append(b"bbbb", droppable=True)
+
+        consume = writer._consume
+
+        def appendBeforeConsume(sent):
+            # another thread queueing a frame after sendmsg() returned, going over the limit
+            writer._consume = consume
+            writer.append(b"cccc", droppable=True)
+            consume(sent)
+
+        writer._consume = appendBeforeConsume
+        self.assertTrue(writer.writeAvailable())
+        # the frames handed to sendmsg() must be completed, the new frame is dropped instead
+        self.assertEqual(bytes(sock.received), b"aaaabbbb")
+        self.assertEqual(writer.getStats()["bytes_queued"], 0)
+        self.assertEqual(writer.getStats()["frames_dropped"], 1)
@@ -0,0 +1,38 @@
+from unittest import TestCase
+from unittest.mock import Mock
+from owrx.websocket import WebSocketLoop, AsyncWebSocketConnection, Handler
+from test.websocket.test_websocket_read import FakeRequestHandler
+import socket
+import time
+
+
+class DetachingRequestHandler(FakeRequestHandler):
+    def detach(self):
+        pass
+
+
+class WebSocketLoopTest(TestCase):
+    def setUp(self):
+        self.loop = WebSocketLoop(handlerThreads=1)
+        WebSocketLoop.sharedInstance = self.loop
+        self.addCleanup(setattr, WebSocketLoop, "sharedInstance", None)
+        (self.server, self.client) = socket.socketpair()
+        self.addCleanup(self.client.close)
+        self.handler = Mock(spec=Handler)
+        # a handler that takes a while to clean up
+        self.handler.handleClose.side_effect = lambda: time.sleep(0.2)
+        self.connection = AsyncWebSocketConnection(DetachingRequestHandler(self.server), self.handler)
+        self.connection.handle()
+
+    def testStopWaitsForCloseFrames(self):
+        self.connection.close()
+        self.loop.stop()
+        self.handler.handleClose.assert_called_once()
+        self.client.settimeout(1)
+        data = b""
+        while True:
+            chunk = self.client.recv(1024)
+            if not chunk:
+                break
+            data += chunk
+        self.assertTrue(data.endswith(b"\x88\x00"))
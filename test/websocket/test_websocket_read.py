@@ -0,0 +1,79 @@
+from unittest import TestCase
+from unittest.mock import Mock
+from owrx.websocket import WebSocketConnection, Handler, unmask
+import socket
+import time
+import os
+
+
+class FakeRequestHandler(object):
+    def __init__(self, sock):
+        self.connection = sock
+        self.rfile = sock.makefile("rb")
+        self.wfile = sock.makefile("wb", buffering=0)
+        self.headers = {
+            "Upgrade": "websocket",
+            "Sec-WebSocket-Key": "dGhlIHNhbXBsZSBub25jZQ==",
+        }
+
+
+def frame(opcode, payload, fin=True, key=b"\x12\x34\x56\x78"):
+    first = (0x80 if fin else 0x00) | opcode
+    length = len(payload)
+    if length > 65535:
+        header = bytes([first, 0x80 | 127]) + length.to_bytes(8, "big")
+    elif length > 125:
+        header = bytes([first, 0x80 | 126]) + length.to_bytes(2, "big")
+    else:
+        header = bytes([first, 0x80 | length])
+    return header + key + unmask(payload, key)
+
+
+class WebSocketReadTest(TestCase):
+    def setUp(self):
+        (self.server, self.client) = socket.socketpair()
+        self.handler = Mock(spec=Handler)
+        self.connection = WebSocketConnection(FakeRequestHandler(self.server), self.handler)
+        self.client.setblocking(True)
+
+    def tearDown(self):
+        self.connection.cancelPing()
+        self.client.close()
+        self.server.close()
+
+    def run_loop(self, data):
+        self.client.sendall(data + frame(0x08, b""))
+        self.connection.handle()
+
+    def testUnmask(self):
+        key = b"\x01\x02\x03\x04"
+        for length in [0, 1, 3, 4, 5, 255, 256, 1000, 4097]:
+            data = os.urandom(length)
+            expected = bytes([b ^ key[i % 4] for (i, b) in enumerate(data)])
+            self.assertEqual(unmask(data, key), expected)
+
+    def testTextMessage(self):
+        self.run_loop(frame(0x01, "hello".encode("utf-8")))
+        self.handler.handleTextMessage.assert_called_once_with(self.connection, "hello")
+
+    def testExtendedLength(self):
+        data = os.urandom(70000)
+        self.run_loop(frame(0x02, data))
+        self.handler.handleBinaryMessage.assert_called_once_with(self.connection, data)
+
+    def testFragmentedMessage(self):
+        self.run_loop(
+            frame(0x01, b"hel", fin=False) + frame(0x09, b"") + frame(0x00, b"lo ", fin=False) + frame(0x00, b"world")
+        )
+        self.handler.handleTextMessage.assert_called_once_with(self.connection, "hello world")
+
+    def testKeepaliveLeavesPingToReadLoop(self):
+        self.connection.lastActivity -= 60
+        self.connection._sendBytes = Mock(wraps=self.connection._sendBytes)
+        self.connection.keepalive(time.monotonic())
+        self.connection._sendBytes.assert_not_called()
+        self.run_loop(b"")
+        self.client.settimeout(1)
+        response = self.client.recv(4096)
+        # ping, then the close frame, after the handshake
+        self.assertTrue(response.endswith(b"\x89\x00\x88\x00"))